@@ -0,0 +1,279 @@
+import asyncio
+import inspect
+import random
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence
+
+from llm_cache import ResponseCache
+
+
+class RateLimiter:
+    """Space out request starts so that at most ``rate`` begin per second.
+
+    The limiter hands out start slots under a lock, so a single instance can
+    be shared between threads as well as between asyncio tasks.
+    """
+
+    def __init__(self, rate: Optional[float] = None) -> None:
+        """Construct the limiter.
+
+        Parameters
+        ----------
+        rate:
+            Maximum number of requests started per second. ``None`` or a
+            non-positive value disables rate limiting.
+        """
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Reserve the next start slot and return how long to wait for it."""
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        return slot - now
+
+    def wait(self) -> None:
+        """Block the calling thread until a request may start."""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire(self) -> None:
+        """Wait without blocking the event loop until a request may start."""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# OpenAI client errors worth retrying, matched by name so the package stays optional
+_TRANSIENT_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError"}
+
+
+def _is_transient(error: Exception) -> bool:
+    """Whether a failed request may succeed when retried.
+
+    Rate limits (429), timeouts, connection failures and server errors
+    (5xx) are transient; other client errors such as bad requests or
+    authentication failures are not.
+    """
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 429) or status >= 500
+    return any(cls.__name__ in _TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+async def _create_completion(openai_client: Any, **kwargs: Any) -> Any:
+    """Call ``chat.completions.create`` on a sync or async client."""
+    create = openai_client.chat.completions.create
+    if inspect.iscoroutinefunction(create):
+        return await create(**kwargs)
+    response = await asyncio.to_thread(create, **kwargs)
+    if inspect.isawaitable(response):
+        response = await response
+    return response
+
+
+class AsyncRolloutRunner:
+    """Send many prompts to a chat completion client concurrently.
+
+    Works with any object exposing ``chat.completions.create`` in the shape of
+    the OpenAI client, either synchronous (calls run in worker threads) or
+    asynchronous (``AsyncOpenAI``). Requests are bounded by ``max_in_flight``,
+    spaced by a :class:`RateLimiter`, and transient failures (rate limits,
+    timeouts, server errors) are retried with exponential backoff.
+    A ``shared_semaphore`` additionally bounds requests across processes.
+    """
+
+    def __init__(
+        self,
+        openai_client: Any,
+        max_in_flight: int = 4,
+        requests_per_second: Optional[float] = None,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        model: str = "gpt-4",
+        cache: Optional[ResponseCache] = None,
+        on_response: Optional[Callable[[float, Any], None]] = None,
+        shared_semaphore: Any = None,
+    ) -> None:
+        """Construct the runner.
+
+        Parameters
+        ----------
+        openai_client:
+            Client with a ``chat.completions.create`` method.
+        max_in_flight:
+            Maximum number of requests awaiting a response at the same time.
+        requests_per_second:
+            Upper bound on request starts per second, ``None`` for no limit.
+        max_retries:
+            Number of retries after a transient failure before giving up.
+        backoff_base:
+            Delay in seconds before the first retry; doubled on every retry.
+        backoff_max:
+            Upper bound for the retry delay in seconds.
+        model:
+            Model name passed to the client.
+        cache:
+            Optional on-disk response cache consulted before each request.
+        on_response:
+            Optional callback receiving the latency in seconds and the
+            ``usage`` object of every successful request (cache hits are not
+            reported).
+        shared_semaphore:
+            Optional blocking semaphore shared with other processes (e.g.
+            ``multiprocessing.Manager().BoundedSemaphore(n)``); each request
+            holds it while in flight, so at most ``n`` requests run across
+            all processes sharing it.
+        """
+        self.openai_client = openai_client
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.model = model
+        self.cache = cache
+        self.on_response = on_response
+        self.shared_semaphore = shared_semaphore
+
+    async def _acquire_shared(self) -> None:
+        """Poll the shared semaphore without tying up a worker thread.
+
+        A blocking ``acquire`` in ``asyncio.to_thread`` could fill the
+        default executor while the holders still need it for their requests.
+        """
+        delay = 0.005
+        while not self.shared_semaphore.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, 0.05)
+
+    async def agenerate(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ) -> str:
+        """Generate one completion, retrying failed requests.
+
+        Parameters
+        ----------
+        prompt:
+            The text prompt to send to the language model.
+        temperature:
+            Sampling temperature for the model.
+        semaphore:
+            Optional semaphore bounding the number of in-flight requests.
+
+        Returns
+        -------
+        str
+            Generated QE input file content or an empty string if every
+            attempt failed.
+        """
+        return (await self.agenerate_samples(prompt, 1, temperature=temperature, semaphore=semaphore))[0]
+
+    async def agenerate_samples(
+        self,
+        prompt: str,
+        n: int,
+        temperature: float = 0.7,
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ) -> List[str]:
+        """Generate ``n`` completions of one prompt in a single request.
+
+        The request uses the API's ``n`` parameter (omitted for ``n == 1``),
+        so the samples cost one round trip and one prompt's input tokens.
+
+        Returns
+        -------
+        list[str]
+            ``n`` completions; empty strings if every attempt failed.
+        """
+        if self.cache is not None:
+            if n == 1:
+                cached = await asyncio.to_thread(self.cache.get, self.model, prompt, temperature)
+                cached = None if cached is None else [cached]
+            else:
+                cached = await asyncio.to_thread(self.cache.get_many, self.model, prompt, temperature, n)
+            if cached is not None:
+                return cached
+
+        extra = {"n": n} if n > 1 else {}
+        semaphore = semaphore or asyncio.Semaphore(self.max_in_flight)
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    if self.shared_semaphore is not None:
+                        await self._acquire_shared()
+                    try:
+                        await self.rate_limiter.acquire()
+                        started = time.perf_counter()
+                        response = await _create_completion(
+                            self.openai_client,
+                            model=self.model,
+                            messages=[{"role": "user", "content": prompt}],
+                            temperature=temperature,
+                            **extra,
+                        )
+                        latency = time.perf_counter() - started
+                    finally:
+                        if self.shared_semaphore is not None:
+                            self.shared_semaphore.release()
+                break
+            except Exception as e:
+                if attempt == self.max_retries or not _is_transient(e):
+                    print(f"[!] Prompt failed after {attempt + 1} attempts: {e}")
+                    return [""] * n
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                await asyncio.sleep(delay * (0.5 + random.random() / 2))
+
+        # Past this point the request is paid for: nothing below re-sends it
+        if self.on_response is not None:
+            self.on_response(latency, getattr(response, "usage", None))
+        contents = [(choice.message.content or "").strip() for choice in response.choices[:n]]
+        contents += [""] * (n - len(contents))
+        if self.cache is not None:
+            for content in contents:
+                if content:
+                    await asyncio.to_thread(self.cache.put, self.model, prompt, temperature, content)
+        return contents
+
+    async def agenerate_batch(self, prompts: Sequence[str], temperature: float = 0.7) -> List[str]:
+        """Generate completions for ``prompts`` concurrently.
+
+        Returns
+        -------
+        list[str]
+            One completion per prompt, in the order of ``prompts``.
+        """
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        return list(await asyncio.gather(
+            *(self.agenerate(p, temperature=temperature, semaphore=semaphore) for p in prompts)
+        ))
+
+    async def agenerate_samples_batch(
+        self, prompts: Sequence[str], n: int, temperature: float = 0.7
+    ) -> List[List[str]]:
+        """Generate ``n`` completions for each of ``prompts``, one request per prompt, concurrently."""
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        return list(await asyncio.gather(
+            *(self.agenerate_samples(p, n, temperature=temperature, semaphore=semaphore) for p in prompts)
+        ))
+
+    def generate_batch(self, prompts: Sequence[str], temperature: float = 0.7) -> List[str]:
+        """Blocking wrapper around :meth:`agenerate_batch`."""
+        return asyncio.run(self.agenerate_batch(prompts, temperature=temperature))
+
+    def generate_samples_batch(self, prompts: Sequence[str], n: int, temperature: float = 0.7) -> List[List[str]]:
+        """Blocking wrapper around :meth:`agenerate_samples_batch`."""
+        return asyncio.run(self.agenerate_samples_batch(prompts, n, temperature=temperature))
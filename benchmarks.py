@@ -0,0 +1,358 @@
+"""Offline, CPU-only benchmarks for the project's hot paths.
+
+Runs on synthetic knowledge graphs with a predicate mix resembling the
+parameter-list KGs produced by ``extract_kg_data.py`` and a local fake OpenAI
+client, and appends one JSON record per run to ``benchmark_results.jsonl`` so
+runs can be compared over time::
+
+    python benchmarks.py --sizes 1000,100000,10000000 --latency 0.05
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import torch
+
+import extract_kg_data
+from fake_llm import FakeOpenAIClient
+from kg_index import KGIndex
+from policy_server import PolicyService
+from policy_model import TripleScoringModel
+from prompt_builder import PromptBuilder
+from reward_engine import RewardEngine
+from sample_triples import select_topk_triples
+from sparse_optim import RowSparseAdam
+from triple_store import TripleStore
+from triple_stream import HashDeduplicator
+from utils import compute_reward, generate_prompt_from_triples
+
+REPO_ROOT = Path(__file__).resolve().parent
+
+# Predicate mix of a parameter-list KG plus the markdown-derived predicates.
+PREDICATE_MIX = {
+    "Namelist": 0.15,
+    "Type": 0.15,
+    "Default": 0.15,
+    "Description": 0.2,
+    "See": 0.1,
+    "Possible_Values": 0.08,
+    "Status": 0.05,
+    "contains": 0.09,
+    "is": 0.03,
+}
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"best_s": min(times), "median_s": statistics.median(times)}
+
+
+def _record(results: List[Dict[str, Any]], name: str, size: int, timing: Dict[str, float], items: int,
+            **extra: Any) -> None:
+    row = {"name": name, "size": size, **timing, "items_per_s": items / timing["best_s"] if timing["best_s"] else None,
+           **extra}
+    results.append(row)
+    print(f"{name:<40} size={size:>10,}  best={timing['best_s'] * 1e3:10.3f} ms  "
+          f"median={timing['median_s'] * 1e3:10.3f} ms")
+
+
+def _drain(dedup: HashDeduplicator, records: List[Dict[str, Any]]) -> int:
+    with dedup:
+        return sum(1 for _ in dedup.filter(records))
+
+
+def synthetic_store(num_triples: int, seed: int = 0) -> TripleStore:
+    """Build a ``TripleStore`` of random IDs directly, without Python dicts."""
+    gen = torch.Generator().manual_seed(seed)
+    num_entities = min(num_triples // 5, 2_000_000) + 16
+    predicates = sorted(PREDICATE_MIX)
+    weights = torch.tensor([PREDICATE_MIX[p] for p in predicates])
+    pred = torch.sort(torch.multinomial(weights, num_triples, replacement=True, generator=gen)).values
+    ids = torch.stack([
+        torch.randint(0, num_entities, (num_triples,), generator=gen),
+        pred,
+        torch.randint(0, num_entities, (num_triples,), generator=gen),
+    ], dim=1).to(torch.int32)
+    return TripleStore(
+        ids=ids,
+        source_ids=torch.zeros(num_triples, dtype=torch.int32),
+        namelist_ids=torch.zeros(num_triples, dtype=torch.int32),
+        entities=[f"entity_{i}" for i in range(num_entities)],
+        predicates=predicates,
+        sources=["synthetic.json"],
+        namelists=["synthetic"],
+    )
+
+
+def synthetic_triples(num_triples: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Build triple dictionaries with realistic predicates and long ``contains`` objects."""
+    rng = random.Random(seed)
+    num_params = max(10, num_triples // 8)
+    params = [f"param_{i}" for i in range(num_params)]
+    values = [f"value_{i}" for i in range(max(10, num_triples // 20))]
+    predicates = list(PREDICATE_MIX)
+    weights = list(PREDICATE_MIX.values())
+    triples = []
+    for predicate in rng.choices(predicates, weights, k=num_triples):
+        if predicate == "contains":
+            obj = " | ".join(rng.sample(params, min(len(params), rng.randint(20, 120))))
+            subject = f"&NAMELIST_{rng.randint(0, 9)}"
+        else:
+            obj = rng.choice(values)
+            subject = rng.choice(params)
+        triples.append({"subject": subject, "predicate": predicate, "object": obj,
+                        "source": "synthetic.json", "namelist": "synthetic"})
+    return triples
+
+
+def synthetic_parameter_list(num_entries: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Entries shaped like ``xqe_univ_kg_load_v1.json`` parameter records."""
+    rng = random.Random(seed)
+    return [{
+        "Parameter_Name": f"param_{i}",
+        "Namelist": rng.choice(["&CONTROL", "&SYSTEM", "&ELECTRONS", "&IONS", "&CELL"]),
+        "Type": rng.choice(["INTEGER", "REAL", "CHARACTER", "LOGICAL"]),
+        "Default": str(rng.random()),
+        "Description": "Synthetic description " * rng.randint(1, 20),
+        "Possible_Values": [f"opt_{j}" for j in range(rng.randint(0, 6))],
+        "Relationships": {"See": f"param_{rng.randrange(num_entries)}", "Requires": "ibrav"},
+        "Final_comments": "deprecated" if rng.random() < 0.05 else "",
+    } for i in range(num_entries)]
+
+
+def _update_step(store: TripleStore, sparse: bool, batch_size: int = 64) -> Callable[[], None]:
+    """One optimizer step on a random batch, with dense Adam or sparse gradients and RowSparseAdam."""
+    model = TripleScoringModel(len(store.entities), len(store.predicates), sparse=sparse)
+    optimizer = (RowSparseAdam if sparse else torch.optim.Adam)(model.parameters(), lr=0.01)
+    batch = store.ids[torch.randint(0, len(store), (batch_size,))]
+
+    def step():
+        optimizer.zero_grad()
+        model(batch).sum().backward()
+        optimizer.step()
+    return step
+
+
+def bench_scoring(results, sizes, max_dict_size, chunk_size, repeat, k=5):
+    for n in sizes:
+        store = synthetic_store(n)
+        model = TripleScoringModel(len(store.entities), len(store.predicates))
+        if n <= chunk_size:
+            def forward():
+                with torch.no_grad():
+                    model(store.ids)
+            _record(results, "TripleScoringModel.forward", n, _time(forward, repeat), n)
+
+            def tables():
+                with torch.no_grad():
+                    model.score(store.ids)
+            with torch.no_grad():
+                diff = (model(store.ids) - model.score(store.ids)).abs().max().item()
+            if diff > 1e-4:
+                raise AssertionError(f"score tables differ from forward by {diff}")
+            _record(results, "TripleScoringModel.score[tables]", n, _time(tables, repeat), n, max_abs_diff=diff)
+            int8_model = TripleScoringModel(len(store.entities), len(store.predicates), table_dtype="int8")
+            int8_model.load_state_dict(model.state_dict())
+            with torch.no_grad():
+                diff = (model(store.ids) - int8_model.score(store.ids)).abs().max().item()
+
+            def int8_tables():
+                with torch.no_grad():
+                    int8_model.score(store.ids)
+            _record(results, "TripleScoringModel.score[int8 tables]", n, _time(int8_tables, repeat), n,
+                    max_abs_diff=diff)
+            _record(results, "select_topk_triples[store]", n,
+                    _time(lambda: select_topk_triples(model, store, k), repeat), n)
+        _record(results, "select_topk_triples[store,chunked]", n,
+                _time(lambda: select_topk_triples(model, store, k, chunk_size=chunk_size), repeat), n)
+        with tempfile.TemporaryDirectory() as tmp:
+            store.save(tmp)
+            _record(results, "TripleStore.load[mmap]", n, _time(lambda: TripleStore.load(tmp), repeat), n)
+        _record(results, "RowSparseAdam.step[sparse embeddings]", n, _time(_update_step(store, True), repeat), 1,
+                entities=len(store.entities))
+        if n <= max_dict_size:
+            _record(results, "Adam.step[dense embeddings]", n, _time(_update_step(store, False), repeat), 1,
+                    entities=len(store.entities))
+        contains = store.subset("contains")
+        _record(results, "select_topk_triples[contains view]", len(contains),
+                _time(lambda: select_topk_triples(model, contains, k, chunk_size=chunk_size), repeat), len(contains))
+
+        if n <= max_dict_size:
+            triples = synthetic_triples(n)
+            dict_store = TripleStore.from_triples(triples)
+            dict_model = TripleScoringModel(len(dict_store.entities), len(dict_store.predicates))
+            _record(results, "TripleStore.from_triples", n,
+                    _time(lambda: TripleStore.from_triples(triples), max(1, repeat // 3)), n)
+            _record(results, "select_topk_triples[list]", n,
+                    _time(lambda: select_topk_triples(dict_model, triples, k, dict_store.entity2id,
+                                                      dict_store.predicate2id), repeat), n)
+            _record(results, "KGIndex.build", n, _time(lambda: KGIndex(dict_store), max(1, repeat // 3)), n)
+            index = KGIndex(dict_store)
+            query = "Write a calculation setting param_1 and param_2 for the given geometry."
+            _record(results, "select_topk_triples[dict store]", n,
+                    _time(lambda: select_topk_triples(dict_model, dict_store, k), repeat), n)
+            _record(results, "select_topk_triples[kg index prefetch]", n,
+                    _time(lambda: select_topk_triples(dict_model, dict_store, k, index=index, instruction=query),
+                          repeat), n, candidates=len(index.prefetch(query)))
+            duplicated = triples + triples[: n // 10]
+            _record(results, "HashDeduplicator.filter[spill every 64k]", n + n // 10,
+                    _time(lambda: _drain(HashDeduplicator(memory_limit=1 << 20), duplicated), max(1, repeat // 3)),
+                    n + n // 10)
+            _record(results, "extract_kg_data.deduplicate_relationships", n,
+                    _time(lambda: extract_kg_data.deduplicate_relationships(triples + triples[: n // 10]),
+                          max(1, repeat // 3)), n + n // 10)
+            entries = synthetic_parameter_list(max(1, n // 8))
+            _record(results, "extract_triples_from_parameter_list", len(entries),
+                    _time(lambda: list(extract_kg_data.extract_triples_from_parameter_list("synthetic.json", entries)),
+                          repeat), len(entries))
+
+
+def bench_prompt_and_reward(results, repeat, batch=256):
+    triples = [t for t in synthetic_triples(2000) if t["predicate"] == "contains"][:5]
+    template = str(REPO_ROOT / "prompt_template.txt")
+    _record(results, "generate_prompt_from_triples", batch,
+            _time(lambda: [generate_prompt_from_triples(triples, "Write a scf calculation.", template)
+                           for _ in range(batch)], repeat), batch)
+    builder = PromptBuilder(template, token_budget=512)
+    _record(results, "PromptBuilder.render_batch[budget=512]", batch,
+            _time(lambda: builder.render_batch([triples] * batch, ["Write a scf calculation."] * batch), repeat), batch)
+
+    references = sorted((REPO_ROOT / "quantum_inputs").glob("**/*.in"))
+    texts = [p.read_text() for p in references]
+    ground_truth = texts[0]
+    candidates = [texts[i % len(texts)] + f"\n! candidate {i}\n" for i in range(batch)]
+    _record(results, "compute_reward", batch,
+            _time(lambda: [compute_reward(c, ground_truth) for c in candidates], repeat), batch)
+    engine = RewardEngine({"gt": ground_truth})
+    _record(results, "RewardEngine.score_batch[cached parse]", batch,
+            _time(lambda: engine.score_batch(candidates, "gt"), repeat), batch)
+    engine_all = RewardEngine({str(p): t for p, t in zip(references, texts)})
+    _record(results, "RewardEngine.score_matrix", batch * len(texts),
+            _time(lambda: engine_all.score_matrix(candidates), repeat), batch * len(texts))
+
+
+def bench_serving(results, repeat, num_triples=100_000, concurrency=64):
+    """Concurrent selections through the micro-batching PolicyService vs one call each."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    store = synthetic_store(num_triples)
+    model = TripleScoringModel(len(store.entities), len(store.predicates))
+    _record(results, "select_topk_triples[one call per request]", num_triples,
+            _time(lambda: [select_topk_triples(model, store, 5) for _ in range(concurrency)], repeat), concurrency)
+    service = PolicyService(store, model=model)
+    with ThreadPoolExecutor(concurrency) as pool:
+        def burst():
+            list(pool.map(lambda _: service.select(5), range(concurrency)))
+        timing = _time(burst, repeat)
+    stats = service.stats()
+    service.close()
+    _record(results, f"PolicyService.select[{concurrency} concurrent]", num_triples, timing, concurrency,
+            mean_batch_size=stats["mean_batch_size"], p50_latency_s=stats["latency_seconds"]["p50"])
+
+
+def bench_episode(results, latency, episodes, rollout_batch, backend="openai", samples=1):
+    """Run the real training loop end to end against the fake client or the retrieval backend."""
+    import generation_backend
+    from ppo_training_loop import TrainConfig, train
+
+    reference = (REPO_ROOT / "pw.scf.si.in").read_text()
+    client = FakeOpenAIClient(response=reference, latency=latency, jitter=latency / 2, seed=0)
+    default_client = generation_backend._default_client
+    config = TrainConfig(episodes=episodes, rollout_batch=rollout_batch, num_samples=samples, backend=backend,
+                         llm_cache_path=None, instrument=False)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("pw.scf.si.in", "relationships.json", "prompt_template.txt",
+                     "prompt_template_tasks.txt", "quantum_inputs"):
+            os.symlink(REPO_ROOT / name, Path(tmp) / name)
+        try:
+            os.chdir(tmp)
+            generation_backend._default_client = lambda: client
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), \
+                    contextlib.redirect_stderr(devnull):
+                timing = _time(lambda: train(config), 1)
+        finally:
+            os.chdir(cwd)
+            generation_backend._default_client = default_client
+    label = f"latency={latency}" if backend == "openai" else backend
+    if samples > 1:
+        label += f",n={samples}"
+    _record(results, f"episode_end_to_end[{label},batch={rollout_batch}]", episodes, timing, episodes,
+            llm_calls_per_run=client.calls // 2)  # warm-up plus one timed run
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the PPO-KG hot paths offline on CPU.")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000",
+                        help="Comma-separated synthetic KG sizes (up to 10000000).")
+    parser.add_argument("--max-dict-size", type=int, default=100_000,
+                        help="Largest size for benchmarks that need Python triple dicts.")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="Chunk size for chunked scoring.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions per benchmark.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake LLM latency in seconds.")
+    parser.add_argument("--episodes", type=int, default=20, help="Episodes for the end-to-end benchmark.")
+    parser.add_argument("--rollout-batch", type=int, default=4, help="ROLLOUT_BATCH for the end-to-end benchmark.")
+    parser.add_argument("--only", default=None, choices=["scoring", "prompt_reward", "serving", "episode"],
+                        help="Run a single benchmark group.")
+    parser.add_argument("--out", default="benchmark_results.jsonl", help="File the run record is appended to.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    torch.manual_seed(0)
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    results: List[Dict[str, Any]] = []
+
+    if args.only in (None, "scoring"):
+        bench_scoring(results, sizes, args.max_dict_size, args.chunk_size, args.repeat)
+    if args.only in (None, "prompt_reward"):
+        bench_prompt_and_reward(results, args.repeat)
+    if args.only in (None, "serving"):
+        bench_serving(results, args.repeat)
+    if args.only in (None, "episode"):
+        bench_episode(results, args.latency, args.episodes, 1)
+        bench_episode(results, args.latency, args.episodes, args.rollout_batch)
+        bench_episode(results, args.latency, args.episodes, args.rollout_batch, samples=4)
+        bench_episode(results, args.latency, args.episodes * 10, args.rollout_batch, backend="retrieval")
+
+    record = {
+        "timestamp": time.time(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "args": vars(args),
+        "results": results,
+    }
+    with open(args.out, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"✅ Benchmark results appended to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
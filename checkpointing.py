@@ -0,0 +1,209 @@
+import copy
+import csv
+import json
+import os
+import queue
+import random
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+
+LATEST = "latest"
+
+
+def _fsync_replace(tmp_path: Path, path: Path) -> None:
+    """Flush ``tmp_path`` to disk and atomically rename it to ``path``."""
+    with open(tmp_path, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def capture_rng_state() -> Dict[str, Any]:
+    """Snapshot the Python, NumPy and torch random number generators."""
+    return {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+
+
+def restore_rng_state(state: Dict[str, Any]) -> None:
+    """Restore generators captured by :func:`capture_rng_state`."""
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+
+
+class CheckpointWriter:
+    """Write training checkpoints from a background thread.
+
+    :meth:`save` deep-copies the state on the caller's thread (cheap for the
+    small policy model) and returns immediately; a worker thread serializes
+    it with ``torch.save`` to a temporary file, fsyncs it and renames it into
+    place, then atomically updates the ``latest`` pointer. A crash at any
+    point leaves the previous checkpoint intact.
+    """
+
+    def __init__(self, directory: str = "checkpoints", keep: int = 3) -> None:
+        """Construct the writer.
+
+        Parameters
+        ----------
+        directory:
+            Folder receiving ``ckpt-<episode>.pt`` files.
+        keep:
+            Number of most recent checkpoints kept on disk.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.keep = max(1, keep)
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, episode: int, state: Dict[str, Any]) -> None:
+        """Queue ``state`` to be written as the checkpoint for ``episode``."""
+        if self._error is not None:
+            raise RuntimeError("checkpoint writer failed") from self._error
+        self._queue.put((episode, copy.deepcopy(state)))
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except BaseException as e:  # surfaced on the next save()/close()
+                print(f"[!] Failed to write checkpoint: {e}")
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, episode: int, state: Dict[str, Any]) -> None:
+        name = f"ckpt-{episode:06d}.pt"
+        path = self.directory / name
+        tmp = path.with_suffix(".tmp")
+        torch.save(state, tmp)
+        _fsync_replace(tmp, path)
+
+        pointer = self.directory / LATEST
+        pointer_tmp = self.directory / f"{LATEST}.tmp"
+        pointer_tmp.write_text(name)
+        _fsync_replace(pointer_tmp, pointer)
+
+        for old in sorted(self.directory.glob("ckpt-*.pt"))[:-self.keep]:
+            old.unlink(missing_ok=True)
+
+    def flush(self) -> None:
+        """Block until all queued checkpoints are on disk."""
+        self._queue.join()
+        if self._error is not None:
+            raise RuntimeError("checkpoint writer failed") from self._error
+
+    def close(self) -> None:
+        """Flush pending checkpoints and stop the worker thread."""
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+
+def load_latest_checkpoint(directory: str = "checkpoints") -> Optional[Dict[str, Any]]:
+    """Load the checkpoint referenced by ``latest`` in ``directory``.
+
+    Returns
+    -------
+    dict | None
+        The saved state, or ``None`` if no checkpoint exists.
+    """
+    pointer = Path(directory) / LATEST
+    if not pointer.exists():
+        return None
+    path = Path(directory) / pointer.read_text().strip()
+    return torch.load(path, weights_only=False)
+
+
+class MetricsLogger:
+    """Append per-episode metrics to CSV (and optionally JSONL) as they happen.
+
+    Every row is flushed immediately, so a crashed run keeps the log of all
+    completed episodes.
+    """
+
+    def __init__(self, csv_path: str, jsonl_path: Optional[str] = None, resume_after: Optional[int] = None) -> None:
+        """Open the log files.
+
+        Parameters
+        ----------
+        csv_path:
+            CSV file receiving one row per episode.
+        jsonl_path:
+            Optional JSON Lines file receiving the same rows.
+        resume_after:
+            When resuming, the last checkpointed episode. Existing rows up to
+            and including it are kept, later rows (which will be replayed)
+            are dropped. ``None`` starts fresh logs.
+        """
+        self.csv_path = Path(csv_path)
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self.fieldnames: Optional[List[str]] = None
+
+        # Kept rows go to a temporary file that atomically replaces the log,
+        # so a crash while trimming it loses nothing
+        self._writer = None
+        if resume_after is not None and self.csv_path.exists():
+            with open(self.csv_path, newline="") as f:
+                reader = csv.DictReader(f)
+                self.fieldnames = reader.fieldnames
+                kept = [row for row in reader if int(row["episode"]) <= resume_after]
+            tmp_path = self.csv_path.with_name(self.csv_path.name + ".tmp")
+            with open(tmp_path, "w", newline="") as f:
+                if self.fieldnames:
+                    writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+                    writer.writeheader()
+                    writer.writerows(kept)
+            _fsync_replace(tmp_path, self.csv_path)
+            self._csv = open(self.csv_path, "a", newline="")
+            if self.fieldnames:
+                self._start_csv(self.fieldnames, header=False)
+        else:
+            self._csv = open(self.csv_path, "w", newline="")
+
+        self._jsonl = None
+        if self.jsonl_path:
+            if resume_after is not None and self.jsonl_path.exists():
+                with open(self.jsonl_path) as f:
+                    kept_json = [line for line in f
+                                 if line.strip() and json.loads(line)["episode"] <= resume_after]
+                tmp_path = self.jsonl_path.with_name(self.jsonl_path.name + ".tmp")
+                with open(tmp_path, "w") as f:
+                    f.writelines(kept_json)
+                _fsync_replace(tmp_path, self.jsonl_path)
+                self._jsonl = open(self.jsonl_path, "a")
+            else:
+                self._jsonl = open(self.jsonl_path, "w")
+
+    def _start_csv(self, fieldnames: List[str], header: bool = True) -> None:
+        self.fieldnames = list(fieldnames)
+        self._writer = csv.DictWriter(self._csv, fieldnames=self.fieldnames, extrasaction="ignore")
+        if header:
+            self._writer.writeheader()
+
+    def log(self, row: Dict[str, Any]) -> None:
+        """Append one row to every log file and flush."""
+        if self._writer is None:
+            self._start_csv(list(row))
+        self._writer.writerow(row)
+        self._csv.flush()
+        if self._jsonl is not None:
+            self._jsonl.write(json.dumps(row) + "\n")
+            self._jsonl.flush()
+
+    def close(self) -> None:
+        self._csv.close()
+        if self._jsonl is not None:
+            self._jsonl.close()
@@ -0,0 +1,115 @@
+import os
+from typing import Any, List, Optional, Sequence
+
+import torch
+import torch.distributed as dist
+
+
+class DistributedContext:
+    """Rank, world size and the collectives used by data-parallel training.
+
+    Created from the environment set by ``torchrun`` (``RANK``,
+    ``WORLD_SIZE``, ``MASTER_ADDR``, ...). Without it, or with a world size of
+    one, every method is a local no-op, so the training loop runs the same
+    code in a single process.
+    """
+
+    def __init__(self, rank: int = 0, world_size: int = 1) -> None:
+        """Construct the context.
+
+        Parameters
+        ----------
+        rank:
+            Rank of this process.
+        world_size:
+            Number of processes; the process group must already be
+            initialized when it is above one.
+        """
+        self.rank = rank
+        self.world_size = world_size
+
+    @classmethod
+    def from_env(cls, backend: str = "gloo") -> "DistributedContext":
+        """Join the process group described by the ``torchrun`` environment, if any."""
+        world_size = int(os.environ.get("WORLD_SIZE", "1"))
+        if world_size <= 1:
+            return cls()
+        if not dist.is_initialized():
+            dist.init_process_group(backend)
+        return cls(dist.get_rank(), dist.get_world_size())
+
+    @property
+    def enabled(self) -> bool:
+        return self.world_size > 1
+
+    @property
+    def is_main(self) -> bool:
+        """True on rank 0, which writes metrics and checkpoints."""
+        return self.rank == 0
+
+    def broadcast_module(self, module: torch.nn.Module) -> None:
+        """Copy parameters and buffers from rank 0 to every other rank."""
+        if not self.enabled:
+            return
+        with torch.no_grad():
+            for tensor in list(module.parameters()) + list(module.buffers()):
+                dist.broadcast(tensor.data, src=0)
+
+    def all_reduce_gradients(self, module: torch.nn.Module) -> None:
+        """Average the gradients of ``module`` across ranks.
+
+        Parameters without a gradient on this rank (it had no rollouts in the
+        minibatch) contribute zeros. Sparse embedding gradients are reduced
+        as sparse tensors.
+        """
+        if not self.enabled:
+            return
+        sparse_params = {id(m.weight) for m in module.modules() if isinstance(m, torch.nn.Embedding) and m.sparse}
+        for p in module.parameters():
+            if not p.requires_grad:
+                continue
+            if p.grad is None:
+                if id(p) in sparse_params:
+                    p.grad = torch.sparse_coo_tensor(torch.empty(1, 0, dtype=torch.long),
+                                                     torch.empty(0, *p.shape[1:], dtype=p.dtype), p.shape)
+                else:
+                    p.grad = torch.zeros_like(p)
+            dist.all_reduce(p.grad)
+            p.grad.div_(self.world_size)
+
+    def all_reduce_sum(self, values: Sequence[float]) -> List[float]:
+        """Sum each of ``values`` across ranks."""
+        if not self.enabled:
+            return list(values)
+        tensor = torch.tensor(list(values), dtype=torch.float64)
+        dist.all_reduce(tensor)
+        return tensor.tolist()
+
+    def all_reduce_max(self, value: int) -> int:
+        """Largest ``value`` over all ranks."""
+        if not self.enabled:
+            return value
+        tensor = torch.tensor([value], dtype=torch.long)
+        dist.all_reduce(tensor, op=dist.ReduceOp.MAX)
+        return int(tensor.item())
+
+    def gather(self, obj: Any) -> Optional[List[Any]]:
+        """Collect one picklable object per rank on rank 0 (``None`` elsewhere)."""
+        if not self.enabled:
+            return [obj]
+        gathered = [None] * self.world_size if self.is_main else None
+        dist.gather_object(obj, gathered, dst=0)
+        return gathered
+
+    def broadcast(self, obj: Any) -> Any:
+        """Send a picklable object from rank 0 to every rank and return it."""
+        if not self.enabled:
+            return obj
+        holder = [obj if self.is_main else None]
+        dist.broadcast_object_list(holder, src=0)
+        return holder[0]
+
+    def close(self) -> None:
+        """Leave the process group."""
+        if self.enabled and dist.is_initialized():
+            dist.destroy_process_group()
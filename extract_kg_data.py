@@ -4,54 +4,153 @@ import argparse
 from pathlib import Path
 from openai import OpenAI
 import yaml
-import csv
+import hashlib
+import itertools
+import collections
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 from dotenv import load_dotenv
+from async_rollout import AsyncRolloutRunner
+from llm_cache import DEFAULT_CACHE_PATH, ResponseCache
+from triple_store import TripleStore
+from triple_stream import DEDUP_MEMORY_BYTES, CsvWriter, HashDeduplicator, iter_records, open_record_writer
 load_dotenv()
 
-client = OpenAI()
+client = None  # created on first use, so the module imports without an API key
+cache = None  # ResponseCache shared with the training loop, set up in main()
 
-def summarize_markdown(content):
-    prompt = f"Summarize this Markdown file in 2–3 sentences:\n\n{content[:2000]}"
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
-    )
-    return response.choices[0].message.content.strip()
+EXTRACTOR_VERSION = 3  # bump when extraction output changes, forces incremental runs to redo every file
+CHUNK_SIZE = 3000     # characters per chunk sent to the LLM
+CHUNK_OVERLAP = 300   # characters repeated between neighbouring chunks
+SUMMARY_PROMPT = "Summarize this Markdown file in 2–3 sentences:\n\n{content}"
+SECTION_SUMMARY_PROMPT = "Summarize this section of a Markdown file in 2–3 sentences:\n\n{content}"
+REDUCE_SUMMARY_PROMPT = (
+    "Combine these summaries of consecutive sections of one Markdown file "
+    "into a summary of the whole file in 2–3 sentences:\n\n{content}"
+)
+TRIPLES_PROMPT = (
+    "Extract factual relationships as subject–predicate–object triples from this content. "
+    "Return ONLY a JSON array of objects with 'subject', 'predicate', and 'object' keys.\n\n"
+    "{content}"
+)
 
-def extract_relationships(content):
-    prompt = (
-        "Extract factual relationships as subject–predicate–object triples from this content. "
-        "Return ONLY a JSON array of objects with 'subject', 'predicate', and 'object' keys.\n\n"
-        f"{content[:3000]}"
-    )
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
-    )
+def get_client():
+    global client
+    if client is None:
+        client = OpenAI()
+    return client
+
+def chunk_text(content, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Split ``content`` into chunks of at most ``size`` characters.
+
+    Chunks end at a line break where possible, and each chunk starts
+    ``overlap`` characters (moved back to the start of that line) before the
+    previous one ended, so facts spanning a boundary appear whole in one chunk.
+    """
+    if not content.strip():
+        return []
+    chunks = []
+    start = 0
+    while True:
+        end = min(start + size, len(content))
+        if end < len(content):
+            cut = content.rfind("\n", start + size // 2, end)
+            if cut != -1:
+                end = cut + 1
+        chunks.append(content[start:end])
+        if end >= len(content):
+            return chunks
+        next_start = max(end - overlap, start + 1)
+        line_start = content.rfind("\n", start, next_start) + 1
+        start = line_start if line_start > start else next_start
+
+def parse_triples_reply(reply):
+    text = reply.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
     try:
-        return json.loads(response.choices[0].message.content.strip())
+        triples = json.loads(text)
     except json.JSONDecodeError:
-        print(f"[!] Failed to parse JSON from model response:\n{response.choices[0].message.content}\n")
+        print(f"[!] Failed to parse JSON from model response:\n{reply}\n")
+        return []
+    if not isinstance(triples, list):
+        print(f"[!] Expected a JSON array from model response:\n{reply}\n")
         return []
+    return [t for t in triples if isinstance(t, dict) and all(k in t for k in ("subject", "predicate", "object"))]
+
+def extract_markdown(files, runner, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Summarize and extract triples from markdown files, chunk by chunk.
+
+    Map: every chunk of every file gets a summary and a triple extraction
+    request, all sent concurrently through ``runner`` (an
+    ``AsyncRolloutRunner`` bounding in-flight requests and the request rate).
+    Reduce: per-chunk triples are merged and deduplicated per file, and files
+    with several chunks get one more request combining the chunk summaries.
+
+    Returns
+    -------
+    list[tuple[dict | None, list[dict]]]
+        Document node (``None`` if summarizing failed) and triples per file.
+    """
+    chunked = [(file, chunk_text(file.read_text(), chunk_size, overlap)) for file in files]
+    for file, chunks in chunked:
+        print(f"\U0001F4C4 Processing {file.name} ({len(chunks)} chunks)")
+
+    prompts = []
+    for _, chunks in chunked:
+        summary_prompt = SUMMARY_PROMPT if len(chunks) == 1 else SECTION_SUMMARY_PROMPT
+        prompts += [summary_prompt.format(content=c) for c in chunks]
+        prompts += [TRIPLES_PROMPT.format(content=c) for c in chunks]
+    replies = iter(runner.generate_batch(prompts, temperature=0))
+
+    summaries, results = [], []
+    for file, chunks in chunked:
+        chunk_summaries = [next(replies) for _ in chunks]
+        triples = {}
+        for _ in chunks:
+            for t in parse_triples_reply(next(replies)):
+                rel = {
+                    "subject": t["subject"],
+                    "predicate": t["predicate"],
+                    "object": t["object"],
+                    "source": file.name,
+                    "namelist": "markdown"
+                }
+                triples.setdefault(json.dumps(rel, sort_keys=True), rel)  # chunks overlap
+        summaries.append([s for s in chunk_summaries if s])
+        results.append(list(triples.values()))
+
+    multi = [i for i, s in enumerate(summaries) if len(s) > 1]
+    reduced = runner.generate_batch(
+        [REDUCE_SUMMARY_PROMPT.format(content="\n\n".join(summaries[i])) for i in multi], temperature=0
+    )
+    for i, summary in zip(multi, reduced):
+        summaries[i] = [summary]
+
+    nodes = []
+    for (file, _), summary in zip(chunked, summaries):
+        if summary and summary[0]:
+            nodes.append({"id": file.name, "title": file.stem, "summary": summary[0]})
+        else:
+            print(f"[!] Skipping summary for {file.name}")
+            nodes.append(None)
+    return list(zip(nodes, results))
 
 def convert_dict_to_triples(source, data):
-    triples = []
+    """Yield triples from a ``{subject: {predicate: [objects]}}`` or ``{subject: [types]}`` mapping."""
     for subject, nested in data.items():
         if isinstance(nested, dict):
             for predicate, objects in nested.items():
                 if isinstance(objects, list):
                     for obj in objects:
-                        triples.append({"subject": subject, "predicate": predicate, "object": obj, "source": source})
+                        yield {"subject": subject, "predicate": predicate, "object": obj, "source": source}
         elif isinstance(nested, list):
             for obj in nested:
-                triples.append({"subject": subject, "predicate": "is_a", "object": obj, "source": source})
-    return triples
+                yield {"subject": subject, "predicate": "is_a", "object": obj, "source": source}
 
 def extract_triples_from_parameter_list(source, data):
-    triples = []
+    """Yield triples from parameter records such as ``xqe_univ_kg_load_v1.json``; deprecated entries are skipped."""
     for entry in data:
         subject = entry.get("Parameter_Name")
         if not subject:
@@ -64,159 +163,433 @@ def extract_triples_from_parameter_list(source, data):
             if key == "Parameter_Name":
                 continue
             if isinstance(value, (str, int, float, bool)):
-                triples.append({
+                yield {
                     "subject": subject,
                     "predicate": key,
                     "object": value,
                     "source": source,
                     "namelist": namelist
-                })
+                }
             elif isinstance(value, dict):
                 for subkey, subval in value.items():
-                    triples.append({
+                    yield {
                         "subject": subject,
                         "predicate": f"{key}:{subkey}",
                         "object": subval,
                         "source": source,
                         "namelist": namelist
-                    })
+                    }
             elif isinstance(value, list):
                 for item in value:
-                    triples.append({
+                    yield {
                         "subject": subject,
                         "predicate": key,
                         "object": item,
                         "source": source,
                         "namelist": namelist
-                    })
-    return triples
+                    }
 
-def process_directory(source_dir: Path, filetypes: set):
-    document_nodes = []
-    relationships = []
+def tag_source(record, file: Path):
+    """``record`` with ``source`` defaulting to the name of the file it was read from.
+
+    Records that name a different source of their own keep it and get a
+    ``source_file`` field instead, so :func:`retract` can still tell which
+    file they came from.
+    """
+    record = {"source": file.name, **record}
+    if record["source"] != file.name:
+        record["source_file"] = file.name
+    return record
 
-    for file in source_dir.iterdir():
-        if file.suffix in [".md", ".mdx"] and "md" in filetypes:
-            print(f"\U0001F4C4 Processing {file.name}")
-            content = file.read_text()
-
-            try:
-                summary = summarize_markdown(content)
-                document_nodes.append({
-                    "id": file.name,
-                    "title": file.stem,
-                    "summary": summary,
-                })
-            except Exception as e:
-                print(f"[!] Skipping summary for {file.name}: {e}")
-
-            try:
-                triples = extract_relationships(content)
-                for t in triples:
-                    relationships.append({
-                        "subject": t["subject"],
-                        "predicate": t["predicate"],
-                        "object": t["object"],
-                        "source": file.name,
-                        "namelist": "markdown"
-                    })
-            except Exception as e:
-                print(f"[!] Skipping relationships for {file.name}: {e}")
-
-        elif file.suffix == ".json" and "json" in filetypes:
-            print(f"\U0001F4E6 Loading JSON file: {file.name}")
-            try:
-                with open(file) as f:
-                    data = json.load(f)
-
-                if file.name == "xqe_univ_kg_load_v1.json":
-                    print("🛠 Forcing parameter list parser")
-                    triples = extract_triples_from_parameter_list(file.name, data)
-                    relationships.extend(triples)
-                    print(f"✅ Extracted {len(triples)} triples from {file.name}")
-                    continue
-
-                if isinstance(data, list):
-                    if all(isinstance(d, dict) and all(k in d for k in ("subject", "predicate", "object")) for d in data):
-                        relationships.extend(data)
-                    elif all(isinstance(d, dict) and all(k in d for k in ("id", "title", "summary")) for d in data):
-                        document_nodes.extend(data)
-                    elif all(isinstance(d, dict) and "Parameter_Name" in d for d in data):
-                        print(f"\U0001F527 Detected parameter list in {file.name}")
-                        triples = extract_triples_from_parameter_list(file.name, data)
-                        relationships.extend(triples)
-                        print(f"✅ Extracted {len(triples)} triples from {file.name}")
-                    else:
-                        print(f"[!] Unknown JSON list structure in {file.name}")
-                elif isinstance(data, dict):
-                    print(f"\U0001F501 Attempting conversion from nested dict JSON in {file.name}")
-                    triples = convert_dict_to_triples(file.name, data)
-                    relationships.extend(triples)
-                    print(f"✅ Converted {len(triples)} triples from {file.name}")
+def iter_structured_file(file: Path):
+    """Parse one JSON or YAML file, yielding ``("document", node)`` and ``("relationship", triple)`` pairs.
+
+    Triples are produced while the parsed file is walked, so they are never
+    all held at once. Runs in a worker process, so it only touches its own
+    file.
+    """
+    if file.suffix == ".json":
+        print(f"\U0001F4E6 Loading JSON file: {file.name}")
+        try:
+            with open(file) as f:
+                data = json.load(f)
+
+            if file.name == "xqe_univ_kg_load_v1.json":
+                print("🛠 Forcing parameter list parser")
+                count = 0
+                for t in extract_triples_from_parameter_list(file.name, data):
+                    count += 1
+                    yield "relationship", t
+                print(f"✅ Extracted {count} triples from {file.name}")
+                return
+
+            if isinstance(data, list):
+                if all(isinstance(d, dict) and all(k in d for k in ("subject", "predicate", "object")) for d in data):
+                    for d in data:
+                        yield "relationship", tag_source(d, file)
+                elif all(isinstance(d, dict) and all(k in d for k in ("id", "title", "summary")) for d in data):
+                    for d in data:
+                        yield "document", d
+                elif all(isinstance(d, dict) and "Parameter_Name" in d for d in data):
+                    print(f"\U0001F527 Detected parameter list in {file.name}")
+                    count = 0
+                    for t in extract_triples_from_parameter_list(file.name, data):
+                        count += 1
+                        yield "relationship", t
+                    print(f"✅ Extracted {count} triples from {file.name}")
                 else:
-                    print(f"[!] Unknown JSON structure in {file.name}")
-            except Exception as e:
-                print(f"[!] Failed to load JSON from {file.name}: {e}")
-
-        elif file.suffix in [".yaml", ".yml"] and "yaml" in filetypes:
-            print(f"\U0001F499 Loading YAML file: {file.name}")
-            try:
-                with open(file) as f:
-                    data = yaml.safe_load(f)
-
-                if isinstance(data, list):
-                    if all(isinstance(d, dict) and all(k in d for k in ("subject", "predicate", "object")) for d in data):
-                        relationships.extend(data)
-                    elif all(isinstance(d, dict) and all(k in d for k in ("id", "title", "summary")) for d in data):
-                        document_nodes.extend(data)
-                    else:
-                        print(f"[!] Unknown YAML list structure in {file.name}")
-                elif isinstance(data, dict):
-                    triples = convert_dict_to_triples(file.name, data)
-                    relationships.extend(triples)
-                    print(f"✅ Converted {len(triples)} triples from {file.name}")
+                    print(f"[!] Unknown JSON list structure in {file.name}")
+            elif isinstance(data, dict):
+                print(f"\U0001F501 Attempting conversion from nested dict JSON in {file.name}")
+                count = 0
+                for t in convert_dict_to_triples(file.name, data):
+                    count += 1
+                    yield "relationship", t
+                print(f"✅ Converted {count} triples from {file.name}")
+            else:
+                print(f"[!] Unknown JSON structure in {file.name}")
+        except Exception as e:
+            print(f"[!] Failed to load JSON from {file.name}: {e}")
+
+    else:
+        print(f"\U0001F499 Loading YAML file: {file.name}")
+        try:
+            with open(file) as f:
+                data = yaml.safe_load(f)
+
+            if isinstance(data, list):
+                if all(isinstance(d, dict) and all(k in d for k in ("subject", "predicate", "object")) for d in data):
+                    for d in data:
+                        yield "relationship", tag_source(d, file)
+                elif all(isinstance(d, dict) and all(k in d for k in ("id", "title", "summary")) for d in data):
+                    for d in data:
+                        yield "document", d
                 else:
-                    print(f"[!] Unknown YAML structure in {file.name}")
-            except Exception as e:
-                print(f"[!] Failed to load YAML from {file.name}: {e}")
+                    print(f"[!] Unknown YAML list structure in {file.name}")
+            elif isinstance(data, dict):
+                count = 0
+                for t in convert_dict_to_triples(file.name, data):
+                    count += 1
+                    yield "relationship", t
+                print(f"✅ Converted {count} triples from {file.name}")
+            else:
+                print(f"[!] Unknown YAML structure in {file.name}")
+        except Exception as e:
+            print(f"[!] Failed to load YAML from {file.name}: {e}")
+
+def load_structured_file(file: Path):
+    """Parse one JSON or YAML file into lists of document nodes and relationships."""
+    document_nodes = []
+    relationships = []
+    for kind, record in iter_structured_file(file):
+        (document_nodes if kind == "document" else relationships).append(record)
+    return document_nodes, relationships
+
+def spill_structured_file(file: Path, directory: str):
+    """Write the records of :func:`iter_structured_file` to a JSONL file in ``directory``; returns its path.
+
+    Used by worker processes, which hand back a file path instead of pickling
+    every triple to the parent.
+    """
+    fd, path = tempfile.mkstemp(prefix=f"{file.stem}-", suffix=".jsonl", dir=directory)
+    with os.fdopen(fd, "w") as f:
+        for kind, record in iter_structured_file(file):
+            f.write(json.dumps([kind, record]) + "\n")
+    return path
 
+def list_source_files(source_dir: Path, filetypes: set):
+    """Files in ``source_dir`` handled for the requested ``filetypes``, sorted by name."""
+    return [f for f in sorted(source_dir.iterdir())
+            if (f.suffix in [".md", ".mdx"] and "md" in filetypes)
+            or (f.suffix == ".json" and "json" in filetypes)
+            or (f.suffix in [".yaml", ".yml"] and "yaml" in filetypes)]
+
+def stream_files(files, openai_client=None, workers=None, max_in_flight=8, requests_per_second=None,
+                 chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, spill_dir=None):
+    """Yield ``(file, kind, record)`` for every document node and relationship extracted from ``files``.
+
+    Markdown files go through :func:`extract_markdown` first (their LLM
+    requests are sent together); records then follow in the order of
+    ``files``. JSON and YAML files are parsed in a pool of ``workers``
+    processes (``0`` parses them in this process), each streaming its records
+    to a temporary JSONL file under ``spill_dir`` that is read back and
+    deleted in turn, so no file's triples are held in memory at once. Only
+    ``2 * workers`` files are submitted ahead of the one being read, which
+    bounds the disk space of the spill files too.
+
+    Parameters
+    ----------
+    openai_client:
+        Client with a ``chat.completions.create`` method, e.g. a
+        ``fake_llm.FakeOpenAIClient`` for offline runs. Defaults to OpenAI.
+    max_in_flight, requests_per_second:
+        Concurrency and rate limit for LLM requests.
+    chunk_size, overlap:
+        Chunking of markdown files, see :func:`chunk_text`.
+    spill_dir:
+        Parent folder of the worker spill files (default: the system
+        temporary folder).
+
+    Yields
+    ------
+    tuple[Path, str, dict]
+        Source file, ``"document"`` or ``"relationship"``, and the record.
+    """
+    markdown = [f for f in files if f.suffix in [".md", ".mdx"]]
+    structured = [f for f in files if f.suffix not in [".md", ".mdx"]]
+    extracted = {}
+    if markdown:
+        runner = AsyncRolloutRunner(openai_client or get_client(), max_in_flight=max_in_flight,
+                                    requests_per_second=requests_per_second, cache=cache)
+        extracted = dict(zip(markdown, extract_markdown(markdown, runner, chunk_size, overlap)))
+
+    def markdown_records(file):
+        node, triples = extracted.pop(file)
+        if node:
+            yield file, "document", node
+        for t in triples:
+            yield file, "relationship", t
+
+    if workers == 0 or len(structured) <= 1:
+        for file in files:
+            if file in extracted:
+                yield from markdown_records(file)
+            else:
+                for kind, record in iter_structured_file(file):
+                    yield file, kind, record
+        return
+
+    with tempfile.TemporaryDirectory(prefix="extract-", dir=spill_dir) as tmp, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        # Executor.map would submit every file at once and let the spill files of
+        # the whole corpus pile up on disk; keep only a few files ahead instead
+        pending = iter(structured)
+        ahead = collections.deque(
+            pool.submit(spill_structured_file, file, tmp)
+            for file in itertools.islice(pending, 2 * (workers or os.cpu_count() or 1))
+        )
+        for file in files:
+            if file in extracted:
+                yield from markdown_records(file)
+                continue
+            path = ahead.popleft().result()
+            for following in itertools.islice(pending, 1):
+                ahead.append(pool.submit(spill_structured_file, following, tmp))
+            with open(path) as f:
+                for line in f:
+                    kind, record = json.loads(line)
+                    yield file, kind, record
+            os.unlink(path)
+
+def extract_files(files, **kwargs):
+    """Extract ``files`` into memory; see :func:`stream_files` for ``kwargs``.
+
+    Returns
+    -------
+    dict[Path, tuple[list[dict], list[dict]]]
+        Document nodes and relationships per file, in the order of ``files``.
+    """
+    results = {file: ([], []) for file in files}
+    for file, kind, record in stream_files(files, **kwargs):
+        results[file][0 if kind == "document" else 1].append(record)
+    return results
+
+def process_directory(source_dir: Path, filetypes: set, **kwargs):
+    """Stream the records of every file in ``source_dir``; see :func:`stream_files` for ``kwargs``.
+
+    Yields
+    ------
+    tuple[str, dict]
+        ``"document"`` or ``"relationship"`` and the record.
+    """
+    for _, kind, record in stream_files(list_source_files(source_dir, filetypes), **kwargs):
+        yield kind, record
+
+def file_digest(file: Path):
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def extractor_signature(file: Path, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Version string of the code path that extracts ``file``; a change forces re-extraction."""
+    if file.suffix in [".md", ".mdx"]:
+        return f"{EXTRACTOR_VERSION}:md:{chunk_size}:{overlap}"
+    return f"{EXTRACTOR_VERSION}:structured"
+
+def load_manifest(path):
+    """File entries of the manifest at ``path``; ``None`` if it is missing or from another ``EXTRACTOR_VERSION``."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    if data.get("extractor_version") != EXTRACTOR_VERSION:
+        return None
+    return data.get("files", {})
+
+def plan_incremental(files, manifest, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Compare ``files`` against ``manifest``.
+
+    A file is unchanged if its size, modification time and extractor
+    signature match the manifest; if only the modification time differs its
+    content hash decides.
+
+    Returns
+    -------
+    tuple[list[Path], list[str], dict]
+        Files to (re-)extract, manifest names of deleted files, and the
+        manifest entries of all current files (stale ones refreshed later).
+    """
+    changed, entries = [], {}
+    for file in files:
+        stat = file.stat()
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                 "extractor": extractor_signature(file, chunk_size, overlap)}
+        old = manifest.get(file.name)
+        if old and all(old.get(k) == v for k, v in entry.items()):
+            entries[file.name] = old
+            continue
+        entry["sha256"] = file_digest(file)
+        if old and old.get("sha256") == entry["sha256"] and old.get("extractor") == entry["extractor"]:
+            entries[file.name] = {**old, **entry}  # touched, not changed
+            continue
+        changed.append(file)
+        entries[file.name] = entry
+    current = {f.name for f in files}
+    deleted = [name for name in manifest if name not in current]
+    return changed, deleted, entries
+
+def retract(document_nodes, relationships, names, manifest):
+    """Drop the outputs previously extracted from the files ``names``.
+
+    Relationships are matched by their ``source_file`` field, or by
+    ``source`` if they have none (see :func:`tag_source`); document nodes by
+    the ids recorded for each file in the manifest. ``relationships`` may be
+    any iterable; it is filtered lazily.
+    """
+    names = set(names)
+    doc_ids = {doc_id for name in names for doc_id in manifest.get(name, {}).get("documents", [])}
+    document_nodes = [d for d in document_nodes if d.get("id") not in doc_ids]
+    relationships = (r for r in relationships if r.get("source_file", r.get("source")) not in names)
     return document_nodes, relationships
 
+def write_json_atomic(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+def deduplicate_relationships(relationships, memory_limit=DEDUP_MEMORY_BYTES):
+    """Distinct relationships in first-seen order; see :class:`triple_stream.HashDeduplicator`."""
+    with HashDeduplicator(memory_limit) as dedup:
+        return list(dedup.filter(relationships))
+
 def main():
     parser = argparse.ArgumentParser(description="Extract KG data from Markdown, JSON, and/or YAML files.")
     parser.add_argument("--source", "-s", type=str, default="markdown_files", help="Path to the source folder.")
     parser.add_argument("--types", "-t", type=str, default="all", choices=["md", "json", "yaml", "all"],
                         help="Which file types to process: md, json, yaml, or all.")
     parser.add_argument("--out-docs", default="document_nodes.json", help="Output path for document nodes.")
-    parser.add_argument("--out-rels", default="relationships.json", help="Output path for relationships.")
+    parser.add_argument("--out-rels", default="relationships.json",
+                        help="Output path for relationships (.jsonl for one object per line, else a JSON array).")
+    parser.add_argument("--out-csv", default="relationships.csv", help="CSV export of the relationships.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH,
+                        help="On-disk LLM response cache shared with training.")
+    parser.add_argument("--no-cache", action="store_true", help="Always query the LLM.")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Characters per markdown chunk.")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP,
+                        help="Characters shared by neighbouring chunks.")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="Concurrent LLM requests.")
+    parser.add_argument("--requests-per-second", type=float, default=None, help="LLM request rate limit.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes parsing JSON/YAML files (default: CPU count, 0 for none).")
+    parser.add_argument("--out-columnar", default=None,
+                        help="Also write the relationships as a memory-mappable columnar KG directory.")
+    parser.add_argument("--manifest", default="kg_manifest.json",
+                        help="Content hashes and extractor versions of the extracted files.")
+    parser.add_argument("--incremental", "-i", action="store_true",
+                        help="Only re-extract new or changed files and merge into the existing outputs.")
+    parser.add_argument("--dedup-memory-mb", type=float, default=DEDUP_MEMORY_BYTES / (1 << 20),
+                        help="Memory for relationship hashes before deduplication spills to disk.")
+    parser.add_argument("--spill-dir", default=None,
+                        help="Folder for temporary spill files (default: the system temporary folder).")
 
     args = parser.parse_args()
+    global cache
+    if not args.no_cache:
+        cache = ResponseCache(args.cache)
     source_dir = Path(args.source)
     filetypes = {"md", "json", "yaml"} if args.types == "all" else {args.types}
+    files = list_source_files(source_dir, filetypes)
+
+    manifest = {}
+    document_nodes, relationships = [], []
+    if args.incremental:
+        # Without a current manifest, the files behind the existing outputs are
+        # unknown and merging would duplicate them
+        previous = load_manifest(args.manifest)
+        if not (os.path.exists(args.out_docs) and os.path.exists(args.out_rels)):
+            print("[!] Existing outputs not found. Running a full extraction.")
+        elif previous is None:
+            print(f"[!] No manifest from extractor version {EXTRACTOR_VERSION} at {args.manifest}. "
+                  f"Running a full extraction.")
+        else:
+            manifest = previous
+            with open(args.out_docs) as f:
+                document_nodes = json.load(f)
+            relationships = iter_records(args.out_rels)  # streamed while the new file is written
+
+    changed, deleted, entries = plan_incremental(files, manifest, args.chunk_size, args.chunk_overlap)
+    if args.incremental:
+        print(f"\U0001F501 {len(changed)} new or changed, {len(deleted)} deleted, "
+              f"{len(files) - len(changed)} unchanged files")
+    document_nodes, relationships = retract(document_nodes, relationships, [f.name for f in changed] + deleted,
+                                            manifest)
 
-    document_nodes, relationships = process_directory(source_dir, filetypes)
+    for file in changed:
+        entries[file.name]["documents"] = []
 
-    # Deduplicate
-    unique_relationships = {
-        json.dumps(rel, sort_keys=True): rel for rel in relationships
-    }
-    relationships = list(unique_relationships.values())
-    print(f"✅ Deduplicated to {len(relationships)} unique relationships")
+    def extracted_relationships():
+        for file, kind, record in stream_files(
+            changed, workers=args.workers, max_in_flight=args.max_in_flight,
+            requests_per_second=args.requests_per_second, chunk_size=args.chunk_size, overlap=args.chunk_overlap,
+            spill_dir=args.spill_dir,
+        ):
+            if kind == "relationship":
+                yield record
+                continue
+            document_nodes.append(record)
+            if isinstance(record, dict) and "id" in record:
+                entries[file.name]["documents"].append(record["id"])
+
+    # Kept and new relationships stream through deduplication straight into the writers
+    dedup = HashDeduplicator(int(args.dedup_memory_mb * (1 << 20)), spill_dir=args.spill_dir)
+    try:
+        with open_record_writer(args.out_rels) as rels_out, CsvWriter(args.out_csv) as csv_out:
+            for rel in dedup.filter(itertools.chain(relationships, extracted_relationships())):
+                rels_out.write(rel)
+                csv_out.write(rel)
+    finally:
+        dedup.close()
+    spilled = f", {dedup.spills} hash run(s) spilled to disk" if dedup.spills else ""
+    print(f"✅ Deduplicated {dedup.seen} to {dedup.unique} unique relationships{spilled}")
+    print(f"✅ Saved {rels_out.count} relationships to {args.out_rels}")
+    print(f"✅ Exported relationships to {args.out_csv}")
 
-    with open(args.out_docs, "w") as f:
-        json.dump(document_nodes, f, indent=2)
+    write_json_atomic(args.out_docs, document_nodes)
     print(f"✅ Saved {len(document_nodes)} documents to {args.out_docs}")
 
-    with open(args.out_rels, "w") as f:
-        json.dump(relationships, f, indent=2)
-    print(f"✅ Saved {len(relationships)} relationships to {args.out_rels}")
+    if args.out_columnar:
+        TripleStore.from_triples(iter_records(args.out_rels)).save(args.out_columnar)
+        print(f"✅ Saved columnar KG to {args.out_columnar}")
 
-    # Export to CSV
-    with open("relationships.csv", "w", newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=["subject", "predicate", "object", "source", "namelist"])
-        writer.writeheader()
-        writer.writerows(relationships)
-    print("✅ Exported relationships to relationships.csv")
+    # Written last: a crash before this point re-extracts the changed files next time
+    write_json_atomic(args.manifest, {"extractor_version": EXTRACTOR_VERSION, "files": entries})
+    print(f"✅ Updated manifest {args.manifest}")
+    if cache is not None:
+        print(f"LLM cache: {cache.stats()}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,69 @@
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Optional, Union
+
+Responder = Union[str, Callable[[str], str]]
+
+
+class FakeOpenAIClient:
+    """Offline stand-in for the OpenAI client's ``chat.completions.create``.
+
+    Returns canned (or computed) completions after a configurable latency,
+    with OpenAI-shaped ``choices``/``message``/``usage`` objects and support
+    for the ``n`` parameter. Safe to call from several threads, so it can
+    drive :class:`AsyncRolloutRunner` and the extraction pipeline in tests and
+    benchmarks without network access.
+    """
+
+    def __init__(
+        self,
+        response: Responder = "",
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        """Construct the client.
+
+        Parameters
+        ----------
+        response:
+            Completion text, or a callable mapping the prompt to the text.
+        latency:
+            Seconds each call sleeps before returning.
+        jitter:
+            Uniform random extra latency in seconds, up to this value.
+        seed:
+            Seed of the jitter generator.
+        """
+        self.response = response
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model: str = "", messages=(), temperature: float = 0.0, n: int = 1, **kwargs):
+        """Mimic ``chat.completions.create`` for a list of chat messages."""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        prompt = messages[-1]["content"] if messages else ""
+        content = self.response(prompt) if callable(self.response) else self.response
+        return SimpleNamespace(
+            model=model,
+            choices=[
+                SimpleNamespace(index=i, message=SimpleNamespace(role="assistant", content=content))
+                for i in range(n)
+            ],
+            usage=SimpleNamespace(
+                prompt_tokens=len(prompt) // 4,
+                completion_tokens=n * (len(content) // 4),
+                total_tokens=len(prompt) // 4 + n * (len(content) // 4),
+            ),
+        )
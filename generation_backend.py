@@ -0,0 +1,237 @@
+import abc
+import math
+import random
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from async_rollout import AsyncRolloutRunner
+from llm_cache import ResponseCache
+from reward_engine import CARDS, _ASSIGNMENT, _strip_comment
+
+BACKENDS = ("openai", "retrieval")
+
+_WORD = re.compile(r"[\w][\w.]*")
+_BASE_KEY = re.compile(r"\s*\(.*$")
+
+
+class GenerationBackend(abc.ABC):
+    """Turns prompts into QE input text.
+
+    Subclasses implement :meth:`generate_batch`; :meth:`generate` is a
+    single-prompt convenience wrapper. :meth:`generate_samples` asks for
+    several completions per prompt, through one batch call unless a backend
+    has a cheaper way.
+
+    Backends that sample locally keep their generator in ``rng``, so the
+    training loop can checkpoint its state; it is ``None`` otherwise.
+    """
+
+    rng: Optional[random.Random] = None
+
+    def generate(self, prompt: str, temperature: float = 0.7) -> str:
+        """Generate a completion for one prompt."""
+        return self.generate_batch([prompt], temperature=temperature)[0]
+
+    @abc.abstractmethod
+    def generate_batch(self, prompts: Sequence[str], temperature: float = 0.7) -> List[str]:
+        """Generate one completion per prompt, in the order of ``prompts``."""
+
+    def generate_samples(self, prompts: Sequence[str], n: int, temperature: float = 0.7) -> List[List[str]]:
+        """Generate ``n`` completions per prompt, in the order of ``prompts``."""
+        flat = self.generate_batch([p for p in prompts for _ in range(n)], temperature=temperature)
+        return [flat[i:i + n] for i in range(0, len(flat), n)]
+
+
+def _default_client() -> Any:
+    from openai import OpenAI
+
+    return OpenAI()
+
+
+class OpenAIBackend(GenerationBackend):
+    """Chat completion API backend, sending batches concurrently.
+
+    Requests go through :class:`AsyncRolloutRunner` (bounded concurrency,
+    rate limit, retries, response cache). The OpenAI client is only created
+    when no ``openai_client`` is passed, so other backends never need the
+    ``openai`` package or an API key.
+    """
+
+    def __init__(
+        self,
+        openai_client: Any = None,
+        model: str = "gpt-4",
+        max_in_flight: int = 4,
+        requests_per_second: Optional[float] = None,
+        max_retries: int = 3,
+        cache: Optional[ResponseCache] = None,
+        on_response: Optional[Callable[[float, Any], None]] = None,
+        shared_semaphore: Any = None,
+    ) -> None:
+        """Construct the backend; see :class:`AsyncRolloutRunner` for the parameters."""
+        self.runner = AsyncRolloutRunner(
+            openai_client if openai_client is not None else _default_client(),
+            max_in_flight=max_in_flight, requests_per_second=requests_per_second,
+            max_retries=max_retries, model=model, cache=cache, on_response=on_response,
+            shared_semaphore=shared_semaphore,
+        )
+
+    def generate_batch(self, prompts: Sequence[str], temperature: float = 0.7) -> List[str]:
+        return self.runner.generate_batch(prompts, temperature=temperature)
+
+    def generate_samples(self, prompts: Sequence[str], n: int, temperature: float = 0.7) -> List[List[str]]:
+        # One request per prompt with the API's ``n`` parameter
+        return self.runner.generate_samples_batch(prompts, n, temperature=temperature)
+
+
+@dataclass(frozen=True)
+class _Reference:
+    namelists: Tuple[Tuple[str, Tuple[Tuple[str, str], ...]], ...]
+    cards: str
+    words: frozenset
+
+
+def _parse_reference(text: str) -> _Reference:
+    namelists: List[Tuple[str, List[Tuple[str, str]]]] = []
+    card_lines: List[str] = []
+    current = None
+    for raw in text.splitlines():
+        line = _strip_comment(raw).strip()
+        if card_lines or (line and line.split()[0].upper() in CARDS and "=" not in line):
+            card_lines.append(raw.rstrip())
+            continue
+        if line.startswith("&"):
+            current = []
+            namelists.append((line[1:].split()[0].upper(), current))
+            line = line[1:].partition(" ")[2]
+        if current is not None:
+            current.extend((key.strip(), value) for key, value in _ASSIGNMENT.findall(line.rstrip("/")))
+            if line.endswith("/"):
+                current = None
+    words = set(_WORD.findall(text.lower()))
+    return _Reference(tuple((name, tuple(kv)) for name, kv in namelists), "\n".join(card_lines).strip(),
+                      frozenset(words))
+
+
+def _base_key(key: str) -> str:
+    return _BASE_KEY.sub("", key).lower()
+
+
+class RetrievalBackend(GenerationBackend):
+    """Offline stand-in that answers from the reference inputs in microseconds.
+
+    For each prompt the reference under ``root`` sharing the most
+    IDF-weighted words (values, species and cards; not parameter names) with
+    the prompt is retrieved (at ``temperature > 0``
+    it is sampled with probability proportional to
+    ``exp(score / temperature)``). Its namelists are then rewritten from the prompt:
+
+    * ``key = value`` settings in the prompt (instruction and template)
+      override or add parameters,
+    * unless ``keep_unmentioned`` is set, parameters whose name appears
+      nowhere in the prompt are dropped. The KG facts name the parameters of
+      each namelist, so the output, and hence the reward, depends on which
+      triples the policy selected.
+
+    Cards are copied from the reference. Outputs for ``temperature == 0`` are
+    memoized per prompt.
+    """
+
+    def __init__(
+        self,
+        root: str = "quantum_inputs",
+        pattern: str = "**/*.in",
+        keep_unmentioned: bool = False,
+        seed: Optional[int] = None,
+    ) -> None:
+        """Index the reference inputs.
+
+        Parameters
+        ----------
+        root, pattern:
+            Folder and glob of the reference ``.in`` files.
+        keep_unmentioned:
+            Keep reference parameters that the prompt never mentions.
+        seed:
+            Seed of the generator used for ``temperature > 0``.
+        """
+        paths = sorted(Path(root).glob(pattern))
+        if not paths:
+            raise ValueError(f"No reference inputs matching {pattern} under {root}")
+        self.names = [str(p) for p in paths]
+        self.references = [_parse_reference(p.read_text()) for p in paths]
+        self.keep_unmentioned = keep_unmentioned
+        self.rng = random.Random(seed)
+        # Namelist of every parameter seen in a reference, for settings the
+        # retrieved reference does not contain
+        self.key_namelist: Dict[str, str] = {}
+        for ref in self.references:
+            for namelist, assignments in ref.namelists:
+                for key, _ in assignments:
+                    self.key_namelist.setdefault(_base_key(key), namelist)
+        # Inverted index with IDF weights: words shared by every reference
+        # carry no weight, rare ones such as species labels and
+        # pseudopotential files decide the match.
+        # Parameter names are left out: the KG facts in every prompt list
+        # them, whereas values, species and cards identify the calculation
+        postings: Dict[str, List[int]] = {}
+        for i, ref in enumerate(self.references):
+            for word in ref.words - self.key_namelist.keys():
+                postings.setdefault(word, []).append(i)
+        n = len(self.references)
+        self._postings = {w: (ids, math.log(n / len(ids))) for w, ids in postings.items() if len(ids) < n}
+        self._cached = lru_cache(maxsize=4096)(self._generate)
+
+    def generate_batch(self, prompts: Sequence[str], temperature: float = 0.7) -> List[str]:
+        if temperature <= 0:
+            return [self._cached(p, 0.0) for p in prompts]
+        return [self._generate(p, temperature) for p in prompts]
+
+    def _retrieve(self, words: frozenset, temperature: float) -> _Reference:
+        scores = [0.0] * len(self.references)
+        for word in words:
+            hit = self._postings.get(word)
+            if hit is not None:
+                for i in hit[0]:
+                    scores[i] += hit[1]
+        best = max(scores)
+        if temperature <= 0:
+            return self.references[scores.index(best)]
+        weights = [math.exp((s - best) / temperature) for s in scores]
+        return self.rng.choices(self.references, weights)[0]
+
+    def _generate(self, prompt: str, temperature: float) -> str:
+        words = frozenset(_WORD.findall(prompt.lower()))
+        ref = self._retrieve(words, temperature)
+        settings = {key.strip(): value for line in prompt.splitlines() if "=" in line
+                    for key, value in _ASSIGNMENT.findall(line)}
+        settings = {k: v[:-1] if v.endswith(".") and not v.startswith(".") else v for k, v in settings.items()}
+
+        namelists = {name: dict(assignments) for name, assignments in ref.namelists}
+        if not self.keep_unmentioned:
+            for assignments in namelists.values():
+                for key in [k for k in assignments if _base_key(k) not in words]:
+                    del assignments[key]
+        for key, value in settings.items():
+            target = next((name for name, kv in namelists.items() if key in kv), None)
+            target = target or self.key_namelist.get(_base_key(key))
+            if target is not None:
+                namelists.setdefault(target, {})[key] = value
+
+        blocks = []
+        for name, assignments in namelists.items():
+            body = "".join(f"  {key} = {value}\n" for key, value in assignments.items())
+            blocks.append(f"&{name}\n{body}/")
+        return "\n\n".join(blocks + [ref.cards]) + "\n"
+
+
+def make_backend(name: str, **kwargs: Any) -> GenerationBackend:
+    """Build a backend by name (``"openai"`` or ``"retrieval"``)."""
+    if name == "openai":
+        return OpenAIBackend(**kwargs)
+    if name == "retrieval":
+        return RetrievalBackend(**kwargs)
+    raise ValueError(f"Unknown generation backend: {name}")
@@ -1,4 +1,8 @@
 import argparse
+import importlib.util
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from bs4 import BeautifulSoup
 import html2text
@@ -10,28 +14,138 @@ REPO_ROOT = Path(__file__).resolve().parents[1]
 DEFAULT_SOURCE = REPO_ROOT / "html2markdown"
 DEFAULT_DEST = REPO_ROOT / "markdown_files"
 
+# lxml parses several times faster than the pure-Python html.parser
+PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+SPLIT_MODES = ("none", "section", "parameter")
+
 def convert_html_to_markdown(html_content):
     h = html2text.HTML2Text()
     h.ignore_links = False
     h.body_width = 0
     return h.handle(html_content)
 
-def process_html_files(source_dir: Path, dest_dir: Path):
+def _safe_name(name):
+    return re.sub(r"[^\w.+-]", "_", name.strip().lstrip("&")) or "section"
+
+def split_sections(body):
+    """Cut ``body`` into its namelist and card sections.
+
+    QE's INPUT_*.html pages render each namelist and card as a top-level
+    table whose ``<h2>`` holds a ``span.namelist`` or ``span.card``. The
+    tables are removed from ``body``, which keeps the introduction.
+
+    Returns
+    -------
+    list[tuple[str, Tag]]
+        Section name (e.g. ``"&CONTROL"``, ``"ATOMIC_SPECIES"``) and table.
+    """
+    sections = []
+    for span in body.select("h2 span.namelist, h2 span.card"):
+        table = span.find_parent("h2").find_parent("table")
+        if table is not None:
+            sections.append((span.get_text(strip=True), table))
+    for _, table in sections:
+        table.extract()
+    return sections
+
+def split_parameters(section):
+    """Cut the per-parameter tables out of a namelist or card ``section``.
+
+    Parameter tables start with a ``<th>`` naming the variable; they are
+    removed from ``section``, which keeps the header and any free text.
+    """
+    params = []
+    for th in section.select("table > tr > th[width]"):
+        table = th.find_parent("table")
+        if table is not section and table.parent is not None:
+            params.append((th.get_text(" ", strip=True), table))
+            table.extract()
+    return params
+
+def render_markdown(html_file: Path, split="none"):
+    """Convert one HTML file into ``(file name, markdown)`` pairs.
+
+    With ``split="none"`` the whole page becomes ``<stem>.md``. ``"section"``
+    writes ``<stem>__00_intro.md`` plus one file per namelist/card
+    (``<stem>__01_CONTROL.md``, ...); ``"parameter"`` additionally writes one
+    file per parameter (``<stem>__01_CONTROL__calculation.md``), repeated
+    parameter names within a section getting a ``_2``, ``_3``, ... suffix.
+    """
+    with open(html_file, "r", encoding="utf-8") as f:
+        soup = BeautifulSoup(f.read(), PARSER)
+    body = soup.body or soup  # fallback if <body> is missing
+    stem = html_file.stem
+    if split == "none":
+        return [(f"{stem}.md", convert_html_to_markdown(str(body)))]
+
+    outputs = []
+    for i, (name, table) in enumerate(split_sections(body), start=1):
+        prefix = f"{stem}__{i:02d}_{_safe_name(name)}"
+        if split == "parameter":
+            used = set()
+            for param, param_table in split_parameters(table):
+                # Several parameters can share a name (e.g. per-solvent tables); number the repeats
+                base = param_name = _safe_name(param)
+                count = 1
+                while param_name in used:
+                    count += 1
+                    param_name = f"{base}_{count}"
+                used.add(param_name)
+                markdown = f"# {name}: {param}\n\n" + convert_html_to_markdown(str(param_table))
+                outputs.append((f"{prefix}__{param_name}.md", markdown))
+        outputs.append((f"{prefix}.md", convert_html_to_markdown(str(table))))
+    outputs.insert(0, (f"{stem}__00_intro.md", convert_html_to_markdown(str(body))))
+    return outputs
+
+def _index_path(dest_dir: Path, html_file: Path):
+    # Not .md/.json/.yaml, so extract_kg_data.py does not pick it up
+    return dest_dir / f"{html_file.stem}.sections"
+
+def is_up_to_date(html_file: Path, dest_dir: Path, split):
+    """True if the outputs of ``html_file`` exist, were written with ``split`` and are newer than it."""
+    index = _index_path(dest_dir, html_file)
+    if not index.exists() or index.stat().st_mtime_ns < html_file.stat().st_mtime_ns:
+        return False
+    mode, *names = index.read_text().splitlines()
+    return mode == split and all((dest_dir / n).exists() for n in names)
+
+def convert_file(html_file: Path, dest_dir: Path, split="none"):
+    """Convert ``html_file`` and write its markdown files; runs in a worker process."""
+    print(f"🔄 Converting {html_file.name}")
+    outputs = render_markdown(html_file, split)
+
+    index = _index_path(dest_dir, html_file)
+    stale = set(index.read_text().splitlines()[1:]) if index.exists() else set()
+    for name, markdown in outputs:
+        tmp = dest_dir / f".{name}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(markdown)
+        os.replace(tmp, dest_dir / name)
+        stale.discard(name)
+    for name in stale:
+        (dest_dir / name).unlink(missing_ok=True)
+
+    # Written last: an interrupted conversion is redone on the next run
+    index.write_text("\n".join([split] + [name for name, _ in outputs]) + "\n")
+    print(f"✅ Saved {len(outputs)} file(s) for {html_file.name}")
+    return len(outputs)
+
+def process_html_files(source_dir: Path, dest_dir: Path, split="none", workers=None, force=False):
     if not dest_dir.exists():
         dest_dir.mkdir(parents=True)
 
-    for html_file in source_dir.rglob("*.html"):
-        print(f"🔄 Converting {html_file.name}")
-        with open(html_file, "r", encoding="utf-8") as f:
-            soup = BeautifulSoup(f.read(), "html.parser")
-            body = soup.body or soup  # fallback if <body> is missing
-            markdown = convert_html_to_markdown(str(body))
+    html_files = sorted(source_dir.rglob("*.html"))
+    todo = [f for f in html_files if force or not is_up_to_date(f, dest_dir, split)]
+    for html_file in sorted(set(html_files) - set(todo)):
+        print(f"⏭ {html_file.name} is up to date")
 
-        md_filename = html_file.stem + ".md"
-        md_path = dest_dir / md_filename
-        with open(md_path, "w", encoding="utf-8") as f:
-            f.write(markdown)
-        print(f"✅ Saved {md_path}")
+    if workers == 0 or len(todo) <= 1:
+        for html_file in todo:
+            convert_file(html_file, dest_dir, split)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(convert_file, todo, [dest_dir] * len(todo), [split] * len(todo)))
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -49,13 +163,30 @@ def parse_args() -> argparse.Namespace:
         default=DEFAULT_DEST,
         help="Output directory for Markdown files (default: markdown_files)",
     )
+    parser.add_argument(
+        "--split",
+        choices=SPLIT_MODES,
+        default="none",
+        help="One file per page, per namelist/card, or per namelist/card and parameter (default: none)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Conversion processes (default: CPU count, 0 to convert in this process)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Convert files even if their outputs are up to date",
+    )
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
     print(
-        f"📂 Converting HTML files from {args.source} to Markdown in {args.dest}"
+        f"📂 Converting HTML files from {args.source} to Markdown in {args.dest} (parser: {PARSER})"
     )
-    process_html_files(args.source, args.dest)
+    process_html_files(args.source, args.dest, split=args.split, workers=args.workers, force=args.force)
     print("✅ All conversions done.")
@@ -0,0 +1,32 @@
+from pathlib import Path
+
+import pytest
+
+from html_to_md import SPLIT_MODES, convert_file, render_markdown
+
+PW_DOC = Path(__file__).with_name("pw.x_doc.html")
+
+
+@pytest.mark.parametrize("split", SPLIT_MODES)
+def test_output_names_are_unique(split):
+    names = [name for name, _ in render_markdown(PW_DOC, split)]
+    assert len(names) == len(set(names))
+
+
+def test_repeated_parameters_are_numbered():
+    outputs = dict(render_markdown(PW_DOC, "parameter"))
+    assert "pw.x_doc__17_SOLVENTS__X.md" in outputs
+    assert "pw.x_doc__17_SOLVENTS__X_2.md" in outputs
+    assert "pw.x_doc__17_SOLVENTS__Molecule_2.md" in outputs
+
+
+def test_default_split_keeps_one_file_per_page():
+    assert [name for name, _ in render_markdown(PW_DOC)] == ["pw.x_doc.md"]
+
+
+def test_convert_file_writes_every_indexed_output(tmp_path):
+    count = convert_file(PW_DOC, tmp_path, "parameter")
+    mode, *names = (tmp_path / "pw.x_doc.sections").read_text().splitlines()
+    assert mode == "parameter"
+    assert len(names) == count
+    assert sorted(p.name for p in tmp_path.glob("*.md")) == sorted(names)
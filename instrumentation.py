@@ -0,0 +1,269 @@
+import contextlib
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+PHASES = ("selection", "prompt", "llm", "reward", "update", "checkpoint")
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _quantile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class TrainingInstrumentation:
+    """Per-step timing, LLM latency and token accounting for the training loop.
+
+    Each training step (one rollout batch, i.e. one episode when
+    ``ROLLOUT_BATCH = 1``) accumulates wall time per phase via :meth:`phase`.
+    :meth:`end_step` appends a JSON line with the phase times, LLM latency
+    percentiles over a rolling window, token counts, candidate counts and
+    peak RSS, and rewrites a Prometheus text-format file that a local scraper
+    (e.g. node_exporter's textfile collector) can pick up.
+
+    When constructed with ``enabled=False`` every method returns immediately
+    and :meth:`phase` hands out a shared no-op context manager.
+    """
+
+    def __init__(
+        self,
+        jsonl_path: Optional[str] = "ppo_profile.jsonl",
+        prometheus_path: Optional[str] = "ppo_metrics.prom",
+        enabled: bool = True,
+        latency_window: int = 1000,
+        append: bool = False,
+    ) -> None:
+        """Construct the recorder.
+
+        Parameters
+        ----------
+        jsonl_path:
+            File receiving one JSON line per step, ``None`` to skip.
+        prometheus_path:
+            Prometheus text file rewritten after every step, ``None`` to skip.
+        enabled:
+            Set to ``False`` to turn all recording into no-ops.
+        latency_window:
+            Number of most recent LLM requests used for latency percentiles.
+        append:
+            Append to an existing JSONL file instead of truncating it.
+        """
+        self.enabled = enabled
+        self.prometheus_path = Path(prometheus_path) if prometheus_path else None
+        self._jsonl = open(jsonl_path, "a" if append else "w") if enabled and jsonl_path else None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self._step = self._new_step()
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.phase_totals: Dict[str, float] = defaultdict(float)
+
+    @staticmethod
+    def _new_step() -> Dict[str, Any]:
+        return {
+            "phases": defaultdict(float),
+            "llm_latencies": [],
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+
+    @contextlib.contextmanager
+    def _timed(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._step["phases"][name] += time.perf_counter() - start
+
+    def phase(self, name: str):
+        """Context manager adding the wall time of its body to phase ``name``."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._timed(name)
+
+    def record_llm(self, latency: float, usage: Any = None) -> None:
+        """Record one LLM round trip; usable as ``AsyncRolloutRunner.on_response``."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._latencies.append(latency)
+            self._step["llm_latencies"].append(latency)
+            if usage is not None:
+                self._step["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+                self._step["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def end_step(self, episodes: Iterable[int], candidates: int = 0, **extra: Any) -> None:
+        """Close the current step and export its metrics.
+
+        Parameters
+        ----------
+        episodes:
+            Episode numbers covered by this step.
+        candidates:
+            Number of candidate triples scored during selection.
+        **extra:
+            Additional JSON-serializable fields for the JSONL row.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            step, self._step = self._step, self._new_step()
+            window = sorted(self._latencies)
+
+        episodes = list(episodes)
+        phases = dict(step["phases"])
+        for name, seconds in phases.items():
+            self.phase_totals[name] += seconds
+        self.totals["steps"] += 1
+        self.totals["episodes"] += len(episodes)
+        self.totals["llm_requests"] += len(step["llm_latencies"])
+        self.totals["prompt_tokens"] += step["prompt_tokens"]
+        self.totals["completion_tokens"] += step["completion_tokens"]
+        self.totals["candidates"] += candidates
+
+        row = {
+            "time": time.time(),
+            "episodes": episodes,
+            "phase_seconds": phases,
+            "llm_requests": len(step["llm_latencies"]),
+            "llm_latency_seconds": {f"p{int(q * 100)}": _quantile(window, q) for q in LATENCY_QUANTILES},
+            "prompt_tokens": step["prompt_tokens"],
+            "completion_tokens": step["completion_tokens"],
+            "candidates": candidates,
+            "peak_rss_bytes": peak_rss_bytes(),
+            **extra,
+        }
+        if self._jsonl is not None:
+            self._jsonl.write(json.dumps(row) + "\n")
+            self._jsonl.flush()
+        if self.prometheus_path is not None:
+            self._write_prometheus(window)
+
+    def _write_prometheus(self, window) -> None:
+        lines = [
+            "# HELP ppo_phase_seconds_total Wall time spent per training phase.",
+            "# TYPE ppo_phase_seconds_total counter",
+        ]
+        lines += [f'ppo_phase_seconds_total{{phase="{name}"}} {seconds:.6f}'
+                  for name, seconds in sorted(self.phase_totals.items())]
+        lines += [
+            "# HELP ppo_llm_latency_seconds LLM round-trip latency over the recent window.",
+            "# TYPE ppo_llm_latency_seconds summary",
+        ]
+        lines += [f'ppo_llm_latency_seconds{{quantile="{q}"}} {_quantile(window, q):.6f}' for q in LATENCY_QUANTILES]
+        lines.append(f"ppo_llm_latency_seconds_count {int(self.totals['llm_requests'])}")
+        for name, help_text in (
+            ("steps", "Training steps completed."),
+            ("episodes", "Episodes completed."),
+            ("llm_requests", "LLM requests sent."),
+            ("prompt_tokens", "Prompt tokens reported by the LLM API."),
+            ("completion_tokens", "Completion tokens reported by the LLM API."),
+            ("candidates", "Candidate triples scored during selection."),
+        ):
+            lines += [f"# HELP ppo_{name}_total {help_text}", f"# TYPE ppo_{name}_total counter",
+                      f"ppo_{name}_total {int(self.totals[name])}"]
+        lines += ["# HELP process_peak_rss_bytes Peak resident set size.", "# TYPE process_peak_rss_bytes gauge",
+                  f"process_peak_rss_bytes {peak_rss_bytes()}"]
+
+        tmp = self.prometheus_path.with_name(self.prometheus_path.name + ".tmp")
+        tmp.write_text("\n".join(lines) + "\n")
+        os.replace(tmp, self.prometheus_path)
+
+    def close(self) -> None:
+        if self._jsonl is not None:
+            self._jsonl.close()
+
+
+class ProfileWindow:
+    """Opt-in profiler active for a range of episodes.
+
+    ``mode="torch"`` records a ``torch.profiler`` Chrome trace, ``mode="cprofile"``
+    dumps ``cProfile`` stats. Outside the window, and when no window is
+    configured, :meth:`step` costs one comparison.
+    """
+
+    def __init__(self, first: Optional[int] = None, last: Optional[int] = None,
+                 mode: str = "cprofile", out_dir: str = "profiles") -> None:
+        """Construct the window.
+
+        Parameters
+        ----------
+        first, last:
+            Inclusive episode range to profile; ``None`` disables profiling.
+        mode:
+            ``"torch"`` or ``"cprofile"``.
+        out_dir:
+            Folder receiving the trace or stats file.
+        """
+        if mode not in ("torch", "cprofile"):
+            raise ValueError(f"Unknown profiler mode: {mode}")
+        self.first = first
+        self.last = last if last is not None else first
+        self.mode = mode
+        self.out_dir = Path(out_dir)
+        self._profiler = None
+
+    @classmethod
+    def from_spec(cls, spec: Optional[str], mode: str = "cprofile", out_dir: str = "profiles") -> "ProfileWindow":
+        """Parse an episode range such as ``"5"`` or ``"5-8"``."""
+        if not spec:
+            return cls(mode=mode, out_dir=out_dir)
+        first, _, last = spec.partition("-")
+        return cls(int(first), int(last) if last else None, mode=mode, out_dir=out_dir)
+
+    def step(self, first_episode: int, last_episode: int) -> None:
+        """Start or stop profiling around a step covering the given episodes.
+
+        Call once before each step with its episode range.
+        """
+        if self.first is None:
+            return
+        if self._profiler is None and first_episode <= self.last and last_episode >= self.first:
+            self._start()
+        elif self._profiler is not None and first_episode > self.last:
+            self.stop()
+
+    def _start(self) -> None:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        if self.mode == "torch":
+            import torch.profiler
+
+            self._profiler = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True, with_stack=True
+            )
+            self._profiler.__enter__()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self) -> None:
+        """Stop an active profiler and write its output."""
+        if self._profiler is None:
+            return
+        stem = self.out_dir / f"episodes_{self.first}-{self.last}"
+        if self.mode == "torch":
+            self._profiler.__exit__(None, None, None)
+            self._profiler.export_chrome_trace(str(stem) + ".trace.json")
+            print(f"Profiler trace saved to {stem}.trace.json")
+        else:
+            self._profiler.disable()
+            self._profiler.dump_stats(str(stem) + ".prof")
+            print(f"Profiler stats saved to {stem}.prof")
+        self._profiler = None
@@ -0,0 +1,207 @@
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import torch
+
+from triple_store import TripleStore
+
+# Identifier-like words; array parameters such as ``celldm(1)`` stay one token
+_TOKEN = re.compile(r"[a-z_][a-z0-9_]*(?:\(\d+\))?")
+
+
+def tokenize(text: Any) -> List[str]:
+    """Return the lower-cased terms of ``text``.
+
+    Terms are identifier-like words of at least two characters, so parameter
+    names such as ``mixing_beta`` survive intact. An indexed parameter like
+    ``celldm(1)`` also yields its base name ``celldm``. Non-string values
+    have no terms.
+    """
+    if not isinstance(text, str):
+        return []
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if len(token) < 2:
+            continue
+        terms.append(token)
+        if token.endswith(")"):
+            terms.append(token[:token.index("(")])
+    return terms
+
+
+def _pipe_terms(value: Any) -> List[str]:
+    """Terms of pipe-separated lists such as ``'contains'`` objects; other objects are not indexed."""
+    return tokenize(value) if isinstance(value, str) and "|" in value else []
+
+
+class _Column:
+    """Rows of one ID column grouped by value.
+
+    ``order[offsets[v]:offsets[v + 1]]`` are the (ascending) rows whose
+    column holds value ``v``.
+    """
+
+    def __init__(self, values: np.ndarray, size: int) -> None:
+        self.order = np.argsort(values, kind="stable").astype(np.int32 if len(values) < 2 ** 31 else np.int64)
+        self.offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(values, minlength=size), out=self.offsets[1:])
+
+    def present(self) -> np.ndarray:
+        """Values occurring in at least one row."""
+        return np.flatnonzero(np.diff(self.offsets))
+
+    def count(self, values: np.ndarray) -> int:
+        return int((self.offsets[values + 1] - self.offsets[values]).sum())
+
+    def rows(self, values: np.ndarray) -> np.ndarray:
+        bounds = zip(self.offsets[values].tolist(), self.offsets[values + 1].tolist())
+        return np.concatenate([self.order[start:stop] for start, stop in bounds])
+
+
+class KGIndex:
+    """In-memory inverted index from keywords to the rows of a :class:`TripleStore`.
+
+    Built once per KG, it maps every term of a triple's subject, predicate,
+    source and namelist, and of the pipe-separated parameter lists in
+    ``'contains'`` objects, to the rows holding it. :meth:`prefetch` turns an
+    instruction into a small candidate store, so the policy scores a few
+    relevant triples instead of the whole graph.
+
+    Postings are not materialized per term: each column keeps its rows
+    grouped by value ID (one ``argsort``), and a term maps to the value IDs
+    whose text contains it. Memory is one row permutation per column plus
+    the term table, and only the distinct entity, predicate, source and
+    namelist values are tokenized.
+    """
+
+    COLUMNS = ("subject", "predicate", "object", "source", "namelist")
+
+    def __init__(self, store: TripleStore, max_candidates: int = 4096, max_df: float = 0.2) -> None:
+        """Build the index.
+
+        Parameters
+        ----------
+        store:
+            Store to index. :meth:`prefetch` returns rows of this store.
+        max_candidates:
+            Upper bound on the rows returned by :meth:`candidates`; the rows
+            matching the most (IDF-weighted) instruction terms are kept.
+        max_df:
+            Terms occurring in more than this fraction of the rows (e.g. the
+            source file name) are too common to narrow the search and are
+            ignored in queries.
+        """
+        self.store = store
+        self.max_candidates = max_candidates
+        self.max_df = max_df
+        tables = {
+            "subject": (store.ids[:, 0], store.entities, tokenize),
+            "predicate": (store.ids[:, 1], store.predicates, tokenize),
+            "object": (store.ids[:, 2], store.entities, _pipe_terms),
+            "source": (store.source_ids, store.sources, tokenize),
+            "namelist": (store.namelist_ids, store.namelists, tokenize),
+        }
+        self._columns: Dict[str, _Column] = {}
+        self._postings: Dict[str, Dict[str, np.ndarray]] = {}
+        for name in self.COLUMNS:
+            ids, table, terms_of = tables[name]
+            column = _Column(ids.numpy(), len(table))
+            self._columns[name] = column
+            values_of: Dict[str, List[int]] = {}
+            for value in column.present().tolist():
+                for term in set(terms_of(table[value])):
+                    values_of.setdefault(term, []).append(value)
+            for term, values in values_of.items():
+                self._postings.setdefault(term, {})[name] = np.asarray(values, dtype=np.int64)
+        self._df = {
+            term: sum(self._columns[name].count(values) for name, values in postings.items())
+            for term, postings in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        """Number of distinct terms."""
+        return len(self._postings)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._postings
+
+    def lookup(self, term: str) -> np.ndarray:
+        """Ascending rows holding ``term`` in any indexed column."""
+        postings = self._postings.get(term)
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate([self._columns[name].rows(values) for name, values in postings.items()]))
+
+    def query_terms(self, text: str) -> List[str]:
+        """Indexed terms of ``text`` selective enough to query (see ``max_df``)."""
+        limit = self.max_df * len(self.store)
+        return [t for t in dict.fromkeys(tokenize(text)) if t in self._postings and self._df[t] <= limit]
+
+    def candidates(self, text: str, predicates: Optional[Iterable[str]] = None,
+                   limit: Optional[int] = None) -> torch.Tensor:
+        """Rows matching the keywords of ``text``.
+
+        Parameters
+        ----------
+        text:
+            Instruction or any free text.
+        predicates:
+            If given, only rows with one of these predicates.
+        limit:
+            Maximum number of rows, ``max_candidates`` by default. Rows are
+            ranked by the summed IDF of the terms they match; ties keep the
+            lower row.
+
+        Returns
+        -------
+        torch.Tensor
+            Ascending ``int64`` row numbers of the indexed store; empty if no
+            term of ``text`` is indexed.
+        """
+        limit = self.max_candidates if limit is None else limit
+        n = len(self.store)
+        hits, weights = [], []
+        for term in self.query_terms(text):
+            rows = self.lookup(term)
+            hits.append(rows)
+            weights.append(np.full(len(rows), math.log(1 + n / self._df[term])))
+        if not hits:
+            return torch.empty(0, dtype=torch.long)
+        rows, inverse = np.unique(np.concatenate(hits), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+
+        if predicates is not None:
+            slices = [self.store.predicate_slices[p] for p in set(predicates) if p in self.store.predicate_slices]
+            keep = np.zeros(len(rows), dtype=bool)
+            for s in slices:
+                keep |= (rows >= s.start) & (rows < s.stop)
+            rows, scores = rows[keep], scores[keep]
+        if len(rows) > limit:
+            best = np.lexsort((rows, -scores))[:limit]
+            rows = np.sort(rows[best])
+        return torch.from_numpy(rows.astype(np.int64))
+
+    def prefetch(self, text: str, pool: Optional[TripleStore] = None, limit: Optional[int] = None) -> TripleStore:
+        """Candidate triples for ``text`` as a new store.
+
+        Parameters
+        ----------
+        text:
+            Instruction whose keywords select the candidates.
+        pool:
+            The indexed store (default) or a predicate subset of it, such as
+            ``store.subset('contains')``; candidates are restricted to its
+            predicates.
+        limit:
+            See :meth:`candidates`.
+
+        Returns
+        -------
+        TripleStore
+            The candidate rows, still sorted by predicate; empty if nothing
+            matched.
+        """
+        predicates = None if pool is None or pool is self.store else list(pool.predicate_slices)
+        return self.store.take(self.candidates(text, predicates=predicates, limit=limit))
@@ -0,0 +1,294 @@
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CACHE_PATH = "llm_cache.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT NOT NULL,
+    sample INTEGER NOT NULL,
+    model TEXT NOT NULL,
+    temperature REAL NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (key, sample)
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE INDEX IF NOT EXISTS responses_created ON responses (created);
+"""
+
+
+def cache_key(model: str, prompt: str, temperature: float) -> str:
+    """Return the content address of a request.
+
+    The key is a SHA-256 digest over the model name, the rounded sampling
+    temperature and the prompt text.
+    """
+    h = hashlib.sha256()
+    h.update(model.encode("utf-8"))
+    h.update(b"\0")
+    h.update(f"{float(temperature):.4f}".encode("ascii"))
+    h.update(b"\0")
+    h.update(prompt.encode("utf-8"))
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of language model responses.
+
+    Responses are stored in a SQLite database in WAL mode, so several
+    processes (and threads, each with its own connection) can read and write
+    the same cache file at once. Entries are evicted by age and by total size
+    in least-recently-used order.
+
+    For ``temperature > 0`` up to ``samples_per_key`` distinct completions are
+    kept per request; once they are all present, lookups draw one of them at
+    random instead of reporting a miss.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+        samples_per_key: int = 1,
+        evict_every: int = 100,
+    ) -> None:
+        """Open (and create if needed) the cache.
+
+        Parameters
+        ----------
+        path:
+            Location of the SQLite database file.
+        max_bytes:
+            Upper bound on the total size of stored responses, ``None`` for
+            no limit.
+        max_age:
+            Maximum age of an entry in seconds, ``None`` for no limit.
+        samples_per_key:
+            Number of completions kept per request when ``temperature > 0``.
+        evict_every:
+            Run eviction after this many insertions.
+        """
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.samples_per_key = max(1, samples_per_key)
+        self.evict_every = max(1, evict_every)
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        parent = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(parent, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+        self.evict()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection to the database."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _samples_for(self, temperature: float) -> int:
+        return self.samples_per_key if temperature > 0 else 1
+
+    def _count(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, model: str, prompt: str, temperature: float) -> Optional[str]:
+        """Look up a cached response.
+
+        Returns
+        -------
+        str | None
+            A stored response, or ``None`` on a miss. For ``temperature > 0``
+            a miss is also reported while fewer than ``samples_per_key``
+            samples are stored.
+        """
+        key = cache_key(model, prompt, temperature)
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT sample, response FROM responses WHERE key = ?", (key,)
+        ).fetchall()
+        if len(rows) < self._samples_for(temperature):
+            self._count(False)
+            return None
+
+        sample, response = random.choice(rows)
+        conn.execute(
+            "UPDATE responses SET accessed = ? WHERE key = ? AND sample = ?",
+            (time.time(), key, sample),
+        )
+        self._count(True)
+        return response
+
+    def get_many(self, model: str, prompt: str, temperature: float, n: int) -> Optional[List[str]]:
+        """Look up ``n`` distinct cached responses for one request.
+
+        Returns
+        -------
+        list[str] | None
+            ``n`` stored responses in random order, or ``None`` while fewer
+            than ``n`` are stored. As with :meth:`get`, a miss is also
+            reported for ``temperature > 0`` while fewer than
+            ``samples_per_key`` samples are stored, so the cache keeps
+            sampling until it holds them all (``samples_per_key`` must be at
+            least ``n`` for this to ever hit).
+        """
+        key = cache_key(model, prompt, temperature)
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT sample, response FROM responses WHERE key = ?", (key,)
+        ).fetchall()
+        if len(rows) < max(n, self._samples_for(temperature)):
+            self._count(False)
+            return None
+
+        chosen = random.sample(rows, n)
+        now = time.time()
+        conn.executemany(
+            "UPDATE responses SET accessed = ? WHERE key = ? AND sample = ?",
+            [(now, key, sample) for sample, _ in chosen],
+        )
+        self._count(True)
+        return [response for _, response in chosen]
+
+    def put(self, model: str, prompt: str, temperature: float, response: str) -> None:
+        """Store a response for a request.
+
+        Once ``samples_per_key`` samples exist the oldest one is replaced.
+        """
+        key = cache_key(model, prompt, temperature)
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT sample FROM responses WHERE key = ? ORDER BY created", (key,)
+            ).fetchall()
+            taken = {r[0] for r in rows}
+            if len(rows) >= self._samples_for(temperature):
+                sample = rows[0][0]
+            else:
+                sample = next(i for i in range(len(rows) + 1) if i not in taken)
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, sample, model, float(temperature), response,
+                 len(response.encode("utf-8")), now, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._puts += 1
+        if self._puts % self.evict_every == 0:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries and trim the cache to ``max_bytes``.
+
+        Returns
+        -------
+        int
+            Number of entries removed.
+        """
+        conn = self._connection()
+        removed = 0
+        if self.max_age is not None:
+            cur = conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+            removed += cur.rowcount
+        if self.max_bytes is not None:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for key, sample, size in conn.execute(
+                        "SELECT key, sample, size FROM responses ORDER BY accessed"
+                    ).fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        conn.execute("DELETE FROM responses WHERE key = ? AND sample = ?", (key, sample))
+                        total -= size
+                        removed += 1
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters of this instance and the stored totals."""
+        entries, size = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+def cached_chat_completion(
+    openai_client: Any,
+    prompt: str,
+    model: str = "gpt-4",
+    temperature: float = 0.0,
+    cache: Optional[ResponseCache] = None,
+) -> str:
+    """Send ``prompt`` as a single user message, consulting ``cache`` first.
+
+    Parameters
+    ----------
+    openai_client:
+        Client with a ``chat.completions.create`` method.
+    prompt:
+        The text prompt to send to the language model.
+    model:
+        Model name passed to the client.
+    temperature:
+        Sampling temperature for the model.
+    cache:
+        Optional :class:`ResponseCache`. Non-empty responses are stored in it.
+
+    Returns
+    -------
+    str
+        The stripped content of the first returned choice.
+    """
+    if cache is not None:
+        cached = cache.get(model, prompt, temperature)
+        if cached is not None:
+            return cached
+
+    response = openai_client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temperature,
+    )
+    content = response.choices[0].message.content.strip()
+    if cache is not None and content:
+        cache.put(model, prompt, temperature, content)
+    return content
@@ -0,0 +1,132 @@
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+
+from reward_engine import CARDS, RewardEngine, parse_qe_input
+
+# Namelist settings stated in a task's instruction when the reference sets them.
+SETUP_KEYS = ("prefix", "pseudo_dir", "outdir")
+HIGHLIGHT_KEYS = (
+    "ibrav", "celldm(1)", "celldm(3)", "nat", "ntyp", "ecutwfc", "ecutrho", "nbnd",
+    "occupations", "smearing", "degauss", "nspin", "noncolin", "starting_magnetization(1)",
+    "diagonalization", "mixing_beta", "conv_thr", "ion_dynamics",
+)
+GEOMETRY_CARDS = ("ATOMIC_SPECIES", "ATOMIC_POSITIONS", "CELL_PARAMETERS")
+
+
+@dataclass(frozen=True)
+class QETask:
+    """One reference QE input together with the instruction asking for it."""
+
+    name: str
+    instruction: str
+    ground_truth: str
+
+
+def _format_value(value) -> str:
+    if isinstance(value, bool):
+        return ".true." if value else ".false."
+    if isinstance(value, float):
+        return f"{value:g}"
+    return f"'{value}'"
+
+
+def _card_text(text: str, cards: Iterable[str]) -> str:
+    """Return the raw lines of the given cards from QE input ``text``."""
+    wanted = set(cards)
+    lines = []
+    keep = False
+    for line in text.splitlines():
+        head = line.strip().split()[0].upper() if line.strip() else ""
+        if head in CARDS or head.startswith("&"):
+            keep = head in wanted
+            if keep and lines:
+                lines.append("")
+        if keep and line.strip():
+            lines.append(line.strip())
+    return "\n".join(lines)
+
+
+def make_instruction(ground_truth: str) -> str:
+    """Build an instruction describing the calculation in ``ground_truth``.
+
+    The instruction names the calculation type, the key namelist settings of
+    the reference and its geometry cards, in the spirit of the single-task
+    ``INSTRUCTION`` in ``ppo_training_loop.py``.
+    """
+    settings = {}
+    for fact in parse_qe_input(ground_truth).facts:
+        # namelist facts are (namelist, key, value) with a lower-case namelist name
+        if len(fact) == 3 and fact[0] != "card" and fact[0].islower():
+            settings[fact[1]] = fact[2]
+    calculation = settings.get("calculation", "scf")
+
+    setup = ", ".join(f"{k} = {_format_value(settings[k])}" for k in SETUP_KEYS if k in settings)
+    using = ", ".join(f"{k} = {_format_value(settings[k])}" for k in HIGHLIGHT_KEYS if k in settings)
+
+    instruction = f"Write a {calculation} calculation"
+    if using:
+        instruction += f" using {using}"
+    instruction += " for the following geometry."
+    if setup:
+        instruction += f" Set {setup}."
+    geometry = _card_text(ground_truth, GEOMETRY_CARDS)
+    if geometry:
+        instruction += f"\n\n{geometry}"
+    return instruction
+
+
+class VectorizedQEEnv:
+    """Batch of QE input generation tasks sharing one reward engine.
+
+    Each reference file is a task with its own instruction. :meth:`sample`
+    draws a batch of tasks per training step and :meth:`score` rewards the
+    generated inputs of the whole batch, grouping candidates per reference so
+    that each group is scored with one :meth:`RewardEngine.score_batch` call.
+    """
+
+    def __init__(self, tasks: Sequence[QETask], seed: Optional[int] = None) -> None:
+        """Construct the environment.
+
+        Parameters
+        ----------
+        tasks:
+            Tasks to sample from.
+        seed:
+            Seed of the task sampler.
+        """
+        if not tasks:
+            raise ValueError("VectorizedQEEnv needs at least one task")
+        self.tasks = list(tasks)
+        self.reward_engine = RewardEngine({t.name: t.ground_truth for t in self.tasks})
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def from_directory(cls, root: str = "quantum_inputs", pattern: str = "**/*.in",
+                       seed: Optional[int] = None) -> "VectorizedQEEnv":
+        """Create one task per reference file under ``root``."""
+        root_path = Path(root)
+        tasks = []
+        for path in sorted(root_path.glob(pattern)):
+            text = path.read_text()
+            tasks.append(QETask(str(path.relative_to(root_path)), make_instruction(text), text))
+        return cls(tasks, seed=seed)
+
+    def sample(self, batch_size: int) -> List[QETask]:
+        """Draw ``batch_size`` tasks, without replacement while possible."""
+        if batch_size <= len(self.tasks):
+            return self.rng.sample(self.tasks, batch_size)
+        return self.rng.choices(self.tasks, k=batch_size)
+
+    def score(self, tasks: Sequence[QETask], generated_inputs: Sequence[str]) -> List[float]:
+        """Reward each generated input against its task's reference."""
+        rewards = [0.0] * len(tasks)
+        groups = {}
+        for i, task in enumerate(tasks):
+            groups.setdefault(task.name, []).append(i)
+        for name, indices in groups.items():
+            scores = self.reward_engine.score_batch([generated_inputs[i] for i in indices], name)
+            for i, score in zip(indices, scores.tolist()):
+                rewards[i] = score
+        return rewards
@@ -1,10 +1,41 @@
+from typing import Optional, Tuple
+
 import torch
 import torch.nn as nn
 
 class TripleScoringModel(nn.Module):
-    """Neural network for scoring knowledge graph triples."""
+    """Neural network for scoring knowledge graph triples.
+
+    With the linear head, a triple's score decomposes into a subject term, a
+    predicate term (holding the bias) and an object term. :meth:`score`
+    uses precomputed tables of these terms when no gradient is needed, so
+    scoring a KG costs three gathers and two adds per triple. The tables are
+    rebuilt whenever a parameter changes (optimizer step, ``load_state_dict``).
+
+    For very large entity vocabularies, ``sparse=True`` makes the embeddings
+    emit sparse gradients (pair it with :class:`sparse_optim.RowSparseAdam`)
+    and ``table_dtype`` stores the score tables in 16 or 8 bits. Parameters
+    always stay in float32.
+
+    Rebuilding the tables costs O(vocabulary x embedding_dim) time, even
+    after a sparse step: the dense scoring head changes every step, and with
+    it every entity's score. In training, the first :meth:`score` after each
+    optimizer step therefore still grows with the vocabulary, like one
+    forward pass over all entities. Compact tables shrink what is kept
+    between steps, not the peak: the embeddings dominate memory, and the
+    tables are built in float32 before they are cast.
+    """
 
-    def __init__(self, vocab_size: int, predicate_size: int, embedding_dim: int = 32) -> None:
+    TABLE_DTYPES = ("float32", "float16", "bfloat16", "int8")
+
+    def __init__(
+        self,
+        vocab_size: int,
+        predicate_size: int,
+        embedding_dim: int = 32,
+        sparse: bool = False,
+        table_dtype: str = "float32",
+    ) -> None:
         """Construct the model.
 
         Parameters
@@ -15,13 +46,27 @@ class TripleScoringModel(nn.Module):
             Number of unique predicates.
         embedding_dim:
             Dimensionality of the entity and predicate embeddings.
+        sparse:
+            Emit sparse gradients for the embeddings, so an update touches
+            only the rows used in the batch.
+        table_dtype:
+            Storage type of the score tables used by :meth:`score`
+            (``"float32"``, ``"float16"``, ``"bfloat16"`` or ``"int8"``, the
+            latter with one symmetric scale per table). Only the cached
+            tables are compacted; see the class docstring for the cost.
         """
         super().__init__()
-        self.entity_embedding = nn.Embedding(vocab_size, embedding_dim)
-        self.predicate_embedding = nn.Embedding(predicate_size, embedding_dim)
+        if table_dtype not in self.TABLE_DTYPES:
+            raise ValueError(f"table_dtype must be one of {self.TABLE_DTYPES}, got {table_dtype!r}")
+        self.table_dtype = table_dtype
+        self.entity_embedding = nn.Embedding(vocab_size, embedding_dim, sparse=sparse)
+        self.predicate_embedding = nn.Embedding(predicate_size, embedding_dim, sparse=sparse)
 
         # ⬇️ Scoring layer: [s | p | o] → score
         self.fc = nn.Linear(embedding_dim * 3, 1)
+        self._tables: Optional[Tuple[torch.Tensor, torch.Tensor, torch.Tensor]] = None
+        self._table_scales: Optional[Tuple[float, float, float]] = None
+        self._tables_key = None
 
     def forward(self, triple_ids: torch.Tensor) -> torch.Tensor:
         """Score a batch of triples.
@@ -54,3 +99,70 @@ class TripleScoringModel(nn.Module):
         triple_repr = torch.cat([s_emb, p_emb, o_emb], dim=1)
         return self.fc(triple_repr).squeeze()
 
+    def _supports_tables(self) -> bool:
+        """Whether scores decompose per column (a plain linear head and forward)."""
+        return (
+            type(self.fc) is nn.Linear
+            and self.fc.out_features == 1
+            and type(self).forward is TripleScoringModel.forward
+        )
+
+    def _compact(self, table: torch.Tensor) -> Tuple[torch.Tensor, float]:
+        """Store ``table`` as :attr:`table_dtype`; returns it and its int8 scale (1.0 otherwise)."""
+        if self.table_dtype == "int8":
+            scale = table.abs().max().item() / 127 or 1.0
+            return torch.round(table / scale).clamp_(-127, 127).to(torch.int8), scale
+        return table.to(getattr(torch, self.table_dtype)), 1.0
+
+    def score_tables(self) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Per-entity subject scores, per-predicate scores (plus bias) and per-entity object scores.
+
+        Cached until a parameter is modified in place; parameter version
+        counters are used to detect that, and any change rebuilds all three
+        tables in O(vocabulary x embedding_dim). The tables are returned in float32
+        whatever :attr:`table_dtype` they are stored in.
+        """
+        tables = self._stored_tables()
+        if self.table_dtype == "float32":
+            return tables
+        return tuple(t.float() * scale for t, scale in zip(tables, self._table_scales))
+
+    def _stored_tables(self) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        params = (self.entity_embedding.weight, self.predicate_embedding.weight, self.fc.weight, self.fc.bias)
+        key = tuple((id(p), p._version) for p in params)
+        if self._tables is None or self._tables_key != key:
+            dim = self.entity_embedding.embedding_dim
+            with torch.no_grad():
+                w = self.fc.weight.reshape(-1)
+                tables = (
+                    self.entity_embedding.weight @ w[:dim],
+                    self.predicate_embedding.weight @ w[dim:2 * dim] + self.fc.bias,
+                    self.entity_embedding.weight @ w[2 * dim:],
+                )
+                compact = [self._compact(t) for t in tables]
+            self._tables = tuple(t for t, _ in compact)
+            self._table_scales = tuple(scale for _, scale in compact)
+            self._tables_key = key
+        return self._tables
+
+    def score(self, triple_ids: torch.Tensor) -> torch.Tensor:
+        """Score triples like :meth:`forward`, from the score tables when possible.
+
+        Falls back to :meth:`forward` when gradients are enabled or the
+        scoring head is not a plain linear layer. With float32 tables,
+        results match :meth:`forward` up to floating point summation order;
+        compact tables are dequantized after the gather.
+        """
+        if torch.is_grad_enabled() or not self._supports_tables():
+            return self(triple_ids)
+        if triple_ids.ndim == 1:
+            triple_ids = triple_ids.unsqueeze(0)
+        subj_scores, pred_scores, obj_scores = self._stored_tables()
+        if self.table_dtype == "float32":
+            return (subj_scores[triple_ids[:, 0]] + pred_scores[triple_ids[:, 1]] + obj_scores[triple_ids[:, 2]]).squeeze()
+        s_scale, p_scale, o_scale = self._table_scales
+        return (
+            subj_scores[triple_ids[:, 0]].float() * s_scale
+            + pred_scores[triple_ids[:, 1]].float() * p_scale
+            + obj_scores[triple_ids[:, 2]].float() * o_scale
+        ).squeeze()
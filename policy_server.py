@@ -0,0 +1,530 @@
+"""Long-running server answering triple selections from a warm policy.
+
+The KG and the trained ``TripleScoringModel`` are loaded once; consumers get
+``select_topk_triples`` results over localhost HTTP or a Unix socket without
+importing the training loop::
+
+    python policy_server.py --checkpoint-dir checkpoints --port 8765
+    python policy_server.py --checkpoint-dir checkpoints --unix-socket /tmp/policy.sock
+
+Endpoints:
+
+* ``POST /select`` with ``{"k": 5, "pool": "all" | "contains", "instruction": "..."}``
+  returns ``{"triples": [...], "ids": [...], "model_version": n, "episode": e}``
+* ``GET /metrics`` returns queue depth, latency and batch metrics in
+  Prometheus text format (``GET /stats`` as JSON)
+* ``GET /health`` returns the model version and checkpoint episode
+* ``POST /reload`` checks for a new checkpoint immediately
+
+Concurrent requests arriving within ``--max-wait-ms`` of each other are
+scored in one forward pass, and a new checkpoint in ``--checkpoint-dir`` is
+loaded in the background and swapped in between batches.
+"""
+import argparse
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+from checkpointing import LATEST
+from instrumentation import LATENCY_QUANTILES, _quantile
+from kg_index import KGIndex
+from policy_model import TripleScoringModel
+from sample_triples import select_topk_triples_batch
+from triple_store import TripleStore, load_triple_store
+
+KG_PATH = "relationships.json"
+CHECKPOINT_DIR = "checkpoints"
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_BATCH = 64             # requests scored in one forward pass
+MAX_WAIT_MS = 2.0          # how long the first request of a batch waits for others
+RELOAD_INTERVAL = 2.0      # seconds between checks for a new checkpoint
+
+
+@dataclass
+class _Request:
+    k: int
+    pool: str
+    instruction: Optional[str]
+    enqueued: float = field(default_factory=time.perf_counter)
+    future: Future = field(default_factory=Future)
+
+
+class PolicyService:
+    """Micro-batched triple selection from a warm model, with hot reload.
+
+    :meth:`select` may be called from any number of threads. Requests are
+    queued to one batching thread, which waits up to ``max_wait`` seconds
+    after the first request for up to ``max_batch`` requests and answers
+    them with a single :func:`~sample_triples.select_topk_triples_batch`
+    call. Only that thread runs the model.
+
+    With a ``checkpoint_dir``, a watcher thread loads the checkpoint named by
+    its ``latest`` pointer whenever the pointer changes, builds its score
+    tables and swaps it in between batches, so requests never wait for a
+    reload. A checkpoint that fails to load is reported and skipped.
+    """
+
+    def __init__(
+        self,
+        store: TripleStore,
+        checkpoint_dir: Optional[str] = None,
+        model: Optional[torch.nn.Module] = None,
+        index: Optional[KGIndex] = None,
+        max_batch: int = MAX_BATCH,
+        max_wait: float = MAX_WAIT_MS / 1000,
+        reload_interval: Optional[float] = RELOAD_INTERVAL,
+        table_dtype: str = "float32",
+        chunk_size: Optional[int] = None,
+        num_workers: int = 0,
+        latency_window: int = 1000,
+    ) -> None:
+        """Load the current checkpoint and start the worker threads.
+
+        Parameters
+        ----------
+        store:
+            Encoded KG the model was trained on.
+        checkpoint_dir:
+            Folder written by the training loop's ``CheckpointWriter``.
+        model:
+            Model to serve when there is no checkpoint (default: an
+            untrained ``TripleScoringModel``).
+        index:
+            Optional :class:`~kg_index.KGIndex` used to prefetch candidates
+            for requests carrying an instruction.
+        max_batch:
+            Maximum number of requests per forward pass.
+        max_wait:
+            Seconds the first queued request waits for more requests.
+        reload_interval:
+            Seconds between checks of ``checkpoint_dir``, ``None`` to only
+            reload on :meth:`reload`.
+        table_dtype:
+            Score table type of loaded models; see ``TripleScoringModel``.
+        chunk_size, num_workers:
+            See :func:`~sample_triples.score_topk`.
+        latency_window:
+            Number of most recent requests used for latency percentiles.
+        """
+        self.store = store
+        self.pools = {"all": store, "contains": store.subset("contains")}
+        self.checkpoint_dir = Path(checkpoint_dir) if checkpoint_dir else None
+        self.index = index
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.reload_interval = reload_interval
+        self.table_dtype = table_dtype
+        self.chunk_size = chunk_size
+        self.num_workers = num_workers
+
+        self.model = model or TripleScoringModel(len(store.entities), len(store.predicates), table_dtype=table_dtype)
+        self.model_version = 0
+        self.checkpoint_name: Optional[str] = None
+        self.episode: Optional[int] = None
+        self._reload_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self.totals = {"requests": 0, "errors": 0, "batches": 0, "batch_seconds": 0.0,
+                       "reloads": 0, "reload_errors": 0}
+
+        if not self.reload() and self.checkpoint_dir is not None:
+            print(f"[!] No checkpoint found in {self.checkpoint_dir}. Serving an untrained policy.")
+        self._warm(self.model)
+
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._batcher = threading.Thread(target=self._batch_loop, name="policy-batcher", daemon=True)
+        self._batcher.start()
+        self._watcher = None
+        if self.checkpoint_dir is not None and reload_interval:
+            self._watcher = threading.Thread(target=self._watch_loop, name="checkpoint-watcher", daemon=True)
+            self._watcher.start()
+
+    def _warm(self, model: torch.nn.Module) -> None:
+        """Build the score tables before the model serves requests."""
+        model.eval()
+        if len(self.store):
+            with torch.no_grad():
+                getattr(model, "score", model)(self.store.ids[:1])
+
+    # === Hot reload ===
+
+    def reload(self) -> bool:
+        """Load the latest checkpoint if it changed since the last load.
+
+        Returns
+        -------
+        bool
+            ``True`` if a new model was swapped in.
+        """
+        if self.checkpoint_dir is None:
+            return False
+        pointer = self.checkpoint_dir / LATEST
+        with self._reload_lock:
+            try:
+                name = pointer.read_text().strip()
+            except FileNotFoundError:
+                return False
+            if not name or name == self.checkpoint_name:
+                return False
+            try:
+                checkpoint = torch.load(self.checkpoint_dir / name, weights_only=False)
+                state = checkpoint["model"]
+                vocab_size, embedding_dim = state["entity_embedding.weight"].shape
+                if vocab_size != len(self.store.entities):
+                    raise ValueError(f"checkpoint has {vocab_size} entities, the KG has {len(self.store.entities)}")
+                model = TripleScoringModel(vocab_size, len(self.store.predicates), embedding_dim=embedding_dim,
+                                           table_dtype=self.table_dtype)
+                model.load_state_dict(state)
+                self._warm(model)
+            except Exception as e:
+                self.checkpoint_name = name  # do not retry a broken file until the pointer moves on
+                with self._stats_lock:
+                    self.totals["reload_errors"] += 1
+                print(f"[!] Failed to load checkpoint {name}: {e}")
+                return False
+
+            self.model = model  # picked up by the next batch
+            self.model_version += 1
+            self.checkpoint_name = name
+            self.episode = checkpoint.get("episode")
+            with self._stats_lock:
+                self.totals["reloads"] += 1
+        print(f"🔄 Serving {name} (episode {self.episode}, model version {self.model_version})")
+        return True
+
+    def _watch_loop(self) -> None:
+        while not self._stopped.wait(self.reload_interval):
+            self.reload()
+
+    # === Micro-batching ===
+
+    def submit(self, k: int, pool: str = "all", instruction: Optional[str] = None) -> Future:
+        """Queue a selection; the future resolves to ``(triples, ids)``."""
+        if pool not in self.pools:
+            raise ValueError(f"Unknown pool {pool!r}; expected one of {sorted(self.pools)}")
+        if k < 1:
+            raise ValueError(f"k must be positive, got {k}")
+        if self._stopped.is_set():
+            raise RuntimeError("policy service is closed")
+        request = _Request(int(k), pool, instruction or None)
+        self._queue.put(request)
+        return request.future
+
+    def select(self, k: int, pool: str = "all", instruction: Optional[str] = None,
+               timeout: Optional[float] = None) -> Tuple[List[Dict[str, Any]], List[List[int]]]:
+        """Select the top ``k`` triples of ``pool``, batched with concurrent callers.
+
+        Parameters
+        ----------
+        k:
+            Number of triples to return.
+        pool:
+            ``"all"`` or ``"contains"`` (the curriculum subset).
+        instruction:
+            Optional instruction whose keywords prefetch candidates when the
+            service has an index.
+        timeout:
+            Seconds to wait for the result, ``None`` for no limit.
+
+        Returns
+        -------
+        tuple[list, list]
+            The selected triples and their encoded IDs.
+        """
+        return self.submit(k, pool, instruction).result(timeout)
+
+    def _next_batch(self) -> Optional[List[_Request]]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)  # stop after this batch
+                break
+            batch.append(request)
+        return batch
+
+    def _batch_loop(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[_Request]) -> None:
+        started = time.perf_counter()
+        try:
+            # Each pool's top-k ordering is by descending score, so the top max(k) serves every request
+            selections = select_topk_triples_batch(
+                self.model, [self.pools[r.pool] for r in batch], k=max(r.k for r in batch),
+                chunk_size=self.chunk_size, num_workers=self.num_workers,
+                index=self.index, instructions=[r.instruction for r in batch],
+            )
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            with self._stats_lock:
+                self.totals["errors"] += len(batch)
+            return
+
+        finished = time.perf_counter()
+        for request, (triples, ids) in zip(batch, selections):
+            request.future.set_result((triples[:request.k], ids[:request.k]))
+        with self._stats_lock:
+            self.totals["requests"] += len(batch)
+            self.totals["batches"] += 1
+            self.totals["batch_seconds"] += finished - started
+            self._latencies.extend(finished - r.enqueued for r in batch)
+
+    # === Metrics ===
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, request latency percentiles, batch sizes and model version."""
+        with self._stats_lock:
+            totals = dict(self.totals)
+            window = sorted(self._latencies)
+        batches = totals["batches"]
+        return {
+            **totals,
+            "queue_depth": self._queue.qsize(),
+            "mean_batch_size": totals["requests"] / batches if batches else 0.0,
+            "latency_seconds": {f"p{int(q * 100)}": _quantile(window, q) for q in LATENCY_QUANTILES},
+            "model_version": self.model_version,
+            "checkpoint": self.checkpoint_name,
+            "episode": self.episode,
+        }
+
+    def prometheus(self) -> str:
+        """:meth:`stats` in Prometheus text format."""
+        stats = self.stats()
+        lines = [
+            "# HELP policy_queue_depth Requests waiting for a batch.",
+            "# TYPE policy_queue_depth gauge",
+            f"policy_queue_depth {stats['queue_depth']}",
+            "# HELP policy_request_latency_seconds Time from submission to result over the recent window.",
+            "# TYPE policy_request_latency_seconds summary",
+        ]
+        lines += [f'policy_request_latency_seconds{{quantile="{q}"}} {stats["latency_seconds"][f"p{int(q * 100)}"]:.6f}'
+                  for q in LATENCY_QUANTILES]
+        lines.append(f"policy_request_latency_seconds_count {stats['requests']}")
+        for name, help_text in (
+            ("requests", "Selections answered."),
+            ("errors", "Selections that failed."),
+            ("batches", "Forward passes (micro-batches) run."),
+            ("reloads", "Checkpoints loaded."),
+            ("reload_errors", "Checkpoints that failed to load."),
+        ):
+            lines += [f"# HELP policy_{name}_total {help_text}", f"# TYPE policy_{name}_total counter",
+                      f"policy_{name}_total {stats[name]}"]
+        lines += [
+            "# HELP policy_batch_seconds_total Time spent scoring batches.",
+            "# TYPE policy_batch_seconds_total counter",
+            f"policy_batch_seconds_total {stats['batch_seconds']:.6f}",
+            "# HELP policy_model_version Number of the model being served (increments on reload).",
+            "# TYPE policy_model_version gauge",
+            f"policy_model_version {stats['model_version']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> None:
+        """Answer the queued requests, then stop the worker threads."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._queue.put(None)
+        self._batcher.join()
+        if self._watcher is not None:
+            self._watcher.join()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "PolicyServer/1"
+    service: PolicyService  # set on the subclass built by make_server
+    quiet = True
+
+    def _send(self, status: int, body: Any, content_type: str = "application/json") -> None:
+        data = (body if isinstance(body, str) else json.dumps(body)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path == "/metrics":
+            self._send(200, self.service.prometheus(), "text/plain; version=0.0.4")
+        elif self.path == "/stats":
+            self._send(200, self.service.stats())
+        elif self.path == "/health":
+            self._send(200, {"status": "ok", "model_version": self.service.model_version,
+                             "episode": self.service.episode})
+        else:
+            self._send(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self) -> None:
+        if self.path == "/reload":
+            self._send(200, {"reloaded": self.service.reload(), "model_version": self.service.model_version})
+            return
+        if self.path != "/select":
+            self._send(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            future = self.service.submit(int(request.get("k", 5)), request.get("pool", "all"),
+                                         request.get("instruction"))
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        try:
+            triples, ids = future.result()
+        except Exception as e:
+            self._send(500, {"error": str(e)})
+            return
+        self._send(200, {"triples": triples, "ids": ids, "model_version": self.service.model_version,
+                         "episode": self.service.episode})
+
+    def address_string(self) -> str:
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: PolicyService, host: str = HOST, port: int = PORT,
+                unix_socket: Optional[str] = None, quiet: bool = True) -> socketserver.BaseServer:
+    """HTTP server for ``service`` on ``host:port`` or on a Unix socket path.
+
+    Call ``serve_forever()`` on the result; each connection is handled on
+    its own thread.
+    """
+    handler = type("PolicyHandler", (_Handler,), {"service": service, "quiet": quiet})
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        return _UnixHTTPServer(unix_socket, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: Optional[float] = None) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class PolicyClient:
+    """Minimal client for a running :func:`make_server` endpoint.
+
+    Keeps one connection open; use one client per thread.
+    """
+
+    def __init__(self, host: str = HOST, port: int = PORT, unix_socket: Optional[str] = None,
+                 timeout: Optional[float] = 30.0) -> None:
+        if unix_socket:
+            self._conn = _UnixHTTPConnection(unix_socket, timeout=timeout)
+        else:
+            self._conn = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Any:
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        self._conn.request(method, path, body=data, headers=headers)
+        response = self._conn.getresponse()
+        payload = response.read().decode()
+        if response.status != 200:
+            raise RuntimeError(f"{method} {path} failed ({response.status}): {payload}")
+        return json.loads(payload) if response.getheader("Content-Type", "").startswith("application/json") else payload
+
+    def select(self, k: int = 5, pool: str = "all", instruction: Optional[str] = None) -> Dict[str, Any]:
+        """Top ``k`` triples; see ``POST /select``."""
+        return self._request("POST", "/select", {"k": k, "pool": pool, "instruction": instruction})
+
+    def stats(self) -> Dict[str, Any]:
+        return self._request("GET", "/stats")
+
+    def reload(self) -> Dict[str, Any]:
+        return self._request("POST", "/reload")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve top-k triple selections from a trained policy.")
+    parser.add_argument("--kg", default=KG_PATH, help="relationships.json or a columnar KG directory.")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR, help="Checkpoints to serve and watch.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix-socket", default=None, help="Listen on this Unix socket instead of TCP.")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="Requests per forward pass.")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help="How long a request waits for others to batch with.")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL,
+                        help="Seconds between checkpoint checks, 0 to disable.")
+    parser.add_argument("--table-dtype", default="float32", choices=TripleScoringModel.TABLE_DTYPES,
+                        help="Storage of the cached score tables; they are still built in float32, "
+                             "in O(vocabulary x dim), on every checkpoint reload.")
+    parser.add_argument("--kg-index", action="store_true", help="Prefetch candidates from request instructions.")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Triples per forward pass during scoring.")
+    parser.add_argument("--verbose", action="store_true", help="Log every HTTP request.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    started = time.perf_counter()
+    store = load_triple_store(args.kg)
+    index = KGIndex(store) if args.kg_index else None
+    service = PolicyService(store, checkpoint_dir=args.checkpoint_dir, index=index, max_batch=args.max_batch,
+                            max_wait=args.max_wait_ms / 1000, reload_interval=args.reload_interval or None,
+                            table_dtype=args.table_dtype, chunk_size=args.chunk_size)
+    server = make_server(service, args.host, args.port, args.unix_socket, quiet=not args.verbose)
+    where = args.unix_socket or f"http://{args.host}:{args.port}"
+    print(f"🚀 Serving {len(store)} triples on {where} (ready in {time.perf_counter() - started:.2f}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import math
+import random
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import torch
+
+from data_parallel import DistributedContext
+
+
+def selection_log_probs(model: torch.nn.Module, triple_ids: torch.Tensor) -> torch.Tensor:
+    """Log-probabilities of the selected triples under ``model``.
+
+    As in the original training loop, the policy over a selection is the
+    softmax of the model's scores across the selected triples.
+
+    Parameters
+    ----------
+    model:
+        ``TripleScoringModel`` or compatible module.
+    triple_ids:
+        Tensor of shape ``(k, 3)`` with the selected triples' IDs.
+
+    Returns
+    -------
+    torch.Tensor
+        Tensor of shape ``(k,)``.
+    """
+    scores = model(triple_ids).reshape(-1)
+    return torch.log_softmax(scores, dim=0)
+
+
+class RolloutBuffer:
+    """Stores selections, their old log-probabilities, rewards and advantages."""
+
+    def __init__(self) -> None:
+        self.triple_ids: List[torch.Tensor] = []
+        self.old_log_probs: List[torch.Tensor] = []
+        self.rewards: List[float] = []
+        self.advantages: List[float] = []
+
+    def add(self, triple_ids: torch.Tensor, old_log_probs: torch.Tensor, reward: float, advantage: float) -> None:
+        """Append one rollout."""
+        self.triple_ids.append(triple_ids)
+        self.old_log_probs.append(old_log_probs)
+        self.rewards.append(reward)
+        self.advantages.append(advantage)
+
+    def __len__(self) -> int:
+        return len(self.rewards)
+
+    def clear(self) -> None:
+        """Drop all stored rollouts."""
+        self.__init__()
+
+    def minibatches(self, batch_size: int, shuffle: bool = True) -> Iterator[List[int]]:
+        """Yield lists of rollout indices covering the buffer once."""
+        order = list(range(len(self)))
+        if shuffle:
+            random.shuffle(order)
+        for start in range(0, len(order), batch_size):
+            yield order[start:start + batch_size]
+
+
+class PPOTrainer:
+    """Clipped-objective PPO over a buffer of triple selections.
+
+    Every paid LLM reward is reused for ``epochs`` passes of minibatch
+    updates. Advantages are rewards minus a running (exponential moving
+    average) reward baseline, normalized across the buffer when it holds more
+    than one rollout.
+
+    With a ``distributed`` context, each rank trains on its own rollouts and
+    gradients are averaged across ranks before every optimizer step, so the
+    replicas stay identical. Ranks run the same number of steps; one with
+    fewer minibatches contributes zero gradients for the rest.
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        optimizer: torch.optim.Optimizer,
+        clip_eps: float = 0.2,
+        epochs: int = 4,
+        minibatch_size: int = 8,
+        entropy_coeff: float = 0.01,
+        baseline_momentum: float = 0.9,
+        distributed: Optional[DistributedContext] = None,
+    ) -> None:
+        """Construct the trainer.
+
+        Parameters
+        ----------
+        model:
+            Policy being optimized.
+        optimizer:
+            Optimizer over the policy parameters.
+        clip_eps:
+            PPO clipping range for the probability ratio.
+        epochs:
+            Number of passes over the buffer per :meth:`update`.
+        minibatch_size:
+            Number of rollouts per gradient step.
+        entropy_coeff:
+            Weight of the entropy bonus.
+        baseline_momentum:
+            Momentum of the running reward baseline.
+        distributed:
+            Data-parallel context whose ranks average their gradients.
+        """
+        self.model = model
+        self.optimizer = optimizer
+        self.clip_eps = clip_eps
+        self.epochs = epochs
+        self.minibatch_size = minibatch_size
+        self.entropy_coeff = entropy_coeff
+        self.baseline_momentum = baseline_momentum
+        self.baseline = 0.0
+        self.buffer = RolloutBuffer()
+        self.distributed = distributed or DistributedContext()
+
+    def record(self, top_ids: Sequence[Sequence[int]], reward: float) -> float:
+        """Store a rollout, computing its old log-probabilities and advantage.
+
+        Parameters
+        ----------
+        top_ids:
+            Encoded IDs of the selected triples.
+        reward:
+            Reward obtained for the selection.
+
+        Returns
+        -------
+        float
+            Entropy of the policy over the selection.
+        """
+        triple_ids = torch.as_tensor(top_ids, dtype=torch.long)
+        with torch.no_grad():
+            old_log_probs = selection_log_probs(self.model, triple_ids)
+        advantage = reward - self.baseline
+        self.baseline = self.baseline_momentum * self.baseline + (1 - self.baseline_momentum) * reward
+        self.buffer.add(triple_ids, old_log_probs, reward, advantage)
+        return -torch.sum(old_log_probs * torch.exp(old_log_probs)).item()
+
+    def update(self) -> Dict[str, float]:
+        """Run the clipped PPO update over the buffer and clear it.
+
+        Returns
+        -------
+        dict
+            Mean ``loss``, ``entropy``, ``clip_fraction`` and ``approx_kl``
+            over all minibatch steps.
+        """
+        num_batches = self.distributed.all_reduce_max(math.ceil(len(self.buffer) / self.minibatch_size))
+        if not num_batches:
+            return {}
+
+        advantages = torch.tensor(self.buffer.advantages)
+        if len(advantages) > 1 and advantages.std() > 1e-8:
+            advantages = (advantages - advantages.mean()) / advantages.std()
+
+        totals = {"loss": 0.0, "entropy": 0.0, "clip_fraction": 0.0, "approx_kl": 0.0}
+        steps = 0
+        for _ in range(self.epochs):
+            batches = list(self.buffer.minibatches(self.minibatch_size))
+            for batch in batches + [[]] * (num_batches - len(batches)):
+                if not batch:
+                    # Nothing left on this rank; it still joins the gradient all-reduce
+                    self.optimizer.zero_grad()
+                    self.distributed.all_reduce_gradients(self.model)
+                    self.optimizer.step()
+                    continue
+
+                surrogate = []
+                entropies = []
+                kls = []
+                clipped = []
+                for i in batch:
+                    log_probs = selection_log_probs(self.model, self.buffer.triple_ids[i])
+                    log_ratio = torch.sum(log_probs - self.buffer.old_log_probs[i])
+                    ratio = torch.exp(log_ratio)
+                    adv = advantages[i]
+                    surrogate.append(torch.min(ratio * adv, torch.clamp(ratio, 1 - self.clip_eps, 1 + self.clip_eps) * adv))
+                    entropies.append(-torch.sum(log_probs * torch.exp(log_probs)))
+                    kls.append(((ratio - 1) - log_ratio).detach())
+                    clipped.append((torch.abs(ratio - 1) > self.clip_eps).float())
+
+                entropy = torch.stack(entropies).mean()
+                loss = -torch.stack(surrogate).mean() - self.entropy_coeff * entropy
+
+                self.optimizer.zero_grad()
+                loss.backward()
+                self.distributed.all_reduce_gradients(self.model)
+                self.optimizer.step()
+
+                totals["loss"] += loss.item()
+                totals["entropy"] += entropy.item()
+                totals["clip_fraction"] += torch.stack(clipped).mean().item()
+                totals["approx_kl"] += torch.stack(kls).mean().item()
+                steps += 1
+
+        self.buffer.clear()
+        return {name: value / steps for name, value in totals.items()} if steps else {}
@@ -1,108 +1,460 @@
 import os
-import json
+import argparse
+import dataclasses
+import random
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import yaml
 import torch
-import pandas as pd
 from tqdm import trange
 from dotenv import load_dotenv
-from openai import OpenAI
 
-from utils import generate_prompt_from_triples, compute_reward, generate_qe_input_from_prompt
+from prompt_builder import PromptBuilder
+from generation_backend import BACKENDS, make_backend
+from llm_cache import ResponseCache
 from policy_model import TripleScoringModel
-from sample_triples import select_topk_triples
+from kg_index import KGIndex
+from sample_triples import prefetch_pools, select_topk_triples_batch
+from triple_store import load_triple_store
+from ppo import PPOTrainer
+from data_parallel import DistributedContext
+from sparse_optim import RowSparseAdam
+from multitask_env import QETask, VectorizedQEEnv
+from checkpointing import (CheckpointWriter, MetricsLogger, capture_rng_state,
+                           load_latest_checkpoint, restore_rng_state)
+from instrumentation import ProfileWindow, TrainingInstrumentation
 
 # === Load API Key ===
 load_dotenv()
-openai_client = OpenAI()
 
 # === Hyperparameters ===
 EPISODES = 10
 TOP_K = 5
 TEMPERATURE = 0.2
+NUM_SAMPLES = 1            # completions per prompt (one request with the API's n); the reward is their mean
 INSTRUCTION = "Write a scf calculation using mixing_beta = 0.6 for the given geometry."
 TEMPLATE_PATH = "prompt_template.txt"
+KG_PATH = "relationships.json"  # or a columnar directory written by extract_kg_data.py --out-columnar
+PROMPT_TOKEN_BUDGET = None # estimated tokens per prompt; triples are packed by score, None for no limit
 ENTROPY_COEFF = 0.01
 INITIAL_LR = 0.01
 MIN_LR = 1e-4
 CURRICULUM_PHASE = 10
+ROLLOUT_BATCH = 1          # episodes (tasks) whose prompts are sent concurrently and share one update
+MULTITASK = False          # train on every reference under TASK_ROOT instead of pw.scf.si.in only
+TASK_ROOT = "quantum_inputs"
+TASK_TEMPLATE_PATH = "prompt_template_tasks.txt"
+BACKEND = "openai"         # "retrieval" answers offline from TASK_ROOT references, for fast iteration
+MAX_IN_FLIGHT = 4          # upper bound on concurrent LLM requests
+REQUESTS_PER_SECOND = None # rate limit on request starts, None to disable
+MAX_RETRIES = 3
+LLM_CACHE_PATH = "llm_cache.sqlite"  # shared with extract_kg_data.py, None to disable
+LLM_CACHE_SAMPLES = 4      # completions kept per prompt when TEMPERATURE > 0
+SCORING_CHUNK_SIZE = None  # triples per forward pass during selection, None for one pass
+SCORING_WORKERS = 0        # threads scoring chunks in parallel
+KG_INDEX = False           # prefetch candidates matching the instruction's keywords before scoring
+KG_INDEX_CANDIDATES = 4096 # upper bound on prefetched candidates per episode
+SPARSE_EMBEDDINGS = False  # sparse embedding gradients + RowSparseAdam, for very large entity vocabularies
+# Inference score tables: "float32", "float16", "bfloat16" or "int8". Smaller tables only cut the memory kept
+# between steps; they are rebuilt in float32, in O(vocabulary x embedding_dim), after every optimizer step.
+SCORE_TABLE_DTYPE = "float32"
+PPO_EPOCHS = 4             # passes over each rollout batch per update
+PPO_MINIBATCH = 8
+PPO_CLIP = 0.2
+BASELINE_MOMENTUM = 0.9    # running reward baseline for advantages
+SEED = 0
+CHECKPOINT_DIR = "checkpoints"
+CHECKPOINT_EVERY = 10      # episodes between checkpoints
+METRICS_CSV = "ppo_kg_rewards.csv"
+METRICS_JSONL = "ppo_kg_rewards.jsonl"
+INSTRUMENT = True          # per-phase timings, LLM latency and token counts
+PROFILE_JSONL = "ppo_profile.jsonl"
+PROMETHEUS_PATH = "ppo_metrics.prom"
+
+
+
+@dataclass
+class TrainConfig:
+    """Settings of one training run.
+
+    Field names are the lower-case module constants above, which provide
+    the defaults. A config can be loaded from YAML (:meth:`from_yaml`) and
+    patched with ``key=value`` strings (:meth:`override`), as done by
+    ``--config`` and ``--set`` and by ``sweep.py``.
+    """
+
+    episodes: int = EPISODES
+    top_k: int = TOP_K
+    temperature: float = TEMPERATURE
+    num_samples: int = NUM_SAMPLES
+    instruction: str = INSTRUCTION
+    template_path: str = TEMPLATE_PATH
+    kg_path: str = KG_PATH
+    prompt_token_budget: Optional[int] = PROMPT_TOKEN_BUDGET
+    entropy_coeff: float = ENTROPY_COEFF
+    initial_lr: float = INITIAL_LR
+    min_lr: float = MIN_LR
+    curriculum_phase: int = CURRICULUM_PHASE
+    rollout_batch: int = ROLLOUT_BATCH
+    multitask: bool = MULTITASK
+    task_root: str = TASK_ROOT
+    task_template_path: str = TASK_TEMPLATE_PATH
+    backend: str = BACKEND
+    max_in_flight: int = MAX_IN_FLIGHT
+    requests_per_second: Optional[float] = REQUESTS_PER_SECOND
+    max_retries: int = MAX_RETRIES
+    llm_cache_path: Optional[str] = LLM_CACHE_PATH
+    llm_cache_samples: int = LLM_CACHE_SAMPLES
+    scoring_chunk_size: Optional[int] = SCORING_CHUNK_SIZE
+    scoring_workers: int = SCORING_WORKERS
+    kg_index: bool = KG_INDEX
+    kg_index_candidates: int = KG_INDEX_CANDIDATES
+    sparse_embeddings: bool = SPARSE_EMBEDDINGS
+    score_table_dtype: str = SCORE_TABLE_DTYPE
+    ppo_epochs: int = PPO_EPOCHS
+    ppo_minibatch: int = PPO_MINIBATCH
+    ppo_clip: float = PPO_CLIP
+    baseline_momentum: float = BASELINE_MOMENTUM
+    seed: int = SEED
+    checkpoint_dir: str = CHECKPOINT_DIR
+    checkpoint_every: int = CHECKPOINT_EVERY
+    metrics_csv: str = METRICS_CSV
+    metrics_jsonl: Optional[str] = METRICS_JSONL
+    instrument: bool = INSTRUMENT
+    profile_jsonl: str = PROFILE_JSONL
+    prometheus_path: str = PROMETHEUS_PATH
+
+    OUTPUT_FIELDS = ("checkpoint_dir", "metrics_csv", "metrics_jsonl", "profile_jsonl", "prometheus_path")
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> "TrainConfig":
+        """Build a config from a mapping of field names; unknown names are an error."""
+        return cls().replace(**values)
+
+    @classmethod
+    def from_yaml(cls, path: str) -> "TrainConfig":
+        """Load a config from a YAML mapping of field names."""
+        with open(path) as f:
+            return cls.from_dict(yaml.safe_load(f) or {})
+
+    def replace(self, **values: Any) -> "TrainConfig":
+        """Return a copy with some fields changed."""
+        unknown = set(values) - {f.name for f in fields(self)}
+        if unknown:
+            raise ValueError(f"Unknown config field(s): {', '.join(sorted(unknown))}")
+        return dataclasses.replace(self, **values)
+
+    def override(self, assignments: Iterable[str]) -> "TrainConfig":
+        """Apply ``key=value`` strings; values are parsed as YAML (``0.01``, ``true``, ``null``)."""
+        values = {}
+        for assignment in assignments:
+            key, sep, value = assignment.partition("=")
+            if not sep:
+                raise ValueError(f"Expected KEY=VALUE, got {assignment!r}")
+            values[key.strip()] = yaml.safe_load(value)
+        return self.replace(**values)
+
+    def in_directory(self, directory: str) -> "TrainConfig":
+        """Return a copy whose checkpoints, metrics and profiles go to ``directory``."""
+        return self.replace(**{
+            name: os.path.join(directory, os.path.basename(getattr(self, name)))
+            for name in self.OUTPUT_FIELDS if getattr(self, name)
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def train(
+    config: TrainConfig,
+    resume: bool = False,
+    profile_episodes: Optional[str] = None,
+    profiler: str = "cprofile",
+    llm_semaphore: Any = None,
+) -> Dict[str, float]:
+    """Run one PPO training with ``config``.
+
+    Parameters
+    ----------
+    config:
+        Hyperparameters, file locations and backend of the run.
+    resume:
+        Continue from the latest checkpoint in ``config.checkpoint_dir``.
+    profile_episodes, profiler:
+        Episode range to profile (e.g. ``"5-8"``) and the profiler to use.
+    llm_semaphore:
+        Optional semaphore shared between processes (e.g. from
+        ``multiprocessing.Manager``) bounding LLM requests across all of
+        them, in addition to ``config.max_in_flight``.
+
+    Returns
+    -------
+    dict
+        Summary of the episodes run (on rank 0; empty on other ranks):
+        ``episodes``, ``mean_reward``, ``final_reward`` (mean over the last
+        ten episodes), ``best_reward`` and ``seconds``.
+    """
+    started = time.perf_counter()
+    # === Data-parallel workers (torchrun); a single process otherwise ===
+    dist_ctx = DistributedContext.from_env()
+    random.seed(config.seed + dist_ctx.rank)
+    np.random.seed(config.seed + dist_ctx.rank)
+    torch.manual_seed(config.seed)
+
+    # === Load Ground Truth .in File ===
+    with open("pw.scf.si.in") as f:
+        ground_truth_input = f.read()
+
+    # === Tasks: one per reference file, or the single ground truth ===
+    if config.multitask:
+        env = VectorizedQEEnv.from_directory(config.task_root, seed=config.seed + dist_ctx.rank)
+        template_path = config.task_template_path
+        print(f"Loaded {len(env.tasks)} tasks from {config.task_root}")
+    else:
+        env = VectorizedQEEnv([QETask("pw.scf.si.in", config.instruction, ground_truth_input)],
+                              seed=config.seed + dist_ctx.rank)
+        template_path = config.template_path
+
+    prompt_builder = PromptBuilder(template_path, token_budget=config.prompt_token_budget)
+
+    # === Load KG (memory-mapped if columnar) ===
+    triple_store = load_triple_store(config.kg_path)
+    curriculum_store = triple_store.subset('contains')  # zero-copy view
+    kg_index = None
+    if config.kg_index:
+        index_started = time.perf_counter()
+        kg_index = KGIndex(triple_store, max_candidates=config.kg_index_candidates)
+        print(f"Indexed {len(kg_index)} terms over {len(triple_store)} triples "
+              f"in {time.perf_counter() - index_started:.2f}s")
+
+    # === Show available predicates
+    available_predicates = sorted(triple_store.predicate_slices)
+    print("Available predicates in KG:", available_predicates)
 
-# === Load Ground Truth .in File ===
-with open("pw.scf.si.in") as f:
-    ground_truth_input = f.read()
-
-# === Load Triples ===
-with open("relationships.json") as f:
-    all_triples = json.load(f)
-
-# === Show available predicates
-available_predicates = sorted(set(t['predicate'] for t in all_triples))
-print("Available predicates in KG:", available_predicates)
-
-# === Build Vocab ===
-entities = set()
-predicates = set()
-for t in all_triples:
-    entities.add(t['subject'])
-    entities.add(t['object'])
-    predicates.add(t['predicate'])
-
-entity2id = {e: i for i, e in enumerate(sorted(entities))}
-predicate2id = {p: i for i, p in enumerate(sorted(predicates))}
-
-# === Initialize Policy Model ===
-vocab_size = len(entity2id)
-predicate_size = len(predicate2id)
-model = TripleScoringModel(vocab_size=vocab_size, predicate_size=predicate_size, embedding_dim=32)
-optimizer = torch.optim.Adam(model.parameters(), lr=INITIAL_LR)
-scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='max', patience=5, factor=0.5, min_lr=MIN_LR)
-
-# === PPO Optimization Loop ===
-results = []
-for episode in trange(1, EPISODES + 1, desc="PPO Episodes"):
-    # === Curriculum Phase ===
-    if episode <= CURRICULUM_PHASE:
-        train_triples = [t for t in all_triples if t['predicate'] == 'contains']
-        print(f"Episode {episode}: {len(train_triples)} 'contains' triples selected for curriculum")
+    # === Initialize Policy Model ===
+    vocab_size = len(triple_store.entities)
+    predicate_size = len(triple_store.predicates)
+    model = TripleScoringModel(vocab_size=vocab_size, predicate_size=predicate_size, embedding_dim=32,
+                               sparse=config.sparse_embeddings, table_dtype=config.score_table_dtype)
+    if config.sparse_embeddings:
+        optimizer = RowSparseAdam(model.parameters(), lr=config.initial_lr)
     else:
-        train_triples = all_triples
-
-    # === Triple Selection ===
-    top_triples, top_ids = select_topk_triples(model, train_triples, k=TOP_K,
-                                               entity2id=entity2id, predicate2id=predicate2id, return_ids=True)
-
-    if not top_ids:
-        print(f"[!] No triples selected in episode {episode}. Skipping...")
-        continue  # skip to next episode
-
-    # === Prompt and Generation ===
-    prompt = generate_prompt_from_triples(top_triples, instruction=INSTRUCTION, template_path=TEMPLATE_PATH)
-    generated_input = generate_qe_input_from_prompt(prompt, openai_client, temperature=TEMPERATURE)
-    reward = compute_reward(generated_input, ground_truth_input)
-
-    # === Compute Loss ===
-    triple_tensor = torch.tensor(top_ids, dtype=torch.long)
-    scores = model(triple_tensor)
-
-    log_probs = torch.log_softmax(scores, dim=0)
-    policy_loss = -reward * torch.sum(log_probs)
-    entropy = -torch.sum(log_probs * torch.exp(log_probs))
-    loss = policy_loss - ENTROPY_COEFF * entropy
-
-    optimizer.zero_grad()
-    loss.backward()
-    optimizer.step()
-    scheduler.step(reward)
-
-    results.append({
-        "episode": episode,
-        "reward": reward,
-        "triples_used": len(top_triples),
-        "loss": loss.item(),
-        "entropy": entropy.item(),
-        "lr": optimizer.param_groups[0]['lr']
-    })
-
-# === Save Results ===
-df = pd.DataFrame(results)
-df.to_csv("ppo_kg_rewards.csv", index=False)
-print("\n✅ PPO training completed. Reward log saved to ppo_kg_rewards.csv")
+        optimizer = torch.optim.Adam(model.parameters(), lr=config.initial_lr)
+    dist_ctx.broadcast_module(model)
+    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='max', patience=5, factor=0.5,
+                                                           min_lr=config.min_lr)
+    trainer = PPOTrainer(model, optimizer, clip_eps=config.ppo_clip, epochs=config.ppo_epochs,
+                         minibatch_size=config.ppo_minibatch, entropy_coeff=config.entropy_coeff,
+                         baseline_momentum=config.baseline_momentum, distributed=dist_ctx)
+
+    # Rank 0 writes profiles, metrics and checkpoints
+    instrumentation = TrainingInstrumentation(config.profile_jsonl, config.prometheus_path,
+                                              enabled=config.instrument and dist_ctx.is_main, append=resume)
+    profile_window = ProfileWindow.from_spec(profile_episodes if dist_ctx.is_main else None, mode=profiler)
+
+    use_cache = config.llm_cache_path and config.backend == "openai"
+    llm_cache = ResponseCache(config.llm_cache_path, samples_per_key=config.llm_cache_samples) if use_cache else None
+    if config.backend == "openai":
+        backend = make_backend("openai", max_in_flight=config.max_in_flight, requests_per_second=config.requests_per_second,
+                               max_retries=config.max_retries, cache=llm_cache, on_response=instrumentation.record_llm,
+                               shared_semaphore=llm_semaphore)
+    else:
+        backend = make_backend(config.backend, root=config.task_root, seed=config.seed + dist_ctx.rank)
+
+    # === Resume from Checkpoint ===
+    last_episode = 0
+    if resume:
+        checkpoint = dist_ctx.broadcast(load_latest_checkpoint(config.checkpoint_dir) if dist_ctx.is_main else None)
+        if checkpoint is None:
+            print(f"[!] No checkpoint found in {config.checkpoint_dir}. Starting from scratch.")
+        else:
+            model.load_state_dict(checkpoint["model"])
+            optimizer.load_state_dict(checkpoint["optimizer"])
+            scheduler.load_state_dict(checkpoint["scheduler"])
+            # Per-rank baseline and RNG streams, when the number of workers is unchanged
+            ranks = checkpoint.get("ranks")
+            if ranks and len(ranks) == dist_ctx.world_size:
+                rank_state = ranks[dist_ctx.rank]
+            else:
+                rank_state = checkpoint if dist_ctx.is_main else None
+            if rank_state is not None:
+                trainer.baseline = rank_state["baseline"]
+                env.rng.setstate(rank_state["env_rng"])
+                if backend.rng is not None and rank_state.get("backend_rng") is not None:
+                    backend.rng.setstate(rank_state["backend_rng"])
+                restore_rng_state(rank_state["rng"])
+            last_episode = checkpoint["episode"]
+            print(f"Resuming after episode {last_episode}")
+
+    metrics = checkpoints = None
+    if dist_ctx.is_main:
+        metrics = MetricsLogger(config.metrics_csv, config.metrics_jsonl, resume_after=last_episode if resume else None)
+        checkpoints = CheckpointWriter(config.checkpoint_dir)
+    last_checkpoint = last_episode
+    episode_rewards = []
+
+    # === PPO Optimization Loop ===
+    # Each step covers rollout_batch episodes per worker, dealt round robin
+    step_size = config.rollout_batch * dist_ctx.world_size
+    for batch_start in trange(last_episode + 1, config.episodes + 1, step_size, desc="PPO Episodes",
+                              disable=not dist_ctx.is_main):
+        step_episodes = list(range(batch_start, min(batch_start + step_size, config.episodes + 1)))
+        episodes = step_episodes[dist_ctx.rank::dist_ctx.world_size]
+        profile_window.step(step_episodes[0], step_episodes[-1])
+        tasks = env.sample(len(episodes))
+
+        with instrumentation.phase("selection"):
+            # === Curriculum Phase ===
+            pools = []
+            for episode in episodes:
+                if episode <= config.curriculum_phase:
+                    print(f"Episode {episode}: {len(curriculum_store)} 'contains' triples selected for curriculum")
+                    pools.append(curriculum_store)
+                else:
+                    pools.append(triple_store)
+
+            # === Keyword Prefetch: only triples matching the instruction are scored ===
+            if kg_index is not None:
+                pools = prefetch_pools(pools, config.top_k, kg_index, [t.instruction for t in tasks])
+
+            # === Triple Selection: one forward pass for the whole batch ===
+            selections = select_topk_triples_batch(model, pools, k=config.top_k, chunk_size=config.scoring_chunk_size,
+                                                   num_workers=config.scoring_workers)
+
+        rollouts = []
+        with instrumentation.phase("prompt"):
+            prompts = prompt_builder.render_batch([s[0] for s in selections], [t.instruction for t in tasks])
+            for episode, task, (top_triples, top_ids), prompt in zip(episodes, tasks, selections, prompts):
+                if not prompt.used:
+                    print(f"[!] No triples selected in episode {episode}. Skipping...")
+                    continue  # skip to next episode
+
+                # Only triples that fit in the prompt are treated as the action
+                top_triples = [top_triples[i] for i in prompt.used]
+                top_ids = [top_ids[i] for i in prompt.used]
+                rollouts.append((episode, task, top_triples, top_ids, prompt))
+
+        rewards = reward_vars = []
+        if rollouts:
+            # === Concurrent Generation ===
+            with instrumentation.phase("llm"):
+                samples = backend.generate_samples([r[4].text for r in rollouts], config.num_samples,
+                                                   temperature=config.temperature)
+            with instrumentation.phase("reward"):
+                # Every sample is scored; their mean is the episode's reward estimate
+                flat_rewards = env.score([r[1] for r in rollouts for _ in range(config.num_samples)],
+                                         [text for texts in samples for text in texts])
+                sample_rewards = np.asarray(flat_rewards).reshape(len(rollouts), config.num_samples)
+                rewards = sample_rewards.mean(axis=1).tolist()
+                reward_vars = sample_rewards.var(axis=1).tolist()
+
+        # === PPO Update over the Rollout Batch (gradients averaged across workers) ===
+        with instrumentation.phase("update"):
+            entropies = [trainer.record(top_ids, reward) for (_, _, _, top_ids, _), reward in zip(rollouts, rewards)]
+            stats = trainer.update()
+            # Every worker steps the scheduler with the global mean reward, so learning rates stay equal
+            reward_sum, reward_count = dist_ctx.all_reduce_sum([sum(rewards), len(rewards)])
+            if reward_count:
+                scheduler.step(reward_sum / reward_count)
+
+        rows = []
+        for (episode, task, top_triples, _, prompt), reward, reward_var, entropy in zip(
+                rollouts, rewards, reward_vars, entropies):
+            rows.append({
+                "episode": episode,
+                "rank": dist_ctx.rank,
+                "task": task.name,
+                "reward": reward,
+                "reward_var": reward_var,
+                "samples": config.num_samples,
+                "triples_used": len(top_triples),
+                "prompt_tokens": prompt.tokens,
+                "loss": stats["loss"],
+                "entropy": entropy,
+                "lr": optimizer.param_groups[0]['lr'],
+                "clip_fraction": stats["clip_fraction"],
+                "approx_kl": stats["approx_kl"],
+            })
+        gathered = dist_ctx.gather(rows)
+        if metrics is not None:
+            for row in sorted((row for rank_rows in gathered for row in rank_rows), key=lambda r: r["episode"]):
+                metrics.log(row)
+                episode_rewards.append(row["reward"])
+
+        # === Periodic Checkpoint (written in the background by rank 0) ===
+        last_episode = step_episodes[-1]
+        if last_episode - last_checkpoint >= config.checkpoint_every or last_episode == config.episodes:
+            rank_states = dist_ctx.gather({
+                "baseline": trainer.baseline,
+                "env_rng": env.rng.getstate(),
+                "backend_rng": backend.rng.getstate() if backend.rng is not None else None,
+                "rng": capture_rng_state(),
+            })
+            if checkpoints is not None:
+                with instrumentation.phase("checkpoint"):
+                    checkpoints.save(last_episode, {
+                        "episode": last_episode,
+                        "model": model.state_dict(),
+                        "optimizer": optimizer.state_dict(),
+                        "scheduler": scheduler.state_dict(),
+                        **rank_states[0],
+                        "ranks": rank_states,
+                    })
+            last_checkpoint = last_episode
+
+        instrumentation.end_step(episodes, candidates=sum(len(p) for p in pools))
+
+    profile_window.stop()
+    if dist_ctx.is_main:
+        checkpoints.close()
+        metrics.close()
+    instrumentation.close()
+    dist_ctx.close()
+    print(f"\n✅ PPO training completed. Reward log saved to {config.metrics_csv}")
+    if llm_cache is not None:
+        print(f"LLM cache: {llm_cache.stats()}")
+    if not episode_rewards:
+        return {}
+    return {
+        "episodes": len(episode_rewards),
+        "mean_reward": float(np.mean(episode_rewards)),
+        "final_reward": float(np.mean(episode_rewards[-10:])),
+        "best_reward": float(np.max(episode_rewards)),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Train the triple selection policy with PPO.")
+    parser.add_argument("--config", default=None,
+                        help="YAML file of TrainConfig fields; omitted fields keep the defaults in this file.")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE",
+                        help="Override a config field, e.g. --set initial_lr=0.003 (repeatable).")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the latest checkpoint in --checkpoint-dir.")
+    parser.add_argument("--checkpoint-dir", default=None, help=f"Folder for training checkpoints (default: {CHECKPOINT_DIR}).")
+    parser.add_argument("--backend", default=None, choices=BACKENDS,
+                        help=f"Generation backend: the OpenAI API or the offline retrieval stand-in (default: {BACKEND}).")
+    parser.add_argument("--profile-episodes", default=None,
+                        help="Episode range to profile, e.g. '5' or '5-8'.")
+    parser.add_argument("--profiler", default="cprofile", choices=["cprofile", "torch"],
+                        help="Profiler used for --profile-episodes.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = TrainConfig.from_yaml(args.config) if args.config else TrainConfig()
+    if args.checkpoint_dir is not None:
+        config.checkpoint_dir = args.checkpoint_dir
+    if args.backend is not None:
+        config.backend = args.backend
+    config = config.override(args.overrides)
+    train(config, resume=args.resume, profile_episodes=args.profile_episodes, profiler=args.profiler)
+
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+FACTS_PLACEHOLDER = "<<FACTS>>"
+INSTRUCTION_PLACEHOLDER = "<<INSTRUCTION>>"
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local estimate of the number of BPE tokens in ``text``.
+
+    Words of up to four characters and punctuation marks count as one token,
+    longer words as one token per four characters. This tracks the GPT
+    tokenizers closely enough on documentation and QE parameter names to
+    budget prompts without a tokenizer dependency.
+    """
+    return sum(1 if len(piece) <= 4 else (len(piece) + 3) // 4 for piece in _TOKEN_RE.findall(text))
+
+
+def format_fact(triple: Dict[str, Any]) -> str:
+    """Render one triple as a line of the facts block."""
+    return f"{triple['subject']} — {triple['predicate']} — {triple['object']}"
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """Prompt template split once around its ``<<FACTS>>`` and ``<<INSTRUCTION>>`` slots."""
+
+    parts: tuple
+    slots: tuple
+    static_tokens: int
+
+    @classmethod
+    def compile(cls, template: str) -> "CompiledTemplate":
+        pattern = f"({re.escape(FACTS_PLACEHOLDER)}|{re.escape(INSTRUCTION_PLACEHOLDER)})"
+        pieces = re.split(pattern, template)
+        parts, slots = tuple(pieces[0::2]), tuple(pieces[1::2])
+        return cls(parts, slots, estimate_tokens("".join(parts)))
+
+    def render(self, facts: str, instruction: str) -> str:
+        values = {FACTS_PLACEHOLDER: facts, INSTRUCTION_PLACEHOLDER: instruction}
+        out = [self.parts[0]]
+        for slot, part in zip(self.slots, self.parts[1:]):
+            out.append(values[slot])
+            out.append(part)
+        return "".join(out)
+
+
+@lru_cache(maxsize=32)
+def _compile_file(path: str, mtime_ns: int) -> CompiledTemplate:
+    with open(path) as f:
+        return CompiledTemplate.compile(f.read())
+
+
+def load_template(path: str = "prompt_template.txt") -> CompiledTemplate:
+    """Read and compile ``path``, reusing the compiled form until the file changes."""
+    return _compile_file(os.path.abspath(path), os.stat(path).st_mtime_ns)
+
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+    """A rendered prompt with its estimated size and the facts it contains.
+
+    ``used`` holds the positions (in the input triple list) of the triples
+    that made it into the prompt, in the order they appear.
+    """
+
+    text: str
+    tokens: int
+    used: List[int]
+
+
+class PromptBuilder:
+    """Render prompts from triple sets, optionally within a token budget.
+
+    The template is compiled once. With a ``token_budget``, triples are taken
+    greedily in order of decreasing policy score and each one is kept if its
+    fact line still fits next to the template and instruction; triples that do
+    not fit are skipped so smaller, lower-ranked ones can fill the remainder.
+    Token counts of fact lines are memoized, since the same triples recur
+    across episodes.
+    """
+
+    def __init__(
+        self,
+        template_path: str = "prompt_template.txt",
+        token_budget: Optional[int] = None,
+        estimator: Callable[[str], int] = estimate_tokens,
+    ) -> None:
+        """Construct the builder.
+
+        Parameters
+        ----------
+        template_path:
+            Prompt template with ``<<FACTS>>`` and ``<<INSTRUCTION>>`` slots.
+        token_budget:
+            Maximum estimated tokens per prompt, ``None`` for no limit.
+        estimator:
+            Function estimating the token count of a string.
+        """
+        self.template = load_template(template_path)
+        self.token_budget = token_budget
+        self.estimator = estimator
+        self._line_tokens = lru_cache(maxsize=65536)(estimator)
+
+    def pack(self, lines: Sequence[str], available: Optional[int], scores: Optional[Sequence[float]] = None) -> List[int]:
+        """Choose which fact lines fit in ``available`` tokens.
+
+        Parameters
+        ----------
+        lines:
+            Candidate fact lines.
+        available:
+            Token budget for the facts block, ``None`` to keep everything.
+        scores:
+            Policy score per line; defaults to the given order being the
+            ranking (as returned by ``select_topk_triples``).
+
+        Returns
+        -------
+        list[int]
+            Indices of the kept lines, highest score first.
+        """
+        order = range(len(lines))
+        if scores is not None:
+            order = sorted(order, key=lambda i: -scores[i])
+        if available is None:
+            return list(order)
+
+        kept = []
+        for i in order:
+            cost = self._line_tokens(lines[i]) + 1  # newline
+            if cost <= available:
+                kept.append(i)
+                available -= cost
+        return kept
+
+    def render(
+        self,
+        triples: Sequence[Dict[str, Any]],
+        instruction: str,
+        scores: Optional[Sequence[float]] = None,
+    ) -> RenderedPrompt:
+        """Render one prompt from ``triples`` and ``instruction``."""
+        lines = [format_fact(t) for t in triples]
+        instruction_tokens = self.estimator(instruction)
+        available = None
+        if self.token_budget is not None:
+            available = max(0, self.token_budget - self.template.static_tokens - instruction_tokens)
+        used = self.pack(lines, available, scores)
+
+        facts = "\n".join(lines[i] for i in used)
+        tokens = self.template.static_tokens + instruction_tokens + sum(self._line_tokens(lines[i]) + 1 for i in used)
+        return RenderedPrompt(self.template.render(facts, instruction), tokens, used)
+
+    def render_batch(
+        self,
+        triple_sets: Sequence[Sequence[Dict[str, Any]]],
+        instructions: Sequence[str],
+        scores: Optional[Sequence[Optional[Sequence[float]]]] = None,
+    ) -> List[RenderedPrompt]:
+        """Render one prompt per triple set.
+
+        Parameters
+        ----------
+        triple_sets:
+            Selected triples for each prompt.
+        instructions:
+            Instruction for each prompt.
+        scores:
+            Optional per-set policy scores used for packing.
+
+        Returns
+        -------
+        list[RenderedPrompt]
+            Prompts in input order.
+        """
+        if scores is None:
+            scores = [None] * len(triple_sets)
+        return [self.render(triples, instruction, s)
+                for triples, instruction, s in zip(triple_sets, instructions, scores)]
@@ -0,0 +1,316 @@
+import re
+import zlib
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CARDS = {
+    "ATOMIC_SPECIES",
+    "ATOMIC_POSITIONS",
+    "K_POINTS",
+    "CELL_PARAMETERS",
+    "OCCUPATIONS",
+    "CONSTRAINTS",
+    "ATOMIC_VELOCITIES",
+    "ATOMIC_FORCES",
+    "ADDITIONAL_K_POINTS",
+    "SOLVENTS",
+    "HUBBARD",
+}
+
+# Numeric cards compared row by row; values are padded to a fixed width so that
+# every row of a card hashes to a single integer key.
+NUMERIC_CARDS = {"ATOMIC_POSITIONS": 7, "K_POINTS": 6, "CELL_PARAMETERS": 3}
+DEFAULT_CARD_OPTIONS = {"ATOMIC_POSITIONS": "alat", "K_POINTS": "tpiba", "CELL_PARAMETERS": "bohr"}
+
+# Numbers are compared on a fixed-point grid of this resolution.
+NUMERIC_SCALE = 1e6
+_PAD = np.iinfo(np.int64).min
+
+_ASSIGNMENT = re.compile(
+    r"([A-Za-z_][\w%]*(?:\s*\([\s\d,]+\))?)\s*=\s*('[^']*'|\"[^\"]*\"|[^,\s]+)"
+)
+_FORTRAN_EXPONENT = re.compile(r"(?<=[\d.])[dD](?=[+-]?\d)")
+_ROW_HASH = np.random.default_rng(0x5EED).integers(1, 2 ** 62, size=8, dtype=np.int64) | 1
+
+Fact = Tuple
+
+
+@dataclass(frozen=True)
+class QEInput:
+    """Normalized view of a Quantum ESPRESSO input file.
+
+    ``facts`` holds hashable items that are compared as a set: namelist
+    ``(namelist, key, value)`` entries, ``ATOMIC_SPECIES`` rows, card options
+    and any card lines that are not numeric tables. ``blocks`` maps each
+    numeric card to an ``int64`` array of fixed-point rows.
+    """
+
+    facts: FrozenSet[Fact]
+    blocks: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    @property
+    def num_rows(self) -> int:
+        return sum(len(b) for b in self.blocks.values())
+
+
+def _strip_comment(line: str) -> str:
+    """Remove a trailing ``!``/``#`` comment that is not inside quotes."""
+    if "!" not in line and "#" not in line:
+        return line
+    quote = None
+    for i, ch in enumerate(line):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch in "!#":
+            return line[:i]
+    return line
+
+
+def _to_number(token: str) -> Optional[float]:
+    try:
+        return float(token)
+    except ValueError:
+        pass
+    try:
+        return float(_FORTRAN_EXPONENT.sub("e", token))
+    except ValueError:
+        return None
+
+
+def normalize_value(token: str):
+    """Normalize a namelist value to a comparable Python object.
+
+    Quotes are dropped, Fortran logicals become ``bool`` and numbers (with
+    ``d`` exponents allowed) become ``float`` rounded to ten significant
+    digits, so ``30``, ``30.0`` and ``3.0d1`` compare equal.
+    """
+    token = token.strip()
+    if len(token) >= 2 and token[0] == token[-1] and token[0] in "'\"":
+        return token[1:-1].strip()
+    lowered = token.lower()
+    if lowered in (".true.", ".t.", "true", "t"):
+        return True
+    if lowered in (".false.", ".f.", "false", "f"):
+        return False
+    number = _to_number(token)
+    if number is not None:
+        return float(f"{number:.10g}")
+    return lowered
+
+
+def _normalize_key(key: str) -> str:
+    return re.sub(r"\s+", "", key).lower()
+
+
+def _card_option(rest: str, card: str) -> str:
+    option = rest.strip().strip("(){}").strip().lower()
+    return option or DEFAULT_CARD_OPTIONS.get(card, "")
+
+
+def _numeric_row(tokens: Sequence[str], width: int, label: Optional[str] = None) -> Optional[List[int]]:
+    values = [_to_number(t) for t in tokens]
+    if not values or any(v is None for v in values):
+        return None
+    row = [int(round(v * NUMERIC_SCALE)) for v in values]
+    if label is not None:
+        row.insert(0, zlib.crc32(label.encode("utf-8")))
+    if len(row) > width:
+        return None
+    return row + [_PAD] * (width - len(row))
+
+
+@lru_cache(maxsize=8192)
+def parse_qe_input(text: str) -> QEInput:
+    """Parse QE input text into a :class:`QEInput`.
+
+    The parser is lenient: unknown lines are kept as whitespace-normalized
+    facts rather than raising, since generated candidates are often only
+    partially valid. Results are memoized on the exact input text.
+    """
+    facts = set()
+    rows: Dict[str, List[List[int]]] = {}
+    namelist = None
+    card = None
+    card_option = ""
+
+    for raw in text.splitlines():
+        line = _strip_comment(raw).strip()
+        if not line:
+            continue
+
+        if line.startswith("&"):
+            rest = line[1:].split(None, 1)  # "&control", "& control ecutwfc=30", "&"
+            namelist = rest[0].lower() if rest else ""
+            card = None
+            line = rest[1].strip() if len(rest) > 1 else ""
+            if not line:
+                continue
+        if namelist is not None and line.split()[0].upper() in CARDS:
+            namelist = None  # tolerate a missing "/" before the cards
+        if namelist is not None:
+            body, ends = (line[:-1], True) if line.endswith("/") else (line, line == "/")
+            for key, value in _ASSIGNMENT.findall(body):
+                facts.add((namelist, _normalize_key(key), normalize_value(value)))
+            if ends:
+                namelist = None
+            continue
+
+        tokens = line.split()
+        head = tokens[0].upper()
+        if head in CARDS:
+            card = head
+            card_option = _card_option(line[len(tokens[0]):], card)
+            facts.add(("card", card, card_option))
+            continue
+        if card is None:
+            facts.add(("line", " ".join(tokens)))
+            continue
+
+        if card == "ATOMIC_SPECIES" and len(tokens) >= 3:
+            mass = _to_number(tokens[1])
+            facts.add((card, tokens[0], float(f"{mass:.10g}") if mass is not None else tokens[1], tokens[2]))
+        elif card == "K_POINTS" and card_option not in ("automatic", "gamma") and len(tokens) == 1:
+            facts.add((card, "nks", normalize_value(tokens[0])))
+        elif card in NUMERIC_CARDS:
+            width = NUMERIC_CARDS[card]
+            row = (_numeric_row(tokens[1:], width, label=tokens[0]) if card == "ATOMIC_POSITIONS"
+                   else _numeric_row(tokens, width))
+            if row is None:
+                facts.add((card, " ".join(tokens)))
+            else:
+                rows.setdefault(card, []).append(row)
+        else:
+            facts.add((card, " ".join(tokens)))
+
+    blocks = {
+        name: np.unique(np.asarray(r, dtype=np.int64), axis=0)
+        for name, r in rows.items()
+    }
+    return QEInput(facts=frozenset(facts), blocks=blocks)
+
+
+def _row_keys(block: np.ndarray) -> np.ndarray:
+    """Hash every fixed-width row of ``block`` to one ``int64`` key."""
+    with np.errstate(over="ignore"):
+        return block @ _ROW_HASH[: block.shape[1]]
+
+
+class RewardEngine:
+    """Score generated QE inputs against precompiled reference inputs.
+
+    References are parsed once and kept in memory together with the hashed
+    rows of their numeric cards. :meth:`score_batch` compares any number of
+    candidates against one reference, handling the numeric tables of all
+    candidates with a single vectorized membership test per card.
+
+    The score is a Jaccard index over normalized items: each namelist
+    assignment, species entry, card option and numeric table row counts as one
+    item, so formatting, ordering and comma differences no longer matter.
+    """
+
+    def __init__(self, references: Optional[Dict[str, str]] = None) -> None:
+        """Construct the engine.
+
+        Parameters
+        ----------
+        references:
+            Optional mapping from reference name to QE input text.
+        """
+        self.references: Dict[str, QEInput] = {}
+        self._reference_keys: Dict[str, Dict[str, np.ndarray]] = {}
+        for name, text in (references or {}).items():
+            self.add_reference(name, text)
+
+    @classmethod
+    def from_directory(cls, root: str = "quantum_inputs", pattern: str = "**/*.in") -> "RewardEngine":
+        """Build an engine from every file matching ``pattern`` under ``root``.
+
+        References are named by their path relative to ``root``.
+        """
+        root_path = Path(root)
+        return cls({
+            str(path.relative_to(root_path)): path.read_text()
+            for path in sorted(root_path.glob(pattern))
+        })
+
+    def add_reference(self, name: str, text: str) -> QEInput:
+        """Parse ``text`` and register it under ``name``."""
+        parsed = parse_qe_input(text)
+        self.references[name] = parsed
+        self._reference_keys[name] = {card: _row_keys(block) for card, block in parsed.blocks.items()}
+        return parsed
+
+    def _reference(self, reference: str) -> str:
+        if reference in self.references:
+            return reference
+        # Allow passing raw reference text, compiled on first use.
+        name = f"<text:{hash(reference)}>"
+        if name not in self.references:
+            self.add_reference(name, reference)
+        return name
+
+    def score(self, generated_input: str, reference: str) -> float:
+        """Score a single candidate; see :meth:`score_batch`."""
+        return float(self.score_batch([generated_input], reference)[0])
+
+    def score_batch(self, candidates: Sequence[str], reference: str) -> np.ndarray:
+        """Score ``candidates`` against one reference.
+
+        Parameters
+        ----------
+        candidates:
+            Generated QE input texts.
+        reference:
+            Name of a registered reference, or raw reference text.
+
+        Returns
+        -------
+        numpy.ndarray
+            ``float64`` array of rewards in ``[0, 1]``, one per candidate.
+        """
+        name = self._reference(reference)
+        ref = self.references[name]
+        ref_keys = self._reference_keys[name]
+        parsed = [parse_qe_input(c) for c in candidates]
+        n = len(parsed)
+
+        overlap = np.array([len(ref.facts & p.facts) for p in parsed], dtype=np.float64)
+        union = np.array([len(ref.facts | p.facts) for p in parsed], dtype=np.float64)
+        union += ref.num_rows
+
+        cards = set(ref.blocks).union(*(p.blocks for p in parsed)) if parsed else set()
+        for card in cards:
+            blocks = [p.blocks.get(card) for p in parsed]
+            owners = [np.full(len(b), i) for i, b in enumerate(blocks) if b is not None and len(b)]
+            if not owners:
+                continue
+            owner = np.concatenate(owners)
+            keys = _row_keys(np.concatenate([b for b in blocks if b is not None and len(b)]))
+            matched = np.isin(keys, ref_keys.get(card, np.empty(0, dtype=np.int64)))
+            hits = np.bincount(owner, weights=matched, minlength=n)
+            overlap += hits
+            union += np.bincount(owner, minlength=n) - hits
+
+        rewards = np.divide(overlap, union, out=np.zeros(n), where=union > 0)
+        rewards[[not c.strip() for c in candidates]] = 0.0
+        return rewards
+
+    def score_matrix(self, candidates: Sequence[str], references: Optional[Iterable[str]] = None) -> np.ndarray:
+        """Score every candidate against every reference.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape ``(len(candidates), len(references))``.
+        """
+        names = list(references) if references is not None else list(self.references)
+        if not names:
+            return np.zeros((len(candidates), 0))
+        return np.stack([self.score_batch(candidates, r) for r in names], axis=1)
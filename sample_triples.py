@@ -1,12 +1,128 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import torch
 
+from kg_index import KGIndex
+from triple_store import TripleStore
+
+
+def _score(model: torch.nn.Module, triple_ids: torch.Tensor) -> torch.Tensor:
+    """Inference scores, using ``model.score`` (e.g. precomputed tables) when available."""
+    score = getattr(model, "score", None)
+    return (score(triple_ids) if score is not None else model(triple_ids)).reshape(-1)
+
+
+def _stable_topk(scores: torch.Tensor, k: int) -> torch.Tensor:
+    """Indices of the ``k`` highest ``scores``, preferring earlier rows on ties.
+
+    ``torch.topk`` leaves the order of equal scores unspecified, and
+    duplicate triples from different sources score exactly the same. Every
+    row tied with the k-th score is kept, then those few are stably sorted.
+    """
+    k = min(k, scores.numel())
+    if k == 0:
+        return torch.empty(0, dtype=torch.long)
+    threshold = torch.topk(scores, k=k).values[-1]
+    rows = torch.nonzero(scores >= threshold).squeeze(1)
+    return rows[torch.sort(scores[rows], descending=True, stable=True).indices[:k]]
+
+
+def _chunk_topk(model: torch.nn.Module, chunk: torch.Tensor, k: int, offset: int) -> tuple[torch.Tensor, torch.Tensor]:
+    """Score one chunk and return its top ``k`` scores and global row indices."""
+    with torch.no_grad():
+        scores = _score(model, chunk)
+    indices = _stable_topk(scores, k)
+    return scores[indices], indices + offset
+
+
+def _merge_topk(
+    best: tuple[torch.Tensor, torch.Tensor] | None,
+    new: tuple[torch.Tensor, torch.Tensor],
+    k: int,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Merge two top-k candidate sets, preferring earlier rows on ties."""
+    if best is None:
+        values, indices = new
+    else:
+        values = torch.cat([best[0], new[0]])
+        indices = torch.cat([best[1], new[1]])
+    order = torch.argsort(indices)
+    values, indices = values[order], indices[order]
+    order = torch.sort(values, descending=True, stable=True).indices[:k]
+    return values[order], indices[order]
+
+
+def score_topk(
+    model: torch.nn.Module,
+    triple_ids: torch.Tensor,
+    k: int,
+    chunk_size: int | None = None,
+    num_workers: int = 0,
+) -> torch.Tensor:
+    """Return the row indices of the ``k`` highest scoring triples.
+
+    Parameters
+    ----------
+    model:
+        Module mapping a ``(batch_size, 3)`` ID tensor to scores.
+    triple_ids:
+        Tensor of shape ``(num_triples, 3)``.
+    k:
+        Number of rows to return.
+    chunk_size:
+        If set, score at most this many triples per forward pass and keep a
+        running top-k across chunks, so peak memory is bounded by the chunk
+        size rather than the KG size.
+    num_workers:
+        With ``chunk_size`` set, score chunks on this many threads in
+        parallel (PyTorch releases the GIL inside its kernels).
+
+    Returns
+    -------
+    torch.Tensor
+        ``int64`` row indices ordered by descending score; equal scores
+        keep row order, so every path returns the same rows.
+    """
+    n = triple_ids.shape[0]
+    k = min(k, n)
+    if not chunk_size or chunk_size >= n:
+        with torch.no_grad():
+            scores = _score(model, triple_ids)
+        return _stable_topk(scores, k)
+
+    starts = range(0, n, chunk_size)
+    best = None
+    if num_workers and num_workers > 1:
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            # map() yields in submission order, keeping tie-breaking deterministic
+            parts = pool.map(lambda start: _chunk_topk(model, triple_ids[start:start + chunk_size], k, start), starts)
+            for part in parts:
+                best = _merge_topk(best, part, k)
+    else:
+        for start in starts:
+            best = _merge_topk(best, _chunk_topk(model, triple_ids[start:start + chunk_size], k, start), k)
+    return best[1]
+
+
+def _prefetch(pool: TripleStore, k: int, index: KGIndex | None, instruction: str | None) -> TripleStore:
+    """Narrow ``pool`` to the index's candidates for ``instruction``, if there are at least ``k``."""
+    if index is None or not instruction:
+        return pool
+    candidates = index.prefetch(instruction, pool=pool)
+    return candidates if len(candidates) and len(candidates) >= min(k, len(pool)) else pool
+
+
 def select_topk_triples(
     model: torch.nn.Module,
-    triples: list,
+    triples: list | TripleStore,
     k: int,
-    entity2id: dict,
-    predicate2id: dict,
+    entity2id: dict | None = None,
+    predicate2id: dict | None = None,
     return_ids: bool = False,
+    chunk_size: int | None = None,
+    num_workers: int = 0,
+    index: KGIndex | None = None,
+    instruction: str | None = None,
 ) -> list | tuple[list, list]:
     """Select the top ``k`` scoring triples using ``model``.
 
@@ -16,16 +132,30 @@ def select_topk_triples(
         ``TripleScoringModel`` or compatible module that returns a score for
         each triple.
     triples:
-        Iterable of dictionaries with ``subject``, ``predicate`` and ``object``
-        keys.
+        Either a pre-encoded :class:`TripleStore` (scored without any
+        Python-level loop over triples) or an iterable of dictionaries with
+        ``subject``, ``predicate`` and ``object`` keys.
     k:
         Number of triples to return.
     entity2id:
-        Mapping from entity strings to integer IDs.
+        Mapping from entity strings to integer IDs. Not needed for a
+        ``TripleStore``.
     predicate2id:
-        Mapping from predicate strings to integer IDs.
+        Mapping from predicate strings to integer IDs. Not needed for a
+        ``TripleStore``.
     return_ids:
         If ``True``, also return the encoded ID representation of each triple.
+    chunk_size:
+        Optional number of triples scored per forward pass; see
+        :func:`score_topk`.
+    num_workers:
+        Number of threads scoring chunks in parallel when ``chunk_size`` is
+        set.
+    index, instruction:
+        Optional :class:`~kg_index.KGIndex` over ``triples`` (or over the
+        store ``triples`` is a predicate subset of) and the instruction
+        whose keywords prefetch the candidates; only those are scored.
+        Falls back to all of ``triples`` when fewer than ``k`` match.
 
     Returns
     -------
@@ -34,6 +164,17 @@ def select_topk_triples(
         IDs if ``return_ids`` is ``True``.
     """
 
+    if isinstance(triples, TripleStore):
+        triples = _prefetch(triples, k, index, instruction)
+        if len(triples) == 0:
+            return ([], []) if return_ids else []
+
+        topk_indices = score_topk(model, triples.ids, k, chunk_size=chunk_size, num_workers=num_workers)
+        top_triples = triples.decode(topk_indices)
+        if return_ids:
+            return top_triples, triples.ids[topk_indices].tolist()
+        return top_triples
+
     encoded = []
     valid_triples = []
     for t in triples:
@@ -50,10 +191,7 @@ def select_topk_triples(
         return ([], []) if return_ids else []
 
     triple_tensor = torch.tensor(encoded, dtype=torch.long)
-    with torch.no_grad():
-        scores = model(triple_tensor)
-
-    topk_indices = torch.topk(scores, k=min(k, len(encoded))).indices.tolist()
+    topk_indices = score_topk(model, triple_tensor, k, chunk_size=chunk_size, num_workers=num_workers).tolist()
     top_triples = [valid_triples[i] for i in topk_indices]
     top_ids = [encoded[i] for i in topk_indices]
 
@@ -62,3 +200,78 @@ def select_topk_triples(
     else:
         return top_triples
 
+
+def prefetch_pools(pools: list[TripleStore], k: int, index: KGIndex, instructions: list[str]) -> list[TripleStore]:
+    """Narrow every pool to the index's candidates for its instruction, as in :func:`select_topk_triples`.
+
+    Entries with the same pool and instruction share one candidate store.
+    """
+    prefetched = {}
+    for pool, instruction in zip(pools, instructions):
+        key = (id(pool), instruction)
+        if key not in prefetched:
+            prefetched[key] = _prefetch(pool, k, index, instruction)
+    return [prefetched[(id(pool), instruction)] for pool, instruction in zip(pools, instructions)]
+
+
+def select_topk_triples_batch(
+    model: torch.nn.Module,
+    pools: list[TripleStore],
+    k: int,
+    chunk_size: int | None = None,
+    num_workers: int = 0,
+    index: KGIndex | None = None,
+    instructions: list[str] | None = None,
+) -> list[tuple[list, list]]:
+    """Select the top ``k`` triples for a batch of candidate pools.
+
+    Distinct pools are concatenated and scored in a single forward pass (or
+    chunk by chunk with ``chunk_size``), then the top ``k`` is taken within
+    each pool. Pools shared between batch entries, e.g. the same curriculum
+    subset for several tasks, are only scored and ranked once.
+
+    Parameters
+    ----------
+    model:
+        ``TripleScoringModel`` or compatible module.
+    pools:
+        One ``TripleStore`` of candidates per batch entry.
+    k:
+        Number of triples to return per entry.
+    chunk_size, num_workers:
+        See :func:`score_topk`.
+    index, instructions:
+        Optional :class:`~kg_index.KGIndex` and one instruction per entry;
+        each pool is first narrowed to the candidates of its instruction
+        with :func:`prefetch_pools`.
+
+    Returns
+    -------
+    list[tuple[list, list]]
+        ``(top_triples, top_ids)`` for every entry of ``pools``.
+    """
+    if index is not None and instructions is not None:
+        pools = prefetch_pools(pools, k, index, instructions)
+    unique = {}
+    for pool in pools:
+        unique.setdefault(id(pool), pool)
+    distinct = [p for p in unique.values() if len(p)]
+
+    selected = {}
+    if chunk_size:
+        for pool in distinct:
+            selected[id(pool)] = score_topk(model, pool.ids, k, chunk_size=chunk_size, num_workers=num_workers)
+    elif distinct:
+        with torch.no_grad():
+            scores = _score(model, torch.cat([p.ids for p in distinct]))
+        for pool, pool_scores in zip(distinct, torch.split(scores, [len(p) for p in distinct])):
+            selected[id(pool)] = _stable_topk(pool_scores, k)
+
+    results = {}
+    for key, pool in unique.items():
+        if key not in selected:
+            results[key] = ([], [])
+        else:
+            rows = selected[key]
+            results[key] = (pool.decode(rows), pool.ids[rows].tolist())
+    return [results[id(pool)] for pool in pools]
@@ -0,0 +1,107 @@
+from typing import Iterable, Tuple
+
+import torch
+
+
+class RowSparseAdam(torch.optim.Optimizer):
+    """Adam that handles sparse embedding gradients row by row.
+
+    Dense gradients get the usual Adam update. For sparse gradients (from
+    ``nn.Embedding(sparse=True)``) only the rows present in the gradient are
+    updated ("lazy" Adam, with per-row bias correction), and moment state is
+    allocated only for rows that have ever received a gradient. Unlike
+    ``torch.optim.SparseAdam``, which keeps dense moment tensors, memory and
+    step time therefore grow with the number of rows touched, not with the
+    vocabulary size.
+    """
+
+    def __init__(
+        self,
+        params: Iterable,
+        lr: float = 1e-3,
+        betas: Tuple[float, float] = (0.9, 0.999),
+        eps: float = 1e-8,
+    ) -> None:
+        """Construct the optimizer.
+
+        Parameters
+        ----------
+        params:
+            Parameters or parameter groups, as for ``torch.optim.Adam``.
+        lr, betas, eps:
+            Adam hyperparameters.
+        """
+        super().__init__(params, dict(lr=lr, betas=betas, eps=eps))
+
+    @staticmethod
+    def _grow(state: dict, needed: int, width: int, like: torch.Tensor) -> None:
+        capacity = state["exp_avg"].shape[0] if "exp_avg" in state else 0
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, 2 * capacity, 16)
+        for key, cols in (("exp_avg", width), ("exp_avg_sq", width), ("row_steps", None)):
+            shape = (new_capacity, cols) if cols is not None else (new_capacity,)
+            grown = torch.zeros(shape, dtype=torch.float32 if cols is None else like.dtype, device=like.device)
+            if key in state:
+                grown[:capacity] = state[key]
+            state[key] = grown
+
+    @torch.no_grad()
+    def step(self, closure=None):
+        loss = None
+        if closure is not None:
+            with torch.enable_grad():
+                loss = closure()
+
+        for group in self.param_groups:
+            lr, (beta1, beta2), eps = group["lr"], group["betas"], group["eps"]
+            for p in group["params"]:
+                if p.grad is None:
+                    continue
+                state = self.state[p]
+                if p.grad.is_sparse:
+                    self._sparse_step(p, state, lr, beta1, beta2, eps)
+                else:
+                    self._dense_step(p, state, lr, beta1, beta2, eps)
+        return loss
+
+    @staticmethod
+    def _dense_step(p, state, lr, beta1, beta2, eps) -> None:
+        grad = p.grad
+        if not state:
+            state["step"] = torch.zeros((), dtype=torch.float32)
+            state["exp_avg"] = torch.zeros_like(p)
+            state["exp_avg_sq"] = torch.zeros_like(p)
+        state["step"] += 1
+        step = state["step"].item()
+        state["exp_avg"].mul_(beta1).add_(grad, alpha=1 - beta1)
+        state["exp_avg_sq"].mul_(beta2).addcmul_(grad, grad, value=1 - beta2)
+        denom = (state["exp_avg_sq"] / (1 - beta2 ** step)).sqrt_().add_(eps)
+        p.addcdiv_(state["exp_avg"], denom, value=-lr / (1 - beta1 ** step))
+
+    def _sparse_step(self, p, state, lr, beta1, beta2, eps) -> None:
+        grad = p.grad.coalesce()
+        rows = grad.indices()[0]
+        values = grad.values().reshape(len(rows), -1)
+        if not len(rows):
+            return
+
+        slots = state.setdefault("slots", {})  # row id -> index into the moment tensors
+        row_list = rows.tolist()
+        for row in row_list:
+            if row not in slots:
+                slots[row] = len(slots)
+        self._grow(state, len(slots), values.shape[1], p)
+        idx = torch.tensor([slots[row] for row in row_list], device=p.device)
+
+        exp_avg = state["exp_avg"][idx].mul_(beta1).add_(values, alpha=1 - beta1)
+        exp_avg_sq = state["exp_avg_sq"][idx].mul_(beta2).addcmul_(values, values, value=1 - beta2)
+        steps = state["row_steps"][idx] + 1
+        state["exp_avg"][idx] = exp_avg
+        state["exp_avg_sq"][idx] = exp_avg_sq
+        state["row_steps"][idx] = steps
+
+        bias1 = (1 - beta1 ** steps).unsqueeze(1)
+        bias2 = (1 - beta2 ** steps).unsqueeze(1)
+        update = (exp_avg / bias1) / ((exp_avg_sq / bias2).sqrt_().add_(eps))
+        p.view(p.shape[0], -1).index_add_(0, rows, update.to(p.dtype), alpha=-lr)
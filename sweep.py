@@ -0,0 +1,240 @@
+"""Grid and random hyperparameter sweeps over ``ppo_training_loop.train``.
+
+Runs execute in a process pool. They share one LLM response cache and one
+cross-process bound on in-flight LLM requests, and every finished run
+appends a row to a common results table::
+
+    python sweep.py sweep.yaml --workers 4 --max-llm-in-flight 8
+
+A sweep file looks like::
+
+    name: lr-entropy
+    base:                      # TrainConfig fields shared by all runs
+      episodes: 60
+      backend: retrieval
+    grid:                      # every combination
+      initial_lr: [0.01, 0.003]
+      entropy_coeff: [0.0, 0.01]
+    random:                    # optional; combined with every grid point
+      samples: 4
+      seed: 0
+      space:
+        top_k: [3, 5, 8]                  # choice
+        temperature: {uniform: [0.1, 1.0]}
+        ppo_clip: {log_uniform: [0.05, 0.3]}
+        ppo_epochs: {int: [2, 8]}
+"""
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+RESULTS_PATH = "sweep_results.csv"
+OUTPUT_DIR = "sweeps"
+RESULT_FIELDS = [
+    "sweep", "run", "status", "started", "seconds", "episodes",
+    "mean_reward", "final_reward", "best_reward", "overrides", "run_dir",
+]
+
+
+def grid_points(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """All combinations of the listed values, one dict per point."""
+    if not grid:
+        return [{}]
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def _draw(spec: Any, rng: random.Random) -> Any:
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    if isinstance(spec, dict) and len(spec) == 1:
+        (kind, (low, high)), = spec.items()
+        if kind == "uniform":
+            return rng.uniform(low, high)
+        if kind == "log_uniform":
+            return math.exp(rng.uniform(math.log(low), math.log(high)))
+        if kind == "int":
+            return rng.randint(low, high)
+    raise ValueError(f"Unsupported search space entry: {spec!r}")
+
+
+def random_points(space: Dict[str, Any], samples: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Draw ``samples`` points from ``space``.
+
+    Each entry is a list of choices or a one-key mapping ``uniform``,
+    ``log_uniform`` or ``int`` to ``[low, high]`` (inclusive for ``int``).
+    """
+    rng = random.Random(seed)
+    return [{name: _draw(spec, rng) for name, spec in space.items()} for _ in range(samples)]
+
+
+def expand_runs(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Config overrides of every run of a sweep file (grid × random draws)."""
+    points = grid_points(spec.get("grid") or {})
+    search = spec.get("random")
+    if search:
+        draws = random_points(search.get("space") or {}, search.get("samples", 1), search.get("seed"))
+        points = [{**point, **draw} for point in points for draw in draws]
+    return points
+
+
+class ResultsTable:
+    """CSV of finished runs that every sweep appends to.
+
+    The columns are fixed, so sweeps over different parameters share one
+    file; each run's overrides are stored as a JSON object.
+    """
+
+    def __init__(self, path: str = RESULTS_PATH) -> None:
+        self.path = Path(path)
+        new = not self.path.exists() or self.path.stat().st_size == 0
+        self._file = open(self.path, "a", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+        if new:
+            self._writer.writeheader()
+            self._file.flush()
+
+    def append(self, row: Dict[str, Any]) -> None:
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def run_one(base: Dict[str, Any], overrides: Dict[str, Any], run_dir: str,
+            llm_semaphore: Any = None, torch_threads: Optional[int] = None) -> Dict[str, float]:
+    """Train one configuration in this process; its outputs and log go to ``run_dir``.
+
+    Returns the summary of :func:`ppo_training_loop.train` plus the start time.
+    """
+    import torch
+    from ppo_training_loop import TrainConfig, train
+
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    config = TrainConfig.from_dict(base).replace(**overrides).in_directory(run_dir)
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, "config.yaml"), "w") as f:
+        yaml.safe_dump(config.to_dict(), f, sort_keys=False)
+    started = time.time()
+    with open(os.path.join(run_dir, "train.log"), "w") as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        summary = train(config, llm_semaphore=llm_semaphore)
+    return {**summary, "started": started}
+
+
+def run_sweep(
+    base: Dict[str, Any],
+    runs: List[Dict[str, Any]],
+    name: str,
+    workers: Optional[int] = None,
+    max_llm_in_flight: Optional[int] = None,
+    results_path: str = RESULTS_PATH,
+    output_dir: str = OUTPUT_DIR,
+) -> List[Dict[str, Any]]:
+    """Run every configuration in a process pool and append the results.
+
+    Parameters
+    ----------
+    base:
+        ``TrainConfig`` fields shared by all runs.
+    runs:
+        Per-run overrides of ``base``.
+    name:
+        Sweep name; runs write to ``<output_dir>/<name>/run-<i>``.
+    workers:
+        Concurrent runs (default: number of CPUs, at most ``len(runs)``).
+    max_llm_in_flight:
+        Bound on LLM requests in flight across all runs, ``None`` for only
+        the per-run ``max_in_flight``.
+    results_path:
+        CSV table receiving one row per finished run.
+
+    Returns
+    -------
+    list[dict]
+        The result rows, in completion order.
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(runs)))
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    # One response cache for all runs: the SQLite file is safe to share between processes
+    base = dict(base)
+    if base.get("llm_cache_path", "llm_cache.sqlite"):
+        base["llm_cache_path"] = os.path.abspath(base.get("llm_cache_path", "llm_cache.sqlite"))
+
+    sweep_dir = Path(output_dir) / name
+    table = ResultsTable(results_path)
+    rows = []
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        semaphore = manager.BoundedSemaphore(max_llm_in_flight) if max_llm_in_flight else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = {}
+            for i, overrides in enumerate(runs):
+                run_dir = str(sweep_dir / f"run-{i:03d}")
+                future = pool.submit(run_one, base, overrides, run_dir, semaphore, torch_threads)
+                futures[future] = (i, overrides, run_dir, time.time())
+            print(f"🚀 Sweep {name}: {len(runs)} run(s) on {workers} worker(s)")
+
+            for future in as_completed(futures):
+                i, overrides, run_dir, started = futures[future]
+                row = {"sweep": name, "run": i, "started": started, "overrides": json.dumps(overrides),
+                       "run_dir": run_dir}
+                try:
+                    row.update(future.result())
+                    row["status"] = "ok"
+                    print(f"✅ run {i} {overrides}: final reward {row.get('final_reward', float('nan')):.4f}")
+                except Exception as e:
+                    row["status"] = f"failed: {e}"
+                    print(f"[!] run {i} {overrides} failed: {e}")
+                table.append(row)
+                rows.append(row)
+    table.close()
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run a grid/random hyperparameter sweep of the PPO trainer.")
+    parser.add_argument("spec", help="Sweep YAML file (name, base, grid, random, workers, max_llm_in_flight).")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent runs (default: from the file or CPU count).")
+    parser.add_argument("--max-llm-in-flight", type=int, default=None,
+                        help="LLM requests in flight across all runs (default: from the file, else unbounded).")
+    parser.add_argument("--results", default=RESULTS_PATH, help="Results table the sweep appends to.")
+    parser.add_argument("--out-dir", default=OUTPUT_DIR, help="Folder for per-run outputs.")
+    parser.add_argument("--dry-run", action="store_true", help="Print the runs without starting them.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with open(args.spec) as f:
+        spec = yaml.safe_load(f) or {}
+    base = spec.get("base") or {}
+    if spec.get("base_config"):
+        with open(spec["base_config"]) as f:
+            base = {**(yaml.safe_load(f) or {}), **base}
+    runs = expand_runs(spec)
+    name = spec.get("name") or time.strftime("%Y%m%d-%H%M%S")
+
+    if args.dry_run:
+        for i, overrides in enumerate(runs):
+            print(f"run {i}: {overrides}")
+    else:
+        run_sweep(base, runs, name,
+                  workers=args.workers or spec.get("workers"),
+                  max_llm_in_flight=args.max_llm_in_flight or spec.get("max_llm_in_flight"),
+                  results_path=args.results, output_dir=args.out_dir)
+        print(f"📊 Results appended to {args.results}")
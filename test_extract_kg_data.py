@@ -0,0 +1,177 @@
+import json
+import sys
+
+import pytest
+
+import extract_kg_data
+from extract_kg_data import chunk_text, extract_markdown, list_source_files, load_structured_file, stream_files
+from async_rollout import AsyncRolloutRunner
+from fake_llm import FakeOpenAIClient
+
+
+def _fake_reply(prompt):
+    """Summaries echo the first word of the content; triple requests return one triple per chunk."""
+    content = prompt.split("\n\n", 1)[1]
+    if prompt.startswith("Extract"):
+        word = content.split()[0] if content.split() else "empty"
+        return json.dumps([{"subject": word, "predicate": "mentions", "object": "chunk"}])
+    return f"summary of {content.split()[0] if content.split() else 'nothing'}"
+
+
+def _write_sources(root, count=12):
+    root.mkdir(exist_ok=True)
+    for i in range(count):
+        triples = [{"subject": f"s{i}_{j}", "predicate": "p", "object": f"o{j}"} for j in range(20)]
+        (root / f"f{i:02d}.json").write_text(json.dumps(triples))
+    params = [{"Parameter_Name": "ecutwfc", "Namelist": "SYSTEM", "Type": "REAL", "Description": "cutoff"}]
+    (root / "params.json").write_text(json.dumps(params))
+    (root / "nodes.json").write_text(json.dumps([{"id": "d1", "title": "t", "summary": "s"}]))
+    (root / "dict.yaml").write_text("silicon:\n  - semiconductor\n")
+    (root / "notes.md").write_text("alpha beta\n" * 400)
+    (root / "short.md").write_text("gamma\n")
+
+
+def _records(files, **kwargs):
+    return [(f.name, kind, record)
+            for f, kind, record in stream_files(files, openai_client=FakeOpenAIClient(_fake_reply), **kwargs)]
+
+
+def test_chunks_cover_the_text_with_overlap():
+    content = "".join(f"line {i}\n" for i in range(1000))
+    chunks = chunk_text(content, size=500, overlap=50)
+    assert all(len(c) <= 500 for c in chunks)
+    assert all(c.endswith("\n") for c in chunks)
+    assert content.startswith(chunks[0]) and content.endswith(chunks[-1])
+    position = 0
+    for chunk in chunks:
+        start = content.find(chunk, max(0, position - 500))
+        assert start <= position  # no gap between neighbouring chunks
+        position = start + len(chunk)
+    assert position == len(content)
+    assert chunk_text("  \n") == []
+
+
+def test_markdown_triples_are_merged_per_file(tmp_path):
+    _write_sources(tmp_path)
+    files = [tmp_path / "notes.md", tmp_path / "short.md"]
+    client = FakeOpenAIClient(_fake_reply)
+    (node, triples), (short_node, short_triples) = extract_markdown(files, AsyncRolloutRunner(client),
+                                                                   chunk_size=500, overlap=50)
+    # Every chunk of notes.md starts with "alpha": one triple after merging, one reduce request
+    assert triples == [{"subject": "alpha", "predicate": "mentions", "object": "chunk",
+                        "source": "notes.md", "namelist": "markdown"}]
+    assert node == {"id": "notes.md", "title": "notes", "summary": "summary of summary"}
+    assert short_node["summary"] == "summary of gamma"
+    chunks = len(chunk_text((tmp_path / "notes.md").read_text(), 500, 50))
+    assert client.calls == 2 * chunks + 2 + 1
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_bounded_submission_matches_unbounded(tmp_path, workers):
+    _write_sources(tmp_path / "src", count=3 * 2 * workers + 1)  # more files than the submission window
+    files = list_source_files(tmp_path / "src", {"md", "json", "yaml"})
+    # Reference: every file extracted on its own, in order, with nothing spilled or bounded
+    md_files = [f for f in files if f.suffix == ".md"]
+    markdown = dict(zip(md_files, extract_markdown(md_files, AsyncRolloutRunner(FakeOpenAIClient(_fake_reply)))))
+    expected = []
+    for file in files:
+        if file in markdown:
+            node, triples = markdown[file]
+            expected += [(file.name, "document", node)] + [(file.name, "relationship", t) for t in triples]
+        else:
+            nodes, rels = load_structured_file(file)
+            expected += [(file.name, "document", n) for n in nodes]
+            expected += [(file.name, "relationship", r) for r in rels]
+
+    assert _records(files, workers=workers, spill_dir=str(tmp_path)) == expected
+    assert _records(files, workers=0) == expected
+    assert not list(tmp_path.glob("extract-*"))  # spill files removed
+
+
+def test_stream_stops_early_without_leaking_spill_files(tmp_path):
+    _write_sources(tmp_path / "src")
+    files = list_source_files(tmp_path / "src", {"json", "yaml"})
+    stream = stream_files(files, workers=2, spill_dir=str(tmp_path))
+    next(stream)
+    stream.close()
+    assert not list(tmp_path.glob("extract-*"))
+
+
+def _run_extractor(monkeypatch, src, out, *args):
+    """Run ``extract_kg_data.main`` offline into ``out``; returns its outputs and the LLM calls made."""
+    client = FakeOpenAIClient(_fake_reply)
+    monkeypatch.setattr(extract_kg_data, "client", client)
+    out.mkdir(exist_ok=True)
+    monkeypatch.setattr(sys, "argv", [
+        "extract_kg_data.py", "--source", str(src), "--no-cache", "--workers", "0",
+        "--out-docs", str(out / "document_nodes.json"), "--out-rels", str(out / "relationships.json"),
+        "--out-csv", str(out / "relationships.csv"), "--manifest", str(out / "kg_manifest.json"), *args,
+    ])
+    extract_kg_data.main()
+    outputs = {
+        "documents": sorted(map(json.dumps, json.loads((out / "document_nodes.json").read_text()))),
+        "relationships": sorted(map(json.dumps, json.loads((out / "relationships.json").read_text()))),
+        "csv": sorted((out / "relationships.csv").read_text().splitlines()),
+    }
+    return outputs, client.calls
+
+
+def _write_incremental_sources(src):
+    src.mkdir(exist_ok=True)
+    (src / "a.json").write_text(json.dumps([
+        {"subject": "A", "predicate": "p", "object": "B", "source": "manual"},
+        {"subject": "C", "predicate": "p", "object": "D"},
+    ]))
+    (src / "b.json").write_text(json.dumps([{"subject": "E", "predicate": "p", "object": "F"}]))
+    (src / "nodes.json").write_text(json.dumps([{"id": "d1", "title": "t", "summary": "s"}]))
+    (src / "notes.md").write_text("alpha beta\n")
+
+
+def _full_rebuild(monkeypatch, tmp_path, src):
+    return _run_extractor(monkeypatch, src, tmp_path / "full")[0]
+
+
+@pytest.mark.parametrize("edit", ["a.json", "notes.md"])
+def test_incremental_edit_matches_full_rebuild(monkeypatch, tmp_path, edit):
+    src = tmp_path / "src"
+    _write_incremental_sources(src)
+    _run_extractor(monkeypatch, src, tmp_path / "out")
+    if edit == "a.json":
+        # Drops the record with its own source, which must be retracted too
+        (src / "a.json").write_text(json.dumps([{"subject": "G", "predicate": "p", "object": "H"}]))
+    else:
+        (src / "notes.md").write_text("delta epsilon\n")
+
+    incremental, calls = _run_extractor(monkeypatch, src, tmp_path / "out", "--incremental")
+    assert incremental == _full_rebuild(monkeypatch, tmp_path, src)
+    assert calls == (2 if edit == "notes.md" else 0)  # only the edited markdown file is sent again
+
+
+def test_incremental_delete_matches_full_rebuild(monkeypatch, tmp_path):
+    src = tmp_path / "src"
+    _write_incremental_sources(src)
+    _run_extractor(monkeypatch, src, tmp_path / "out")
+    (src / "a.json").unlink()
+    (src / "notes.md").unlink()
+    incremental, _ = _run_extractor(monkeypatch, src, tmp_path / "out", "--incremental")
+    assert incremental == _full_rebuild(monkeypatch, tmp_path, src)
+
+
+def test_unchanged_files_are_not_extracted_again(monkeypatch, tmp_path):
+    src = tmp_path / "src"
+    _write_incremental_sources(src)
+    first, _ = _run_extractor(monkeypatch, src, tmp_path / "out")
+    (src / "notes.md").touch()  # new mtime, same content
+    again, calls = _run_extractor(monkeypatch, src, tmp_path / "out", "--incremental")
+    assert again == first
+    assert calls == 0
+
+
+def test_missing_manifest_falls_back_to_full_rebuild(monkeypatch, tmp_path):
+    src = tmp_path / "src"
+    _write_incremental_sources(src)
+    _run_extractor(monkeypatch, src, tmp_path / "out")
+    (tmp_path / "out" / "kg_manifest.json").unlink()
+    rebuilt, _ = _run_extractor(monkeypatch, src, tmp_path / "out", "--incremental")
+    assert rebuilt == _full_rebuild(monkeypatch, tmp_path, src)
+    assert len(rebuilt["documents"]) == 2  # not merged into the existing outputs a second time
@@ -0,0 +1,53 @@
+import pytest
+
+from llm_cache import ResponseCache
+
+MODEL = "gpt-4"
+PROMPT = "Write a pw.x input for silicon."
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "cache.sqlite"), samples_per_key=3)
+
+
+def test_get_many_misses_until_samples_per_key_are_stored(cache):
+    for stored in range(1, 4):
+        cache.put(MODEL, PROMPT, 0.7, f"sample {stored}")
+        hit = stored == 3
+        assert (cache.get(MODEL, PROMPT, 0.7) is not None) == hit
+        assert (cache.get_many(MODEL, PROMPT, 0.7, 1) is not None) == hit
+        assert (cache.get_many(MODEL, PROMPT, 0.7, 2) is not None) == hit
+
+
+def test_get_many_returns_distinct_stored_samples(cache):
+    stored = {f"sample {i}" for i in range(3)}
+    for response in stored:
+        cache.put(MODEL, PROMPT, 0.7, response)
+    samples = cache.get_many(MODEL, PROMPT, 0.7, 3)
+    assert sorted(samples) == sorted(stored)
+    assert set(cache.get_many(MODEL, PROMPT, 0.7, 2)) <= stored
+    assert cache.get(MODEL, PROMPT, 0.7) in stored
+
+
+def test_get_many_needs_n_samples_beyond_samples_per_key(cache):
+    for i in range(3):
+        cache.put(MODEL, PROMPT, 0.7, f"sample {i}")
+    assert cache.get_many(MODEL, PROMPT, 0.7, 4) is None
+
+
+def test_zero_temperature_keeps_one_response(cache):
+    assert cache.get(MODEL, PROMPT, 0.0) is None
+    assert cache.get_many(MODEL, PROMPT, 0.0, 1) is None
+    cache.put(MODEL, PROMPT, 0.0, "first")
+    cache.put(MODEL, PROMPT, 0.0, "second")
+    assert cache.get(MODEL, PROMPT, 0.0) == "second"
+    assert cache.get_many(MODEL, PROMPT, 0.0, 1) == ["second"]
+
+
+def test_hits_and_misses_are_counted(cache):
+    cache.get_many(MODEL, PROMPT, 0.7, 2)
+    for i in range(3):
+        cache.put(MODEL, PROMPT, 0.7, f"sample {i}")
+    cache.get_many(MODEL, PROMPT, 0.7, 2)
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,107 @@
+import pytest
+import torch
+import torch.nn as nn
+
+from policy_model import TripleScoringModel
+from sparse_optim import RowSparseAdam
+
+VOCAB_SIZE = 50
+PREDICATE_SIZE = 7
+
+
+def _ids(n: int = 200, seed: int = 0) -> torch.Tensor:
+    g = torch.Generator().manual_seed(seed)
+    return torch.stack([
+        torch.randint(0, VOCAB_SIZE, (n,), generator=g),
+        torch.randint(0, PREDICATE_SIZE, (n,), generator=g),
+        torch.randint(0, VOCAB_SIZE, (n,), generator=g),
+    ], dim=1)
+
+
+def _assert_matches_forward(model: TripleScoringModel, ids: torch.Tensor, atol: float = 1e-5) -> None:
+    with torch.no_grad():
+        torch.testing.assert_close(model.score(ids), model(ids), rtol=0, atol=atol)
+
+
+def _train_step(model: TripleScoringModel, optimizer: torch.optim.Optimizer, ids: torch.Tensor) -> None:
+    optimizer.zero_grad()
+    model(ids).sum().backward()
+    optimizer.step()
+
+
+def test_score_matches_forward():
+    torch.manual_seed(0)
+    model = TripleScoringModel(VOCAB_SIZE, PREDICATE_SIZE)
+    ids = _ids()
+    _assert_matches_forward(model, ids)
+    with torch.no_grad():
+        torch.testing.assert_close(model.score(ids[0]), model(ids[0]), rtol=0, atol=1e-5)
+
+
+@pytest.mark.parametrize("table_dtype,atol", [("float16", 1e-2), ("bfloat16", 5e-2), ("int8", 5e-2)])
+def test_compact_tables_close_to_forward(table_dtype, atol):
+    torch.manual_seed(0)
+    model = TripleScoringModel(VOCAB_SIZE, PREDICATE_SIZE, table_dtype=table_dtype)
+    _assert_matches_forward(model, _ids(), atol=atol)
+
+
+def test_tables_rebuilt_after_adam_step():
+    torch.manual_seed(0)
+    model = TripleScoringModel(VOCAB_SIZE, PREDICATE_SIZE)
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.1)
+    ids = _ids()
+    _assert_matches_forward(model, ids)
+    stale = model.score_tables()[0].clone()
+    _train_step(model, optimizer, ids[:16])
+    assert not torch.equal(model.score_tables()[0], stale)
+    _assert_matches_forward(model, ids)
+
+
+def test_tables_rebuilt_after_row_sparse_adam_step():
+    torch.manual_seed(0)
+    model = TripleScoringModel(VOCAB_SIZE, PREDICATE_SIZE, sparse=True)
+    optimizer = RowSparseAdam(model.parameters(), lr=0.1)
+    ids = _ids()
+    _assert_matches_forward(model, ids)
+    stale = model.score_tables()[0].clone()
+    _train_step(model, optimizer, ids[:16])
+    assert not torch.equal(model.score_tables()[0], stale)
+    _assert_matches_forward(model, ids)
+
+
+def test_tables_rebuilt_after_load_state_dict():
+    torch.manual_seed(0)
+    model = TripleScoringModel(VOCAB_SIZE, PREDICATE_SIZE)
+    other = TripleScoringModel(VOCAB_SIZE, PREDICATE_SIZE)
+    ids = _ids()
+    _assert_matches_forward(model, ids)
+    model.load_state_dict(other.state_dict())
+    with torch.no_grad():
+        torch.testing.assert_close(model.score(ids), other(ids), rtol=0, atol=1e-5)
+
+
+def test_non_linear_head_falls_back_to_forward():
+    torch.manual_seed(0)
+    model = TripleScoringModel(VOCAB_SIZE, PREDICATE_SIZE)
+    model.fc = nn.Sequential(nn.Linear(3 * 32, 8), nn.ReLU(), nn.Linear(8, 1))
+    assert not model._supports_tables()
+    ids = _ids()
+    with torch.no_grad():
+        torch.testing.assert_close(model.score(ids), model(ids), rtol=0, atol=0)
+
+
+def test_overridden_forward_falls_back_to_forward():
+    class Scaled(TripleScoringModel):
+        def forward(self, triple_ids):
+            return 2 * super().forward(triple_ids)
+
+    torch.manual_seed(0)
+    model = Scaled(VOCAB_SIZE, PREDICATE_SIZE)
+    ids = _ids()
+    with torch.no_grad():
+        torch.testing.assert_close(model.score(ids), model(ids), rtol=0, atol=0)
+
+
+def test_score_uses_forward_when_grad_enabled():
+    model = TripleScoringModel(VOCAB_SIZE, PREDICATE_SIZE)
+    assert model.score(_ids()).requires_grad
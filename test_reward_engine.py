@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import pytest
+
+from reward_engine import RewardEngine, normalize_value, parse_qe_input
+
+REFERENCE = (Path(__file__).parent / "pw.scf.si.in").read_text()
+
+
+def _namelist_facts(text):
+    return {fact for fact in parse_qe_input(text).facts if fact[0] in ("control", "system", "electrons")}
+
+
+@pytest.mark.parametrize("header", ["&CONTROL", "&control", "&  control", "&\tControl"])
+def test_namelist_header_whitespace(header):
+    facts = _namelist_facts(f"{header}\n  calculation = 'scf'\n/\n")
+    assert facts == {("control", "calculation", "scf")}
+
+
+def test_assignments_on_the_header_line():
+    facts = _namelist_facts("&  system ibrav=2, nat=2 /\n")
+    assert facts == {("system", "ibrav", 2.0), ("system", "nat", 2.0)}
+
+
+def test_header_name_is_not_reparsed_as_content():
+    # Slicing by the name length left "rol = 1" here and parsed it as an assignment
+    assert _namelist_facts("&    control = 1\n/\n") == set()
+
+
+def test_bare_ampersand_does_not_crash():
+    assert parse_qe_input("&\n/\n").facts == frozenset()
+
+
+def test_comments_are_stripped_outside_quotes():
+    facts = _namelist_facts(
+        "! leading comment\n"
+        "&CONTROL  ! trailing comment\n"
+        "  prefix = 'si!#1'  # comment\n"
+        "  verbosity = 'high' ! another\n"
+        "/\n"
+    )
+    assert facts == {("control", "prefix", "si!#1"), ("control", "verbosity", "high")}
+
+
+def test_values_are_normalized():
+    assert normalize_value("30") == normalize_value("30.0") == normalize_value("3.0d1") == 30.0
+    assert normalize_value(".TRUE.") is True and normalize_value(".f.") is False
+    assert normalize_value("'scf'") == normalize_value('"scf"') == "scf"
+
+
+def test_cards_and_numeric_rows():
+    parsed = parse_qe_input(REFERENCE)
+    assert ("card", "ATOMIC_POSITIONS", "alat") in parsed.facts
+    assert ("card", "K_POINTS", "automatic") in parsed.facts
+    assert ("ATOMIC_SPECIES", "Si", 28.086, "Si.pbe-n-rrkjus_psl.1.0.0.UPF") in parsed.facts
+    assert parsed.blocks["ATOMIC_POSITIONS"].shape == (2, 7)
+    assert parsed.blocks["K_POINTS"].shape == (1, 6)
+    assert parsed.num_rows == 3
+
+
+def test_card_option_defaults():
+    parsed = parse_qe_input("ATOMIC_POSITIONS\n  Si 0 0 0\n")
+    assert ("card", "ATOMIC_POSITIONS", "alat") in parsed.facts
+
+
+def test_missing_slash_before_cards():
+    with_slash = parse_qe_input("&SYSTEM\n  nat = 2\n/\nK_POINTS (automatic)\n  6 6 6 0 0 0\n")
+    without = parse_qe_input("&SYSTEM\n  nat = 2\nK_POINTS (automatic)\n  6 6 6 0 0 0\n")
+    assert without.facts == with_slash.facts
+    assert (without.blocks["K_POINTS"] == with_slash.blocks["K_POINTS"]).all()
+
+
+def test_reference_scores_one_and_empty_scores_zero():
+    engine = RewardEngine({"si": REFERENCE})
+    assert engine.score(REFERENCE, "si") == pytest.approx(1.0)
+    assert engine.score("", "si") == 0.0
+    assert engine.score("   \n", "si") == 0.0
+
+
+def test_formatting_does_not_change_the_score():
+    reformatted = (
+        REFERENCE.replace("&CONTROL", "&  control")
+        .replace("ecutwfc = 30", "ecutwfc = 3.0d1  ! Ry")
+        .replace("0.25 0.25 0.25", "0.250 0.25 2.5e-1")
+    )
+    assert RewardEngine({"si": REFERENCE}).score(reformatted, "si") == pytest.approx(1.0)
+
+
+def test_partial_candidate_scores_between_zero_and_one():
+    engine = RewardEngine({"si": REFERENCE})
+    partial = REFERENCE.replace("mixing_beta = 0.6", "mixing_beta = 0.7").replace("  Si 0.25 0.25 0.25\n", "")
+    score = engine.score(partial, "si")
+    assert 0.0 < score < 1.0
+    assert engine.score_batch([REFERENCE, partial, ""], REFERENCE).tolist() == pytest.approx([1.0, score, 0.0])
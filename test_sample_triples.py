@@ -0,0 +1,43 @@
+import pytest
+import torch
+
+from sample_triples import score_topk, select_topk_triples_batch
+from triple_store import TripleStore
+
+
+class _SubjectScore(torch.nn.Module):
+    """Scores a triple by its subject ID alone, so triples sharing a subject tie."""
+
+    def forward(self, triple_ids: torch.Tensor) -> torch.Tensor:
+        return (triple_ids[:, 0] % 5).float()
+
+
+def _tied_ids(n: int = 1000) -> torch.Tensor:
+    g = torch.Generator().manual_seed(0)
+    return torch.randint(0, 20, (n, 3), generator=g)
+
+
+def _expected(ids: torch.Tensor, k: int) -> torch.Tensor:
+    scores = (ids[:, 0] % 5).float()
+    return torch.sort(scores, descending=True, stable=True).indices[:k]
+
+
+@pytest.mark.parametrize("k", [1, 7, 300, 5000])
+@pytest.mark.parametrize("chunk_size,num_workers", [(None, 0), (64, 0), (97, 4), (1000, 0)])
+def test_score_topk_breaks_ties_toward_earlier_rows(k, chunk_size, num_workers):
+    ids = _tied_ids()
+    rows = score_topk(_SubjectScore(), ids, k, chunk_size=chunk_size, num_workers=num_workers)
+    assert torch.equal(rows, _expected(ids, k))
+
+
+def test_batch_selection_matches_single_pass():
+    triples = [
+        {"subject": f"s{i % 7}", "predicate": "p", "object": f"o{i}", "source": f"f{i % 3}"}
+        for i in range(200)
+    ]
+    store = TripleStore.from_triples(triples)
+    model = _SubjectScore()
+    single = [store.ids[score_topk(model, store.ids, 9)].tolist()]
+    for chunk_size in (None, 16):
+        batch = select_topk_triples_batch(model, [store], 9, chunk_size=chunk_size)
+        assert [ids for _, ids in batch] == single
@@ -0,0 +1,57 @@
+import io
+import json
+
+import pytest
+
+from triple_stream import HashDeduplicator, _iter_json_array, iter_records, open_record_writer
+
+ITEMS = [
+    {"subject": "ecutwfc", "predicate": "belongs_to", "object": "SYSTEM", "source": "a.json"},
+    123456,
+    -1.5e-7,
+    2.25,
+    True,
+    None,
+    "a]b,\"c",
+    {"nested": [1, {"x": "}"}], "text": "é" * 40},
+    [],
+]
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_json_array_items_match_json_load(indent, chunk_size):
+    text = json.dumps(ITEMS, indent=indent) + "\n"
+    assert list(_iter_json_array(io.StringIO(text), chunk_size)) == json.loads(text)
+
+
+@pytest.mark.parametrize("text", ["[]", " [ ] ", "[\n]"])
+def test_empty_json_array(text):
+    assert list(_iter_json_array(io.StringIO(text), 1)) == []
+
+
+@pytest.mark.parametrize("text", ["", "{}", "[1,", "[1 2]", "[1,]", "[1.x]", "[1", '["a'])
+@pytest.mark.parametrize("chunk_size", [1, 4, 100])
+def test_malformed_json_array_raises(text, chunk_size):
+    with pytest.raises(ValueError):
+        list(_iter_json_array(io.StringIO(text), chunk_size))
+
+
+@pytest.mark.parametrize("suffix", [".json", ".jsonl"])
+def test_written_records_read_back(tmp_path, suffix):
+    records = [r for r in ITEMS if isinstance(r, dict)]
+    path = tmp_path / f"rels{suffix}"
+    with open_record_writer(path) as writer:
+        for record in records:
+            writer.write(record)
+    assert list(iter_records(path)) == records
+    if suffix == ".json":
+        assert path.read_text() == json.dumps(records, indent=2)
+
+
+def test_deduplicator_spills_and_keeps_first_occurrences(tmp_path):
+    records = [{"subject": f"s{i % 300}", "predicate": "p", "object": "o"} for i in range(1000)]
+    with HashDeduplicator(memory_limit=16 * 64, spill_dir=str(tmp_path), batch_size=50) as dedup:
+        unique = list(dedup.filter(records))
+        assert dedup.spills > 0
+    assert unique == records[:300]
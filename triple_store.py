@@ -0,0 +1,385 @@
+import json
+import os
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import torch
+
+from triple_stream import iter_records
+
+FORMAT_VERSION = 1
+
+
+def _sorted_vocab(values: Iterable[Any]) -> List[Any]:
+    """Sort vocabulary entries, falling back to a type-aware order for mixed types."""
+    values = set(values)
+    try:
+        return sorted(values)
+    except TypeError:
+        return sorted(values, key=lambda v: (type(v).__name__, str(v)))
+
+
+class StringTable(Sequence):
+    """Read-only table of JSON values stored as one byte buffer plus offsets.
+
+    Entry ``i`` is the JSON encoding of the value in
+    ``data[offsets[i]:offsets[i + 1]]``, so strings, numbers and booleans
+    keep their type. Both arrays can be memory-mapped; entries are decoded
+    on access.
+    """
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray) -> None:
+        self.offsets = offsets
+        self.data = data
+
+    @staticmethod
+    def encode(values: Sequence[Any]) -> tuple:
+        """Return the ``(offsets, data)`` arrays for ``values``."""
+        encoded = [json.dumps(v, ensure_ascii=False).encode() for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return json.loads(self.data[self.offsets[index]:self.offsets[index + 1]].tobytes())
+
+
+def _save_array(path: Path, array: np.ndarray) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def _load_array(path: Path, mmap: bool) -> np.ndarray:
+    # Copy-on-write mapping: pages are shared through the OS page cache across
+    # processes and the arrays are writable, so torch.from_numpy can wrap them.
+    return np.load(path, mmap_mode="c" if mmap else None)
+
+
+class TripleStore:
+    """Knowledge graph encoded once into contiguous integer columns.
+
+    Triples are stored sorted by predicate in an ``int32`` tensor ``ids`` of
+    shape ``(num_triples, 3)`` holding subject, predicate and object IDs,
+    alongside ``source`` and ``namelist`` ID columns. Because rows are grouped
+    by predicate, :meth:`subset` for one predicate (e.g. the ``'contains'``
+    curriculum) is a zero-copy slice of the parent store.
+
+    The string tables ``entities``, ``predicates``, ``sources`` and
+    ``namelists`` map IDs back to values, so selected rows can be decoded into
+    triple dictionaries without keeping the original list around.
+
+    :meth:`save` writes the store as a columnar directory (``.npy`` ID
+    columns, a dictionary-encoded entity table and ``vocab.json``) that
+    :meth:`load` memory-maps without parsing any triples.
+    """
+
+    def __init__(
+        self,
+        ids: torch.Tensor,
+        source_ids: torch.Tensor,
+        namelist_ids: torch.Tensor,
+        entities: Sequence[Any],
+        predicates: Sequence[str],
+        sources: Sequence[Optional[str]],
+        namelists: Sequence[Optional[str]],
+        predicate_slices: Optional[Dict[str, slice]] = None,
+    ) -> None:
+        """Wrap already encoded columns; see :meth:`from_triples` to build one.
+
+        Parameters
+        ----------
+        ids:
+            Integer tensor of shape ``(num_triples, 3)``.
+        source_ids, namelist_ids:
+            Integer tensors of shape ``(num_triples,)``.
+        entities, predicates, sources, namelists:
+            Tables mapping IDs to values.
+        predicate_slices:
+            Row range of each predicate. Computed from ``ids`` if omitted, in
+            which case rows must already be sorted by predicate ID.
+        """
+        self.ids = ids
+        self.source_ids = source_ids
+        self.namelist_ids = namelist_ids
+        self.entities = entities
+        self.predicates = predicates
+        self.sources = sources
+        self.namelists = namelists
+        if predicate_slices is None:
+            predicate_slices = {}
+            counts = torch.bincount(ids[:, 1].long(), minlength=len(predicates)).tolist() if len(ids) else []
+            start = 0
+            for pid, count in enumerate(counts):
+                if count:
+                    predicate_slices[predicates[pid]] = slice(start, start + count)
+                start += count
+        self.predicate_slices = predicate_slices
+        self._entity2id = None
+        self._predicate2id = None
+
+    @classmethod
+    def from_triples(
+        cls,
+        triples: Iterable[Dict[str, Any]],
+        entity2id: Optional[Dict[Any, int]] = None,
+        predicate2id: Optional[Dict[str, int]] = None,
+    ) -> "TripleStore":
+        """Encode triple dictionaries in a single pass.
+
+        Parameters
+        ----------
+        triples:
+            Iterable of dictionaries with ``subject``, ``predicate`` and
+            ``object`` keys and optional ``source`` and ``namelist`` keys.
+            It is consumed once, so a generator streaming a large file keeps
+            only the vocabularies and 20 bytes per triple in memory.
+        entity2id, predicate2id:
+            Existing vocabularies. Built from ``triples`` (sorted, as in the
+            training loop) if omitted; triples with unknown entities or
+            predicates are skipped when a vocabulary is given.
+
+        Returns
+        -------
+        TripleStore
+            Store with rows sorted by predicate ID.
+        """
+        # Values get first-seen IDs while streaming, remapped to sorted vocabularies at the end
+        build_entities = entity2id is None
+        build_predicates = predicate2id is None
+        entity_ids = {} if build_entities else entity2id
+        predicate_ids = {} if build_predicates else predicate2id
+        source_ids, namelist_ids = {}, {}
+        rows = array("i")
+        for t in triples:
+            if build_entities:
+                s = entity_ids.setdefault(t['subject'], len(entity_ids))
+                o = entity_ids.setdefault(t['object'], len(entity_ids))
+            else:
+                s, o = entity_ids.get(t['subject']), entity_ids.get(t['object'])
+            if build_predicates:
+                p = predicate_ids.setdefault(t['predicate'], len(predicate_ids))
+            else:
+                p = predicate_ids.get(t['predicate'])
+            src = source_ids.setdefault(t.get('source'), len(source_ids))
+            nl = namelist_ids.setdefault(t.get('namelist'), len(namelist_ids))
+            if s is None or p is None or o is None:
+                continue
+            rows.extend((s, p, o, src, nl))
+        table = np.frombuffer(rows, dtype=np.int32).reshape(-1, 5)
+
+        if build_entities:
+            entities = _sorted_vocab(entity_ids)
+            entity2id = {e: i for i, e in enumerate(entities)}
+            remap = np.array([entity2id[e] for e in entity_ids], dtype=np.int32)
+            table[:, 0] = remap[table[:, 0]]
+            table[:, 2] = remap[table[:, 2]]
+        else:
+            entities = [None] * len(entity2id)
+            for e, i in entity2id.items():
+                entities[i] = e
+        if build_predicates:
+            predicates = _sorted_vocab(predicate_ids)
+            predicate2id = {p: i for i, p in enumerate(predicates)}
+            table[:, 1] = np.array([predicate2id[p] for p in predicate_ids], dtype=np.int32)[table[:, 1]]
+        else:
+            predicates = [None] * len(predicate2id)
+            for p, i in predicate2id.items():
+                predicates[i] = p
+
+        # Sources and namelists are sorted with None (missing) last
+        sources = _sorted_vocab(v for v in source_ids if v is not None) + [None]
+        namelists = _sorted_vocab(v for v in namelist_ids if v is not None) + [None]
+        source2id = {v: i for i, v in enumerate(sources)}
+        namelist2id = {v: i for i, v in enumerate(namelists)}
+        table[:, 3] = np.array([source2id[v] for v in source_ids], dtype=np.int32)[table[:, 3]]
+        table[:, 4] = np.array([namelist2id[v] for v in namelist_ids], dtype=np.int32)[table[:, 4]]
+
+        table = torch.from_numpy(table[np.argsort(table[:, 1], kind="stable")])
+        store = cls(
+            ids=table[:, :3].contiguous(),
+            source_ids=table[:, 3].contiguous(),
+            namelist_ids=table[:, 4].contiguous(),
+            entities=entities,
+            predicates=predicates,
+            sources=sources,
+            namelists=namelists,
+        )
+        store._entity2id = entity2id
+        store._predicate2id = predicate2id
+        return store
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """Write the store as a columnar directory readable by :meth:`load`.
+
+        Layout: ``ids.npy`` (``int32``, shape ``(num_triples, 3)``, rows
+        sorted by predicate), ``source_ids.npy``, ``namelist_ids.npy``,
+        ``entity_offsets.npy`` and ``entity_data.npy`` (see
+        :class:`StringTable`), and ``vocab.json`` with the predicate, source
+        and namelist tables and the row range of every predicate.
+        ``vocab.json`` is written last, so a directory with a current
+        ``vocab.json`` is complete.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        _save_array(directory / "ids.npy", self.ids.to(torch.int32).contiguous().numpy())
+        _save_array(directory / "source_ids.npy", self.source_ids.to(torch.int32).contiguous().numpy())
+        _save_array(directory / "namelist_ids.npy", self.namelist_ids.to(torch.int32).contiguous().numpy())
+        offsets, data = StringTable.encode(self.entities)
+        _save_array(directory / "entity_offsets.npy", offsets)
+        _save_array(directory / "entity_data.npy", data)
+
+        vocab = {
+            "format_version": FORMAT_VERSION,
+            "num_triples": len(self),
+            "num_entities": len(self.entities),
+            "predicates": list(self.predicates),
+            "sources": list(self.sources),
+            "namelists": list(self.namelists),
+            "predicate_slices": {p: [r.start, r.stop] for p, r in self.predicate_slices.items()},
+        }
+        tmp = directory / "vocab.json.tmp"
+        tmp.write_text(json.dumps(vocab, ensure_ascii=False))
+        os.replace(tmp, directory / "vocab.json")
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> "TripleStore":
+        """Open a directory written by :meth:`save`.
+
+        Parameters
+        ----------
+        directory:
+            Columnar KG directory.
+        mmap:
+            Memory-map the columns instead of reading them into memory. The
+            tensors then share pages with every other process mapping the
+            same files.
+
+        Returns
+        -------
+        TripleStore
+            Store whose tensors wrap the mapped arrays without copying.
+        """
+        directory = Path(directory)
+        vocab = json.loads((directory / "vocab.json").read_text())
+        if vocab.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported KG format version in {directory}: {vocab.get('format_version')}")
+        entities = StringTable(_load_array(directory / "entity_offsets.npy", mmap),
+                               _load_array(directory / "entity_data.npy", mmap))
+        return cls(
+            ids=torch.from_numpy(_load_array(directory / "ids.npy", mmap)),
+            source_ids=torch.from_numpy(_load_array(directory / "source_ids.npy", mmap)),
+            namelist_ids=torch.from_numpy(_load_array(directory / "namelist_ids.npy", mmap)),
+            entities=entities,
+            predicates=vocab["predicates"],
+            sources=vocab["sources"],
+            namelists=vocab["namelists"],
+            predicate_slices={p: slice(a, b) for p, (a, b) in vocab["predicate_slices"].items()},
+        )
+
+    @property
+    def entity2id(self) -> Dict[Any, int]:
+        """Mapping from entity values to IDs."""
+        if self._entity2id is None:
+            self._entity2id = {e: i for i, e in enumerate(self.entities)}
+        return self._entity2id
+
+    @property
+    def predicate2id(self) -> Dict[str, int]:
+        """Mapping from predicate strings to IDs."""
+        if self._predicate2id is None:
+            self._predicate2id = {p: i for i, p in enumerate(self.predicates)}
+        return self._predicate2id
+
+    def __len__(self) -> int:
+        return self.ids.shape[0]
+
+    def _view(self, rows) -> "TripleStore":
+        slices = None  # gathered rows stay sorted by predicate, so slices can be recomputed
+        if isinstance(rows, slice):
+            slices = {
+                p: slice(max(r.start, rows.start) - rows.start, min(r.stop, rows.stop) - rows.start)
+                for p, r in self.predicate_slices.items()
+                if r.start < rows.stop and r.stop > rows.start
+            }
+        view = TripleStore(
+            ids=self.ids[rows],
+            source_ids=self.source_ids[rows],
+            namelist_ids=self.namelist_ids[rows],
+            entities=self.entities,
+            predicates=self.predicates,
+            sources=self.sources,
+            namelists=self.namelists,
+            predicate_slices=slices,
+        )
+        view._entity2id = self._entity2id
+        view._predicate2id = self._predicate2id
+        return view
+
+    def subset(self, *predicates: str) -> "TripleStore":
+        """Return the triples whose predicate is one of ``predicates``.
+
+        A single predicate (or several with adjacent row ranges) yields a
+        zero-copy view sharing memory with this store; otherwise the rows are
+        gathered into a new store.
+        """
+        ranges = sorted(
+            (self.predicate_slices[p] for p in set(predicates) if p in self.predicate_slices),
+            key=lambda s: s.start,
+        )
+        if not ranges:
+            return self._view(slice(0, 0))
+        if all(a.stop == b.start for a, b in zip(ranges, ranges[1:])):
+            return self._view(slice(ranges[0].start, ranges[-1].stop))
+        return self._view(torch.cat([torch.arange(r.start, r.stop) for r in ranges]))
+
+    def take(self, rows: Sequence[int]) -> "TripleStore":
+        """Gather ``rows`` into a new store; rows must be ascending to keep predicate order."""
+        return self._view(torch.as_tensor(rows, dtype=torch.long))
+
+    def decode(self, rows: Sequence[int]) -> List[Dict[str, Any]]:
+        """Turn row numbers back into triple dictionaries."""
+        rows = torch.as_tensor(rows, dtype=torch.long)
+        triples = []
+        for (s, p, o), src, nl in zip(self.ids[rows].tolist(), self.source_ids[rows].tolist(),
+                                      self.namelist_ids[rows].tolist()):
+            triple = {
+                "subject": self.entities[s],
+                "predicate": self.predicates[p],
+                "object": self.entities[o],
+            }
+            if self.sources[src] is not None:
+                triple["source"] = self.sources[src]
+            if self.namelists[nl] is not None:
+                triple["namelist"] = self.namelists[nl]
+            triples.append(triple)
+        return triples
+
+
+def load_triple_store(path: Union[str, Path], mmap: bool = True) -> TripleStore:
+    """Open a KG from a columnar directory, a ``relationships.json`` array or a ``.jsonl`` file."""
+    path = Path(path)
+    if path.is_dir():
+        return TripleStore.load(path, mmap=mmap)
+    return TripleStore.from_triples(iter_records(path))
+
+
+if __name__ == "__main__":
+    # python triple_store.py relationships.json relationships.kg
+    if len(sys.argv) != 3:
+        print("Usage: python triple_store.py <relationships.json> <output_dir>")
+        sys.exit(1)
+    store = load_triple_store(sys.argv[1])
+    store.save(sys.argv[2])
+    print(f"✅ Saved {len(store)} triples ({len(store.entities)} entities) to {sys.argv[2]}")
@@ -0,0 +1,337 @@
+import abc
+import csv
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+RELATIONSHIP_FIELDS = ["subject", "predicate", "object", "source", "namelist"]
+DEDUP_MEMORY_BYTES = 256 << 20  # in-memory hashes before spilling (16 bytes each)
+READ_CHUNK_CHARS = 1 << 20  # characters read at a time when streaming a JSON array
+
+# Built once: json.dumps with options constructs a new encoder on every call
+_CANONICAL = json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+# One key per line, as json.dump(records, f, indent=2) lays out a flat record
+_FLAT_ITEM = json.JSONEncoder(separators=(",\n    ", ": "))
+_SCAN = json.JSONDecoder().scan_once
+_WHITESPACE = re.compile(r"[ \t\r\n]*")
+_SEPARATOR = re.compile(r"[ \t\r\n]*([,\]])[ \t\r\n]*")
+
+
+def record_hash(record: Dict[str, Any]) -> bytes:
+    """128-bit BLAKE2b digest of a record's canonical JSON (sorted keys)."""
+    return hashlib.blake2b(_CANONICAL.encode(record).encode(), digest_size=16).digest()
+
+
+class _HashRun:
+    """Sorted 128-bit hashes as two ``uint64`` columns, in memory or memory-mapped."""
+
+    def __init__(self, hi: np.ndarray, lo: np.ndarray) -> None:
+        self.hi = hi
+        self.lo = lo
+
+    @classmethod
+    def merge(cls, runs: Sequence["_HashRun"]) -> "_HashRun":
+        hi = np.concatenate([r.hi for r in runs])
+        lo = np.concatenate([r.lo for r in runs])
+        order = np.lexsort((lo, hi))
+        return cls(hi[order], lo[order])
+
+    def __len__(self) -> int:
+        return len(self.hi)
+
+    def contains(self, hi: np.ndarray, lo: np.ndarray) -> np.ndarray:
+        left = np.searchsorted(self.hi, hi, "left")
+        right = np.searchsorted(self.hi, hi, "right")
+        found = np.zeros(len(hi), dtype=bool)
+        single = right - left == 1
+        found[single] = self.lo[left[single]] == lo[single]
+        for i in np.flatnonzero(right - left > 1):  # shared upper 64 bits, practically never
+            found[i] = lo[i] in self.lo[left[i]:right[i]]
+        return found
+
+
+class HashDeduplicator:
+    """Streaming exact-duplicate filter keyed on 128-bit record hashes.
+
+    Only the 16-byte digest of each distinct record is kept, not the record
+    or its JSON key. Hashes live in sorted runs that are merged like a binary
+    counter, so there are O(log n) runs to search. Records are hashed and
+    looked up in batches with vectorized ``searchsorted`` calls.
+
+    Once the in-memory hashes exceed ``memory_limit`` bytes, they are merged
+    into one run and spilled to a ``.npy`` file in ``spill_dir`` that is
+    memory-mapped read-only. Resident memory then stays at the cap plus
+    whatever pages of the spilled runs the OS keeps cached. Spill files are
+    removed by :meth:`close`.
+    """
+
+    def __init__(self, memory_limit: int = DEDUP_MEMORY_BYTES, spill_dir: Optional[str] = None,
+                 batch_size: int = 4096) -> None:
+        """Construct the filter.
+
+        Parameters
+        ----------
+        memory_limit:
+            Bytes of hashes kept in memory before spilling to disk.
+        spill_dir:
+            Parent folder of the temporary spill directory (default: the
+            system temporary folder).
+        batch_size:
+            Records hashed and looked up together.
+        """
+        self.memory_limit = max(16, memory_limit)
+        self.spill_dir = spill_dir
+        self.batch_size = max(1, batch_size)
+        self.seen = 0
+        self.unique = 0
+        self.spills = 0
+        self._memory: List[_HashRun] = []
+        self._spilled: List[_HashRun] = []
+        self._tmp: Optional[str] = None
+
+    def __len__(self) -> int:
+        """Number of distinct records seen."""
+        return self.unique
+
+    def filter(self, records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yield the first occurrence of every distinct record, in input order."""
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                yield from self._filter_batch(batch)
+                batch = []
+        if batch:
+            yield from self._filter_batch(batch)
+
+    def _filter_batch(self, batch: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        keys = np.frombuffer(b"".join(record_hash(r) for r in batch), dtype=np.uint64).reshape(-1, 2)
+        hi, lo = keys[:, 0].copy(), keys[:, 1].copy()
+
+        # First occurrence within the batch
+        order = np.lexsort((np.arange(len(batch)), lo, hi))
+        first = np.ones(len(batch), dtype=bool)
+        first[1:] = (hi[order][1:] != hi[order][:-1]) | (lo[order][1:] != lo[order][:-1])
+        new = np.zeros(len(batch), dtype=bool)
+        new[order[first]] = True
+
+        for run in self._memory + self._spilled:
+            candidates = np.flatnonzero(new)
+            if not len(candidates):
+                break
+            new[candidates[run.contains(hi[candidates], lo[candidates])]] = False
+
+        self._add(hi[new], lo[new])
+        self.seen += len(batch)
+        self.unique += int(new.sum())
+        for record, keep in zip(batch, new.tolist()):
+            if keep:
+                yield record
+
+    def _add(self, hi: np.ndarray, lo: np.ndarray) -> None:
+        if not len(hi):
+            return
+        order = np.lexsort((lo, hi))
+        self._memory.append(_HashRun(hi[order], lo[order]))
+        while len(self._memory) > 1 and len(self._memory[-2]) <= 2 * len(self._memory[-1]):
+            self._memory[-2:] = [_HashRun.merge(self._memory[-2:])]
+        if 16 * sum(len(r) for r in self._memory) > self.memory_limit:
+            self._spill()
+
+    def _spill(self) -> None:
+        run = _HashRun.merge(self._memory) if len(self._memory) > 1 else self._memory[0]
+        if self._tmp is None:
+            self._tmp = tempfile.mkdtemp(prefix="dedup-", dir=self.spill_dir)
+        path = os.path.join(self._tmp, f"run-{len(self._spilled):05d}.npy")
+        np.save(path, np.stack([run.hi, run.lo]))
+        mapped = np.load(path, mmap_mode="r")
+        self._spilled.append(_HashRun(mapped[0], mapped[1]))
+        self._memory = []
+        self.spills += 1
+
+    def close(self) -> None:
+        """Drop all hashes and delete the spill files."""
+        self._memory, self._spilled = [], []
+        if self._tmp is not None:
+            shutil.rmtree(self._tmp, ignore_errors=True)
+            self._tmp = None
+
+    def __enter__(self) -> "HashDeduplicator":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class RecordWriter(abc.ABC):
+    """Write records to ``path`` one at a time, atomically.
+
+    Records go to ``<path>.tmp``, which replaces ``path`` on :meth:`close`.
+    Leaving the ``with`` block on an exception discards it, so the previous
+    output stays intact. Subclasses implement :meth:`_write`, and
+    :meth:`_finish` for a closing trailer.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self._tmp = self.path.with_name(self.path.name + ".tmp")
+        self._file = open(self._tmp, "w", newline="")
+        self.count = 0
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._write(record)
+        self.count += 1
+
+    @abc.abstractmethod
+    def _write(self, record: Dict[str, Any]) -> None:
+        """Write one record to ``self._file``."""
+
+    def _finish(self) -> None:
+        pass
+
+    def close(self) -> None:
+        """Finish the file and move it into place."""
+        if self._file.closed:
+            return
+        self._finish()
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        """Discard everything written."""
+        if not self._file.closed:
+            self._file.close()
+        self._tmp.unlink(missing_ok=True)
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JsonlWriter(RecordWriter):
+    """One JSON object per line."""
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record) + "\n")
+
+
+class JsonArrayWriter(RecordWriter):
+    """A JSON array, formatted as ``json.dump(records, f, indent=2)`` would."""
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        if record and not any(isinstance(v, (dict, list, tuple)) for v in record.values()):
+            # Flat records (every triple) skip the pure-Python indenting encoder
+            item = "{\n    " + _FLAT_ITEM.encode(record)[1:-1] + "\n  }"
+        else:
+            item = json.dumps(record, indent=2).replace("\n", "\n  ")
+        self._file.write(("[\n  " if not self.count else ",\n  ") + item)
+
+    def _finish(self) -> None:
+        self._file.write("\n]" if self.count else "[]")
+
+
+class CsvWriter(RecordWriter):
+    """CSV with a fixed header; keys outside ``fieldnames`` are dropped."""
+
+    def __init__(self, path: Union[str, Path], fieldnames: Sequence[str] = RELATIONSHIP_FIELDS) -> None:
+        super().__init__(path)
+        self._writer = csv.DictWriter(self._file, fieldnames=list(fieldnames), extrasaction="ignore")
+        self._writer.writeheader()
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._writer.writerow(record)
+
+
+def open_record_writer(path: Union[str, Path]) -> RecordWriter:
+    """Writer for ``path`` chosen by its suffix: ``.jsonl``, ``.csv`` or a JSON array."""
+    suffix = Path(path).suffix
+    if suffix == ".jsonl":
+        return JsonlWriter(path)
+    if suffix == ".csv":
+        return CsvWriter(path)
+    return JsonArrayWriter(path)
+
+
+def _iter_json_array(f: Any, chunk_size: int = READ_CHUNK_CHARS) -> Iterator[Any]:
+    """Items of the JSON array in text file ``f``, decoded one at a time.
+
+    Only the current item and one read chunk are held in memory. Each item
+    goes through the C decoder (``raw_decode``); an item cut by the chunk
+    boundary is decoded again once the next chunk is appended.
+    """
+    buf, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf, pos = buf[pos:] + chunk, 0
+        return True
+
+    def peek() -> str:
+        nonlocal pos
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                raise ValueError("Unexpected end of JSON array")
+
+    if peek() != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    if peek() == "]":
+        return
+    while True:
+        try:
+            item, end = _SCAN(buf, pos)  # C scanner behind JSONDecoder.raw_decode
+        except (StopIteration, json.JSONDecodeError):
+            if not fill():
+                raise json.JSONDecodeError("Invalid or truncated item", buf, pos) from None
+            continue
+        # A number cut by the chunk boundary ("12" of "123", "1" of "1.5")
+        # decodes without error; read on and decode it again
+        cut = end == len(buf) or (buf[end] in ".eE" and isinstance(item, (int, float)))
+        if cut and not eof and fill():
+            continue
+        yield item
+
+        separator = _SEPARATOR.match(buf, end)
+        if separator is not None and separator.end() < len(buf):
+            pos = separator.end()  # fast path: separator and next item in the buffer
+            if separator.group(1) == "]":
+                return
+            continue
+        pos = end
+        char = peek()
+        pos += 1
+        if char == "]":
+            return
+        if char != ",":
+            raise ValueError(f"Expected ',' or ']' in JSON array, got {char!r}")
+        peek()
+
+
+def iter_records(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """Records of a ``.jsonl`` file or a JSON array file, streamed one at a time."""
+    with open(path) as f:
+        if Path(path).suffix == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_array(f)
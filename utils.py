@@ -1,5 +1,8 @@
 import os
-from typing import Iterable, Dict, Any
+from typing import Iterable, Dict, Any, Optional
+
+from llm_cache import ResponseCache, cached_chat_completion
+from prompt_builder import format_fact, load_template
 
 def generate_prompt_from_triples(
     triples: Iterable[Dict[str, Any]],
@@ -23,14 +26,9 @@ def generate_prompt_from_triples(
     str
         Completed prompt with triples and instruction inserted.
     """
-    with open(template_path) as f:
-        template = f.read()
-
-    facts = ""
-    for t in triples:
-        facts += f"{t['subject']} — {t['predicate']} — {t['object']}\n"
-
-    return template.replace("<<FACTS>>", facts.strip()).replace("<<INSTRUCTION>>", instruction)
+    template = load_template(template_path)  # compiled once per file version
+    facts = "\n".join(format_fact(t) for t in triples)
+    return template.render(facts.strip(), instruction)
 
 
 def compute_reward(generated_input: str, ground_truth_input: str) -> float:
@@ -59,6 +57,8 @@ def generate_qe_input_from_prompt(
     prompt: str,
     openai_client: Any,
     temperature: float = 0.7,
+    cache: Optional[ResponseCache] = None,
+    model: str = "gpt-4",
 ) -> str:
     """Query a language model with ``prompt`` and return the output.
 
@@ -70,6 +70,10 @@ def generate_qe_input_from_prompt(
         Initialized OpenAI client with a ``chat.completions.create`` method.
     temperature:
         Sampling temperature for the model.
+    cache:
+        Optional on-disk response cache consulted before the request.
+    model:
+        Model name passed to the client.
 
     Returns
     -------
@@ -77,12 +81,9 @@ def generate_qe_input_from_prompt(
         Generated QE input file content or an empty string on error.
     """
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=temperature,
+        return cached_chat_completion(
+            openai_client, prompt, model=model, temperature=temperature, cache=cache
         )
-        return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"[!] Prompt failed: {e}")
         return ""